@@ -0,0 +1,284 @@
+"""
+Native async versions of the busiest read endpoints.
+
+They are served when ASYNC_READ_VIEWS is on, which e_commerce_API/asgi.py
+does, so a request waiting on the database, the cache or a slow client
+holds a coroutine rather than a worker thread.
+
+Each view wraps the DRF view of its route and reuses that viewset for
+everything that does no I/O: filter backends (ProductFilter, search,
+ordering), permissions, pagination and serializers. Both paths therefore
+answer alike. Requests the async path does not cover are handed to the
+DRF view unchanged: other methods, the browsable API, and authentication
+other than tokens or a session read.
+
+Django still runs ORM queries of async views on one thread per process,
+so the gain is in concurrent, slow clients rather than in query time.
+"""
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.http import Http404, HttpResponse
+from django.urls import URLPattern
+from django.utils.cache import patch_vary_headers
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import status
+from rest_framework.authentication import SessionAuthentication
+from rest_framework.exceptions import AuthenticationFailed, NotAuthenticated
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.views import exception_handler
+
+from e_commerce_API.db_router import use_primary
+from users.authentication import CachedTokenAuthentication
+
+from .cache import aresponse_cache_key
+from .models import Category, Product
+from .serializers import CategorySerializer, ProductReadSerializer
+from .views import CategoryViewSet, ProductViewSet, availability, parse_quantity
+
+SAFE_METHODS = ("GET", "HEAD")
+
+
+class AsyncReadView(View):
+    """
+    Async view for one viewset action, falling back to the DRF view.
+
+    Subclasses set ``viewset`` and ``action`` and implement ``handle()``,
+    which gets the initialized viewset and returns a DRF Response.
+    """
+
+    viewset = None
+    action = None
+    # HTTP methods served asynchronously, the rest go to sync_view
+    async_methods = ("GET", "HEAD")
+    # Models keying cached responses, as with catalog.cache.cache_response
+    cache_models = ()
+    # The DRF view of the route, set by install()
+    sync_view = None
+
+    async def serve(self, request, *args, **kwargs):
+        if request.method not in self.async_methods or not self.can_serve(
+            request, kwargs
+        ):
+            return await sync_to_async(self.sync_view)(request, *args, **kwargs)
+
+        try:
+            view = await self.initialize(request, args, kwargs)
+            if self.cache_models and settings.CATALOG_RESPONSE_CACHE:
+                return await self.cached(view)
+            return self.render(await self.handle(view))
+        except Exception as exc:
+            return self.handle_exception(exc)
+
+    get = post = put = patch = delete = options = serve
+
+    def can_serve(self, request, kwargs):
+        if "format" in kwargs or "format" in request.GET:
+            return False
+        # The browsable API renders forms through the sync serializers.
+        if "text/html" in request.headers.get("Accept", ""):
+            return False
+        scheme = request.headers.get("Authorization", "").split(" ")[0]
+        if scheme and scheme.lower() != "token":
+            return False
+        # Session-authenticated writes need DRF's CSRF check.
+        return not (
+            request.method not in SAFE_METHODS
+            and not scheme
+            and request.session.session_key
+        )
+
+    async def initialize(self, request, args, kwargs):
+        """Build the viewset as DRF would, authenticate and check permissions."""
+        # Per-action overrides such as @action(permission_classes=...)
+        initkwargs = getattr(getattr(self.viewset, self.action), "kwargs", {})
+        view = self.viewset(**initkwargs)
+        view.action = self.action
+        view.args, view.kwargs = args, kwargs
+        view.format_kwarg = None
+        view.headers = {}
+
+        drf_request = Request(
+            request,
+            parsers=view.get_parsers(),
+            authenticators=view.get_authenticators(),
+            negotiator=view.get_content_negotiator(),
+            parser_context={"view": view, "args": args, "kwargs": kwargs},
+        )
+        view.request = drf_request
+
+        user, auth, authenticator = await self.authenticate(request)
+        drf_request._authenticator = authenticator
+        drf_request.user = user
+        drf_request.auth = auth
+        view.check_permissions(drf_request)
+        return view
+
+    async def authenticate(self, request):
+        token_auth = CachedTokenAuthentication()
+        result = await token_auth.aauthenticate(request)
+        if result is not None:
+            return (*result, token_auth)
+
+        user = await request.auser()
+        if user.is_authenticated and user.is_active:
+            return user, None, SessionAuthentication()
+        return AnonymousUser(), None, None
+
+    async def handle(self, view):
+        raise NotImplementedError
+
+    async def cached(self, view):
+        key = await aresponse_cache_key(view.request, self.cache_models)
+        data = await cache.aget(key)
+        if data is not None:
+            return self.render(Response(data, headers={"X-Cache": "HIT"}))
+
+        # As in cache_response, misses read from the primary.
+        with use_primary():
+            response = await self.handle(view)
+        if response.status_code == status.HTTP_200_OK:
+            await cache.aset(key, response.data, settings.CATALOG_CACHE_TIMEOUT)
+            response["X-Cache"] = "MISS"
+        return self.render(response)
+
+    async def get_object(self, view, queryset):
+        """GenericAPIView.get_object with the async ORM."""
+        lookup_url_kwarg = view.lookup_url_kwarg or view.lookup_field
+        try:
+            obj = await queryset.aget(
+                **{view.lookup_field: view.kwargs[lookup_url_kwarg]}
+            )
+        except queryset.model.DoesNotExist:
+            raise Http404(
+                "No %s matches the given query." % queryset.model._meta.object_name
+            )
+        except (TypeError, ValueError, DjangoValidationError):
+            raise Http404
+        view.check_object_permissions(view.request, obj)
+        return obj
+
+    async def paginate(self, view, queryset, serializer_class):
+        """Paginated (or whole) list response, as ListModelMixin.list builds it."""
+        if view.paginator is not None:
+            page = await view.paginator.apaginate_queryset(
+                queryset, view.request, view=view
+            )
+            if page is not None:
+                data = serializer_class(page, many=True).data
+                return view.get_paginated_response(data)
+
+        objects = [obj async for obj in queryset]
+        return Response(serializer_class(objects, many=True).data)
+
+    def handle_exception(self, exc):
+        if isinstance(exc, (NotAuthenticated, AuthenticationFailed)):
+            exc.auth_header = CachedTokenAuthentication().authenticate_header(None)
+        response = exception_handler(exc, {})
+        if response is None:
+            raise exc
+        return self.render(response)
+
+    def render(self, response):
+        """Render a DRF Response to JSON, as JSONRenderer would for the DRF view."""
+        rendered = HttpResponse(
+            JSONRenderer().render(response.data),
+            status=response.status_code,
+            content_type="application/json",
+        )
+        for header in ("WWW-Authenticate", "Retry-After", "X-Cache"):
+            if response.has_header(header):
+                rendered[header] = response[header]
+        patch_vary_headers(rendered, ["Accept"])
+        return rendered
+
+
+class ProductListView(AsyncReadView):
+    viewset = ProductViewSet
+    action = "list"
+    cache_models = (Product, Category)
+
+    async def handle(self, view):
+        queryset = view.filter_queryset(view.get_queryset())
+        return await self.paginate(view, queryset, ProductReadSerializer)
+
+
+class ProductDetailView(AsyncReadView):
+    viewset = ProductViewSet
+    action = "retrieve"
+    cache_models = (Product, Category)
+
+    async def handle(self, view):
+        queryset = view.filter_queryset(view.get_queryset())
+        product = await self.get_object(view, queryset)
+        return Response(ProductReadSerializer(product).data)
+
+
+class ProductsByCategoryView(AsyncReadView):
+    viewset = ProductViewSet
+    action = "by_category"
+    cache_models = (Product, Category)
+
+    async def handle(self, view):
+        slug = view.request.query_params.get("slug")
+        queryset = view.get_queryset()
+        if slug:
+            queryset = queryset.filter(category__slug=slug)
+        return await self.paginate(view, queryset, ProductReadSerializer)
+
+
+class CheckAvailabilityView(AsyncReadView):
+    viewset = ProductViewSet
+    action = "check_availability"
+    async_methods = ("POST",)
+
+    async def handle(self, view):
+        queryset = view.filter_queryset(view.get_queryset())
+        product = await self.get_object(view, queryset)
+        quantity, error = parse_quantity(view.request.data.get("quantity", 1))
+        if error:
+            return Response({"error": error}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(availability(product, quantity))
+
+
+class CategoryListView(AsyncReadView):
+    viewset = CategoryViewSet
+    action = "list"
+    cache_models = (Category,)
+
+    async def handle(self, view):
+        queryset = view.filter_queryset(view.get_queryset())
+        return await self.paginate(view, queryset, CategorySerializer)
+
+
+# Router URL names served asynchronously
+VIEWS = {
+    "product-list": ProductListView,
+    "product-detail": ProductDetailView,
+    "product-by-category": ProductsByCategoryView,
+    "product-check-availability": CheckAvailabilityView,
+    "category-list": CategoryListView,
+}
+
+
+def install(urlpatterns, views):
+    """
+    Serve the URL patterns named in ``views`` with their async view; each
+    keeps the pattern's original DRF view for the requests it hands over.
+    """
+    patterns = []
+    for pattern in urlpatterns:
+        view_class = views.get(getattr(pattern, "name", None))
+        if view_class is not None:
+            callback = csrf_exempt(view_class.as_view(sync_view=pattern.callback))
+            pattern = URLPattern(
+                pattern.pattern, callback, pattern.default_args, pattern.name
+            )
+        patterns.append(pattern)
+    return patterns
@@ -0,0 +1,566 @@
+"""
+Load benchmark of the API, run by ``manage.py benchmark``.
+
+``seed()`` fills an empty database with a catalog of the requested size
+and an order history. Scenarios then drive the real URLconf through
+django.test.Client from concurrent threads, so each request goes through
+the full middleware, authentication, view and serializer stack, without
+a server or network in between. ``run()`` reports latency percentiles,
+throughput and queries per request for each scenario.
+"""
+
+import random
+import threading
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+from urllib.parse import urlencode
+
+from django.contrib.auth.hashers import make_password
+from django.db import connections, transaction
+from django.test import Client
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from e_commerce_API.instrumentation import collect_queries
+from users.models import User
+
+from . import search
+from .models import Category, Order, OrderItem, OrderStatusCounter, Product
+from .pagination import KeysetPagination
+
+PASSWORD = "benchmark-password"
+BATCH_SIZE = 5000
+
+ADJECTIVES = (
+    "steel wooden compact classic wireless organic heavy portable vintage smart "
+    "cotton ceramic foldable electric"
+).split()
+NOUNS = (
+    "spade kettle lamp chair headphones blender backpack jacket mug drill "
+    "notebook speaker tent watch rug"
+).split()
+# Orderings, page sizes and longest walk of the product_list scenario
+LIST_ORDERINGS = ("-created_at", "created_at", "price", "-price")
+LIST_PAGE_SIZES = (10, 20, 50)
+LIST_WALK_PAGES = 20
+# Threads logging in throughout the login_storm scenario
+STORM_CLIENTS = 4
+# Share of seeded orders in each status
+STATUS_WEIGHTS = {"completed": 60, "processing": 15, "pending": 10, "cancelled": 15}
+
+
+# Seeding
+
+
+def _batches(objects, size=BATCH_SIZE):
+    batch = []
+    for obj in objects:
+        batch.append(obj)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+@contextmanager
+def _explicit_created_at(*models):
+    """Let bulk_create keep the created_at values it is given."""
+    fields = [model._meta.get_field("created_at") for model in models]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def _create_users(prefix, count, password, **extra):
+    users = User.objects.bulk_create(
+        User(
+            username=f"{prefix}{i}",
+            email=f"{prefix}{i}@example.com",
+            password=password,
+            **extra,
+        )
+        for i in range(count)
+    )
+    Token.objects.bulk_create(
+        Token(key=Token.generate_key(), user=user) for user in users
+    )
+    return users
+
+
+def seed(products, orders, rng, stdout=None):
+    """
+    Create ``products`` products in sqrt-sized categories, sellers and
+    customers with tokens, and ``orders`` orders of one to four items
+    spread over the last year.
+    """
+
+    def log(message):
+        if stdout is not None:
+            stdout.write(message)
+
+    # Hash once: every benchmark user shares the password.
+    password = make_password(PASSWORD)
+    sellers = _create_users("seller", 10, password)
+    _create_users("staff", 1, password, is_staff=True)
+    customers = _create_users("customer", max(10, orders // 20), password)
+
+    categories = Category.objects.bulk_create(
+        Category(name=f"Category {i}", slug=f"category-{i}")
+        for i in range(max(5, int(products**0.5) // 2))
+    )
+    log(f"Created {len(categories)} categories and {len(customers)} customers.")
+
+    now = timezone.now()
+    with _explicit_created_at(Product, Order):
+        for batch in _batches(
+            Product(
+                name=f"{rng.choice(ADJECTIVES).title()} {rng.choice(NOUNS)} {i}",
+                description=(
+                    f"A {rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} "
+                    f"for every {rng.choice(NOUNS)}."
+                ),
+                price=Decimal(rng.randrange(100, 100000)) / 100,
+                category=rng.choice(categories),
+                # One product in ten is out of stock, one in ten low
+                stock_quantity=rng.choice([0, rng.randint(1, 10)] + [1000] * 8),
+                owner=rng.choice(sellers),
+                created_at=now - timedelta(days=rng.uniform(0, 365)),
+            )
+            for i in range(products)
+        ):
+            Product.objects.bulk_create(batch)
+        log(f"Created {products} products.")
+
+        product_prices = dict(Product.objects.values_list("pk", "price"))
+        product_ids = list(product_prices)
+        statuses = list(STATUS_WEIGHTS)
+        weights = list(STATUS_WEIGHTS.values())
+        for batch in _batches(
+            (
+                Order(
+                    customer=customer,
+                    customer_email=customer.email,
+                    status=rng.choices(statuses, weights)[0],
+                    created_at=now - timedelta(days=rng.uniform(0, 365)),
+                )
+                for customer in rng.choices(customers, k=orders)
+            ),
+            size=BATCH_SIZE // 4,
+        ):
+            _create_orders(batch, product_ids, product_prices, rng)
+        log(f"Created {orders} orders.")
+
+    OrderStatusCounter.objects.rebuild()
+    search.rebuild()
+    log("Rebuilt the order counters and the search index.")
+
+
+def _create_orders(orders, product_ids, product_prices, rng):
+    items = []
+    for order in orders:
+        order.total_amount = Decimal("0")
+        count = min(len(product_ids), rng.randint(1, 4))
+        order.lines = [
+            (product_id, rng.randint(1, 3))
+            for product_id in rng.sample(product_ids, count)
+        ]
+        for product_id, quantity in order.lines:
+            order.total_amount += product_prices[product_id] * quantity
+    with transaction.atomic():
+        Order.objects.bulk_create(orders)
+        for order in orders:
+            items.extend(
+                OrderItem(
+                    order=order,
+                    product_id=product_id,
+                    quantity=quantity,
+                    price=product_prices[product_id],
+                )
+                for product_id, quantity in order.lines
+            )
+        OrderItem.objects.bulk_create(items)
+
+
+# Scenarios
+
+
+class Scenario:
+    """
+    One kind of request. ``setup()`` runs once before the scenario, with
+    the number of requests it will make; ``request()`` makes one request
+    with a thread's client and random generator and returns the response.
+    ``teardown()`` runs once after it and may return entries to add to
+    the result.
+    """
+
+    # Status codes counted as a success
+    expected = (200,)
+
+    def __init__(self, data):
+        self.data = data
+
+    def setup(self, count):
+        pass
+
+    def request(self, client, rng):
+        raise NotImplementedError
+
+    def teardown(self):
+        return {}
+
+    def auth(self, token):
+        return {"HTTP_AUTHORIZATION": f"Token {token}"}
+
+
+class ProductList(Scenario):
+    """
+    Clients paging through the catalog. Each thread starts a walk at a
+    random product, in a random ordering and page size, and follows
+    ``next`` for up to LIST_WALK_PAGES pages: requests spread over many
+    distinct pages instead of repeating one URL the response cache would
+    answer.
+    """
+
+    def setup(self, count):
+        self.products = list(Product.objects.values_list("pk", "price", "created_at"))
+        self.walks = threading.local()
+
+    def request(self, client, rng):
+        walk = self.walks
+        if not getattr(walk, "next", None) or walk.pages >= LIST_WALK_PAGES:
+            walk.pages = 0
+            walk.next = self.start(rng)
+        response = client.get(walk.next)
+        walk.pages += 1
+        walk.next = response.json().get("next") if response.status_code == 200 else None
+        return response
+
+    def start(self, rng):
+        """The URL of a page starting after a random product."""
+        ordering = rng.choice(LIST_ORDERINGS)
+        pk, price, created_at = rng.choice(self.products)
+        value = str(price) if "price" in ordering else created_at.isoformat()
+        paginator = KeysetPagination()
+        paginator.base_url = "/api/products/?" + urlencode(
+            {"ordering": ordering, "page_size": rng.choice(LIST_PAGE_SIZES)}
+        )
+        return paginator.encode_cursor(([value, str(pk)], False))
+
+
+class ProductSearch(Scenario):
+    def request(self, client, rng):
+        query = f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)}"
+        return client.get("/api/products/", {"search": query})
+
+
+class ProductFilter(Scenario):
+    def request(self, client, rng):
+        low = rng.randrange(0, 900)
+        return client.get(
+            "/api/products/",
+            {
+                "category": rng.choice(self.data.category_slugs),
+                "price_min": low,
+                "price_max": low + 100,
+                "in_stock": "true",
+                "ordering": "price",
+            },
+        )
+
+
+class ProductFacets(Scenario):
+    def request(self, client, rng):
+        return client.get(
+            "/api/products/facets/",
+            {
+                "category": rng.choice(self.data.category_slugs),
+                "in_stock": "true",
+            },
+        )
+
+
+class ByCategory(Scenario):
+    def request(self, client, rng):
+        slug = rng.choice(self.data.category_slugs)
+        return client.get("/api/products/by_category/", {"slug": slug})
+
+
+class CheckAvailability(Scenario):
+    def request(self, client, rng):
+        # A POST, which IsOwnerOrReadOnly leaves to the product's owner
+        product_id, owner_id = rng.choice(self.data.product_owners)
+        token = self.data.seller_tokens[owner_id]
+        return client.post(
+            f"/api/products/{product_id}/check_availability/",
+            {"quantity": rng.randint(1, 5)},
+            content_type="application/json",
+            **self.auth(token),
+        )
+
+
+class Login(Scenario):
+    def request(self, client, rng):
+        _, email, _ = rng.choice(self.data.customers)
+        return client.post(
+            "/api/auth/login/",
+            {"email": email, "password": PASSWORD},
+            content_type="application/json",
+        )
+
+
+class LoginStorm(Scenario):
+    """
+    Catalog reads while STORM_CLIENTS other threads log in without pause,
+    as after a token purge. The latency reported is that of the reads, to
+    compare with product_filter; the logins are counted under "storm".
+    """
+
+    def setup(self, count):
+        self.stop = threading.Event()
+        self.logins = []
+        self.threads = [
+            threading.Thread(target=self.storm, args=(index,))
+            for index in range(STORM_CLIENTS)
+        ]
+        self.start = time.perf_counter()
+        for thread in self.threads:
+            thread.start()
+
+    def storm(self, index):
+        client = Client(raise_request_exception=False)
+        rng = random.Random(f"storm-{index}")
+        login = Login(self.data)
+        try:
+            while not self.stop.is_set():
+                start = time.perf_counter()
+                response = login.request(client, rng)
+                ok = response.status_code in login.expected
+                self.logins.append((time.perf_counter() - start, ok))
+        finally:
+            connections.close_all()
+
+    def request(self, client, rng):
+        return client.get(
+            "/api/products/", {"category": rng.choice(self.data.category_slugs)}
+        )
+
+    def teardown(self):
+        self.stop.set()
+        for thread in self.threads:
+            thread.join()
+        elapsed = time.perf_counter() - self.start
+        latencies = sorted(duration * 1000 for duration, _ in self.logins)
+        return {
+            "storm": {
+                "clients": STORM_CLIENTS,
+                "logins": len(self.logins),
+                "errors": sum(1 for _, ok in self.logins if not ok),
+                "logins_per_s": round(len(self.logins) / elapsed, 2),
+                "login_p50_ms": _round(percentile(latencies, 0.50)),
+                "login_p95_ms": _round(percentile(latencies, 0.95)),
+            }
+        }
+
+
+class OrderCreate(Scenario):
+    expected = (201,)
+
+    def request(self, client, rng):
+        _, email, token = rng.choice(self.data.customers)
+        items = [
+            {"product": product_id, "quantity": 1}
+            for product_id in rng.sample(self.data.in_stock_ids, rng.randint(1, 3))
+        ]
+        return client.post(
+            "/api/orders/",
+            {"customer_email": email, "items": items},
+            content_type="application/json",
+            **self.auth(token),
+        )
+
+
+class OrderCancel(Scenario):
+    def setup(self, count):
+        # A fresh pending order for every request
+        tokens = {email: token for _, email, token in self.data.customers}
+        product_prices = dict(
+            Product.objects.filter(pk__in=self.data.in_stock_ids).values_list(
+                "pk", "price"
+            )
+        )
+        rng = random.Random(count)
+        orders = [
+            Order(customer_id=user_id, customer_email=email)
+            for user_id, email, _ in rng.choices(self.data.customers, k=count)
+        ]
+        for batch in _batches(orders, size=BATCH_SIZE // 4):
+            _create_orders(batch, list(product_prices), product_prices, rng)
+        OrderStatusCounter.objects.rebuild()
+        self.orders = [(order.pk, tokens[order.customer_email]) for order in orders]
+        self.lock = threading.Lock()
+
+    def request(self, client, rng):
+        with self.lock:
+            order_id, token = self.orders.pop()
+        return client.post(f"/api/orders/{order_id}/cancel/", **self.auth(token))
+
+
+class Statistics(Scenario):
+    def request(self, client, rng):
+        token = self.data.staff_token
+        return client.get("/api/orders/statistics/", **self.auth(token))
+
+
+SCENARIOS = {
+    "product_list": ProductList,
+    "product_search": ProductSearch,
+    "product_filter": ProductFilter,
+    "product_facets": ProductFacets,
+    "by_category": ByCategory,
+    "check_availability": CheckAvailability,
+    "login": Login,
+    "login_storm": LoginStorm,
+    "order_create": OrderCreate,
+    "order_cancel": OrderCancel,
+    "statistics": Statistics,
+}
+
+
+class Data:
+    """Ids and credentials of the seeded database the scenarios pick from."""
+
+    def __init__(self):
+        self.category_slugs = list(Category.objects.values_list("slug", flat=True))
+        self.product_owners = list(Product.objects.values_list("pk", "owner_id"))
+        self.product_ids = [pk for pk, _ in self.product_owners]
+        self.in_stock_ids = list(
+            Product.objects.filter(stock_quantity__gte=1000, is_hot=False).values_list(
+                "pk", flat=True
+            )
+        )
+        self.customers = list(
+            Token.objects.filter(user__username__startswith="customer").values_list(
+                "user_id", "user__email", "key"
+            )
+        )
+        self.seller_tokens = dict(
+            Token.objects.filter(user__username__startswith="seller").values_list(
+                "user_id", "key"
+            )
+        )
+        self.staff_token = Token.objects.get(user__username="staff0").key
+
+
+# Running
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of sorted ``values``."""
+    if not values:
+        return None
+    index = max(0, min(len(values) - 1, round(fraction * len(values)) - 1))
+    return values[index]
+
+
+def run(scenario, requests, clients, warmup=0, seed=0):
+    """Make ``warmup + requests`` requests from ``clients`` threads."""
+    scenario.setup(warmup + requests)
+    counter = iter(range(warmup + requests))
+    counter_lock = threading.Lock()
+    results = []
+
+    def worker(index):
+        # Errors are counted, not raised
+        client = Client(raise_request_exception=False)
+        rng = random.Random(f"{seed}-{index}")
+        try:
+            while True:
+                with counter_lock:
+                    number = next(counter, None)
+                if number is None:
+                    return
+                with collect_queries() as stats:
+                    start = time.perf_counter()
+                    response = scenario.request(client, rng)
+                    duration = time.perf_counter() - start
+                if number >= warmup:
+                    ok = response.status_code in scenario.expected
+                    results.append((duration, stats.count, ok))
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(clients)]
+    start = time.perf_counter()
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+    finally:
+        extra = scenario.teardown()
+
+    latencies = sorted(duration * 1000 for duration, _, _ in results)
+    return {
+        "requests": len(results),
+        "errors": sum(1 for *_, ok in results if not ok),
+        "throughput_rps": round(len(results) / elapsed, 2) if elapsed else None,
+        "latency_ms": {
+            "p50": _round(percentile(latencies, 0.50)),
+            "p95": _round(percentile(latencies, 0.95)),
+            "p99": _round(percentile(latencies, 0.99)),
+            "mean": _round(sum(latencies) / len(latencies)) if latencies else None,
+            "max": _round(latencies[-1] if latencies else None),
+        },
+        "queries_per_request": (
+            round(sum(count for _, count, _ in results) / len(results), 2)
+            if results
+            else None
+        ),
+        **extra,
+    }
+
+
+def _round(value):
+    return None if value is None else round(value, 2)
+
+
+# Metrics compared between runs; higher is better only for throughput
+COMPARED = {
+    "p50": ("latency_ms", "p50"),
+    "p95": ("latency_ms", "p95"),
+    "p99": ("latency_ms", "p99"),
+    "rps": ("throughput_rps",),
+    "queries": ("queries_per_request",),
+}
+
+
+def compare(baseline, current):
+    """Relative change of each compared metric, per scenario in both runs."""
+    changes = {}
+    for name, result in current["scenarios"].items():
+        before = baseline["scenarios"].get(name)
+        if before is None:
+            continue
+        changes[name] = {}
+        for metric, path in COMPARED.items():
+            old, new = _lookup(before, path), _lookup(result, path)
+            changes[name][metric] = (
+                (old, new, (new - old) / old if old else None)
+                if old is not None and new is not None
+                else (old, new, None)
+            )
+    return changes
+
+
+def _lookup(result, path):
+    for key in path:
+        result = result.get(key) if isinstance(result, dict) else None
+    return result
@@ -0,0 +1,119 @@
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.response import Response
+
+from e_commerce_API.db_router import use_primary
+
+VERSION_KEY = "catalog:version:{label}"
+RESPONSE_KEY = "catalog:response:{versions}:{digest}"
+
+
+def _version_key(model):
+    return VERSION_KEY.format(label=model._meta.label_lower)
+
+
+def get_versions(models):
+    """Return the current version counter of each model."""
+    keys = [_version_key(model) for model in models]
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        for key in missing:
+            # Seed from the clock so a counter evicted from the cache never
+            # restarts at a value that old entries were stored under.
+            cache.add(key, time.time_ns(), None)
+        versions.update(cache.get_many(missing))
+    return [versions.get(key, 0) for key in keys]
+
+
+async def aget_versions(models):
+    """Async get_versions, for the views in catalog.async_views."""
+    keys = [_version_key(model) for model in models]
+    versions = await cache.aget_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        for key in missing:
+            await cache.aadd(key, time.time_ns(), None)
+        versions.update(await cache.aget_many(missing))
+    return [versions.get(key, 0) for key in keys]
+
+
+def bump_version(*models):
+    """
+    Invalidate every cached response depending on ``models``.
+
+    The bump runs once the current transaction commits, so a concurrent
+    reader can never store pre-commit data under the new version.
+    """
+
+    def bump():
+        for model in models:
+            key = _version_key(model)
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.set(key, time.time_ns(), None)
+
+    transaction.on_commit(bump)
+
+
+def response_cache_key(request, models):
+    """Key a response by host, path, normalized query and model versions."""
+    return _response_key(request, get_versions(models))
+
+
+async def aresponse_cache_key(request, models):
+    return _response_key(request, await aget_versions(models))
+
+
+def _response_key(request, versions):
+    params = sorted(
+        (key, value)
+        for key in request.GET
+        for value in request.GET.getlist(key)
+        if value != ""
+    )
+    query = "&".join(f"{key}={value}" for key, value in params)
+    raw = f"{request.get_host()}{request.path}?{query}"
+    digest = hashlib.md5(raw.encode("utf-8")).hexdigest()
+    versions = ".".join(str(version) for version in versions)
+    return RESPONSE_KEY.format(versions=versions, digest=digest)
+
+
+def cache_response(*models):
+    """
+    Cache the data of successful responses of a read-only view method.
+
+    Entries are keyed by the versions of ``models``; writes bump those
+    versions, so stale entries are never served and simply age out. That
+    takes a cache every worker shares: with CATALOG_RESPONSE_CACHE off, as
+    it is by default otherwise, responses are not cached. Misses read from
+    the primary database: a lagging replica could otherwise store old data
+    under the new version.
+    """
+
+    def decorator(view_method):
+        @wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            if not settings.CATALOG_RESPONSE_CACHE:
+                return view_method(self, request, *args, **kwargs)
+            key = response_cache_key(request, models)
+            data = cache.get(key)
+            if data is not None:
+                return Response(data, headers={"X-Cache": "HIT"})
+
+            with use_primary():
+                response = view_method(self, request, *args, **kwargs)
+            if response.status_code == 200:
+                cache.set(key, response.data, settings.CATALOG_CACHE_TIMEOUT)
+                response["X-Cache"] = "MISS"
+            return response
+
+        return wrapper
+
+    return decorator
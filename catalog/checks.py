@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+
+@register(Tags.caches)
+def check_response_cache(app_configs, **kwargs):
+    # Version bumps would only reach the worker that made the write, and the
+    # others would serve stale catalog responses.
+    if settings.CATALOG_RESPONSE_CACHE and not settings.CACHE_IS_SHARED:
+        return [
+            Error(
+                "CATALOG_RESPONSE_CACHE needs a cache shared by all workers.",
+                hint=(
+                    "Point CACHE_BACKEND at Redis or Memcached, run a single "
+                    "worker, or turn CATALOG_RESPONSE_CACHE off."
+                ),
+                id="catalog.E001",
+            )
+        ]
+    return []
@@ -0,0 +1,131 @@
+"""
+Facet counts for the product list filters.
+
+Each facet is counted over the products matching every filter of the
+request except its own, so the storefront can show how many products
+each alternative would give: the category counts ignore ``category``,
+the stock split ignores ``in_stock`` and the price histogram ignores
+``price_min`` and ``price_max``. Each facet is one grouped query.
+"""
+
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Case, Count, IntegerField, Q, Value, When
+from rest_framework import filters as drf_filters
+from rest_framework import serializers
+
+from . import search
+from .filters import ProductFilter
+from .models import Product
+
+# Upper bounds of the default price histogram buckets; the last bucket is
+# open-ended.
+PRICE_BREAKS = [10, 25, 50, 100, 250, 500, 1000]
+MAX_PRICE_BREAKS = 20
+
+IN_STOCK = Q(is_hot=False, stock_quantity__gt=0) | Q(is_hot=True, stock_total__gt=0)
+
+
+def parse_price_breaks(value):
+    """Ascending bucket bounds from a comma-separated ``price_breaks``."""
+    if not value:
+        return [Decimal(bound) for bound in PRICE_BREAKS]
+    try:
+        breaks = [Decimal(bound.strip()) for bound in value.split(",")]
+    except InvalidOperation:
+        raise serializers.ValidationError(
+            {"price_breaks": ["Give comma-separated numbers."]}
+        )
+    if len(breaks) > MAX_PRICE_BREAKS:
+        raise serializers.ValidationError(
+            {"price_breaks": [f"At most {MAX_PRICE_BREAKS} bounds."]}
+        )
+    if not all(bound.is_finite() for bound in breaks) or breaks != sorted(set(breaks)):
+        raise serializers.ValidationError(
+            {"price_breaks": ["Bounds must be distinct and ascending."]}
+        )
+    return breaks
+
+
+class Facets:
+    """Compute the facets of the product list for one request."""
+
+    def __init__(self, request, view):
+        self.request = request
+        self.view = view
+        self.params = request.query_params
+
+    def queryset(self, *ignored):
+        """Products matching the request's filters except ``ignored`` ones."""
+        data = {
+            name: value for name, value in self.params.items() if name not in ignored
+        }
+        filterset = ProductFilter(
+            data=data, queryset=Product.objects.with_available_stock()
+        )
+        if not filterset.is_valid():
+            raise serializers.ValidationError(filterset.errors)
+        queryset = filterset.qs
+
+        query = self.params.get("search", "")
+        if search.is_supported(queryset.db):
+            return search.search(queryset, query, rank=False)
+        return drf_filters.SearchFilter().filter_queryset(
+            self.request, queryset, self.view
+        )
+
+    def categories(self):
+        rows = (
+            self.queryset("category")
+            .order_by()
+            .values("category_id", "category__name", "category__slug")
+            .annotate(count=Count("pk"))
+            .order_by("-count", "category__name")
+        )
+        return [
+            {
+                "id": row["category_id"],
+                "name": row["category__name"],
+                "slug": row["category__slug"],
+                "count": row["count"],
+            }
+            for row in rows
+        ]
+
+    def stock(self):
+        return self.queryset("in_stock").aggregate(
+            in_stock=Count("pk", filter=IN_STOCK),
+            out_of_stock=Count("pk", filter=~IN_STOCK),
+        )
+
+    def price(self, breaks):
+        bucket = Case(
+            *[When(price__lt=bound, then=Value(i)) for i, bound in enumerate(breaks)],
+            default=Value(len(breaks)),
+            output_field=IntegerField(),
+        )
+        counts = dict(
+            self.queryset("price_min", "price_max")
+            .order_by()
+            .annotate(bucket=bucket)
+            .values("bucket")
+            .annotate(count=Count("pk"))
+            .values_list("bucket", "count")
+        )
+        bounds = [None, *breaks, None]
+        return [
+            {
+                "min": None if low is None else str(low),
+                "max": None if high is None else str(high),
+                "count": counts.get(i, 0),
+            }
+            for i, (low, high) in enumerate(zip(bounds, bounds[1:]))
+        ]
+
+    def data(self):
+        breaks = parse_price_breaks(self.params.get("price_breaks"))
+        return {
+            "categories": self.categories(),
+            "stock": self.stock(),
+            "price": self.price(breaks),
+        }
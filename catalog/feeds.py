@@ -0,0 +1,313 @@
+"""
+Streaming product feeds in CSV or NDJSON.
+
+Imports read the upload row by row and write in chunks: each chunk
+resolves its categories and existing products with one query each, then
+saves with bulk_create/bulk_update in its own transaction. Rows are
+validated with the fields and ``validate_<field>`` rules of
+ProductSerializer, and a row that fails is reported instead of aborting
+the import.
+
+Rows carrying an ``id`` update that product (it must belong to the
+importing user); rows without one create a new product. ``category`` is
+the category slug. Exports write the same columns, so a feed can be
+exported, edited and imported again.
+"""
+
+import csv
+import io
+import json
+
+from django.db import transaction
+from rest_framework import serializers
+from rest_framework.fields import SkipField, empty
+
+from . import search, stock
+from .cache import bump_version
+from .models import Category, Product
+from .serializers import ProductSerializer
+
+FORMATS = ("csv", "ndjson")
+
+# Values read for each exported product, in _export_values() order
+EXPORT_FIELDS = [
+    "id",
+    "name",
+    "description",
+    "price",
+    "stock_total",
+    "image_url",
+    "category__slug",
+    "created_at",
+]
+
+# Columns of a feed, in export order
+COLUMNS = [
+    "id",
+    "name",
+    "description",
+    "price",
+    "stock_quantity",
+    "image_url",
+    "category",
+    "created_at",
+]
+
+# Product fields an import may set, validated by ProductSerializer
+FIELDS = ["name", "description", "price", "stock_quantity", "image_url"]
+
+CHUNK_SIZE = 1000
+
+# Longest error list returned; the total count is always reported
+MAX_ERRORS = 1000
+
+
+class FeedError(Exception):
+    """The upload as a whole cannot be read."""
+
+
+def detect_format(name, requested=None):
+    if requested:
+        file_format = requested.lower()
+    elif name.lower().endswith(".csv"):
+        file_format = "csv"
+    elif name.lower().endswith((".ndjson", ".jsonl")):
+        file_format = "ndjson"
+    else:
+        raise FeedError("Cannot tell the feed format, pass file_format.")
+    if file_format not in FORMATS:
+        raise FeedError(f"Unsupported feed format '{file_format}'.")
+    return file_format
+
+
+def read_rows(upload, file_format):
+    """Yield ``(line_number, row)`` from an uploaded feed, one row at a time."""
+    try:
+        yield from _parse(upload, file_format)
+    except (UnicodeDecodeError, csv.Error) as exc:
+        # Chunks before the broken line have already been saved.
+        raise FeedError(f"Cannot read the feed: {exc}")
+
+
+def _parse(upload, file_format):
+    text = io.TextIOWrapper(upload, encoding="utf-8-sig", newline="")
+    if file_format == "csv":
+        reader = csv.DictReader(text)
+        for row in reader:
+            yield reader.line_num, row
+        return
+
+    for line_number, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            yield line_number, None
+            continue
+        yield line_number, row if isinstance(row, dict) else None
+
+
+class ProductImporter:
+    """Validate and save feed rows for ``owner``, chunk by chunk."""
+
+    def __init__(self, owner, chunk_size=CHUNK_SIZE):
+        self.owner = owner
+        self.chunk_size = chunk_size
+        self.serializer = ProductSerializer()
+        self.fields = {name: self.serializer.fields[name] for name in FIELDS}
+        self.categories = {}
+        self.created = 0
+        self.updated = 0
+        self.error_count = 0
+        self.errors = []
+
+    def run(self, rows):
+        chunk = []
+        for line_number, row in rows:
+            chunk.append((line_number, row))
+            if len(chunk) >= self.chunk_size:
+                self.save_chunk(chunk)
+                chunk = []
+        if chunk:
+            self.save_chunk(chunk)
+        return self.report()
+
+    def report(self):
+        return {
+            "created": self.created,
+            "updated": self.updated,
+            "error_count": self.error_count,
+            "errors": self.errors,
+        }
+
+    def add_error(self, line_number, errors):
+        self.error_count += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append({"line": line_number, "errors": errors})
+
+    def validate(self, row, partial):
+        """Return the validated field values of a row, or raise ValidationError."""
+        values, errors = {}, {}
+        for name, field in self.fields.items():
+            raw = row.get(name, empty)
+            if raw in ("", None) and not isinstance(field, serializers.CharField):
+                raw = empty
+            if raw is empty and partial:
+                continue
+            try:
+                value = field.run_validation(raw)
+                validator = getattr(self.serializer, f"validate_{name}", None)
+                values[name] = validator(value) if validator else value
+            except SkipField:
+                continue
+            except serializers.ValidationError as exc:
+                errors[name] = exc.detail
+        if errors:
+            raise serializers.ValidationError(errors)
+        return values
+
+    def resolve_categories(self, rows):
+        slugs = {
+            row.get("category") for _, row in rows if row and row.get("category")
+        } - set(self.categories)
+        if slugs:
+            self.categories.update(Category.objects.in_bulk(slugs, field_name="slug"))
+
+    def parse_id(self, row):
+        raw = row.get("id")
+        if raw in ("", None):
+            return None
+        try:
+            return int(raw)
+        except (TypeError, ValueError):
+            raise serializers.ValidationError({"id": ["A valid integer is required."]})
+
+    @transaction.atomic
+    def save_chunk(self, rows):
+        self.resolve_categories(rows)
+        ids = set()
+        for _, row in rows:
+            try:
+                ids.add(self.parse_id(row or {}))
+            except serializers.ValidationError:
+                pass
+        existing = Product.objects.filter(
+            pk__in=ids - {None}, owner=self.owner
+        ).in_bulk()
+
+        to_create, to_update, hot_stock = [], [], {}
+        for line_number, row in rows:
+            if row is None:
+                self.add_error(line_number, {"row": ["Malformed row."]})
+                continue
+            try:
+                pk = self.parse_id(row)
+                product = existing.get(pk) if pk is not None else None
+                if pk is not None and product is None:
+                    raise serializers.ValidationError({"id": ["Product not found."]})
+                values = self.validate(row, partial=product is not None)
+                slug = row.get("category")
+                if slug or product is None:
+                    category = self.categories.get(slug)
+                    if category is None:
+                        raise serializers.ValidationError(
+                            {"category": [f"Unknown category '{slug or ''}'."]}
+                        )
+                    values["category"] = category
+            except serializers.ValidationError as exc:
+                self.add_error(line_number, exc.detail)
+                continue
+
+            if product is None:
+                to_create.append(Product(owner=self.owner, **values))
+                continue
+            if product.is_hot and "stock_quantity" in values:
+                # Hot products keep their stock in buckets
+                hot_stock[product.pk] = values.pop("stock_quantity")
+            for name, value in values.items():
+                setattr(product, name, value)
+            to_update.append(product)
+
+        created = Product.objects.bulk_create(to_create)
+        Product.objects.bulk_update(to_update, FIELDS + ["category"])
+        for product_id, quantity in hot_stock.items():
+            stock.set_total(product_id, quantity)
+
+        search.index_products(
+            [product.pk for product in created + to_update if product.pk]
+        )
+        bump_version(Product)
+        self.created += len(created)
+        self.updated += len(to_update)
+
+
+class Echo:
+    """File-like object handing back whatever is written to it."""
+
+    def write(self, value):
+        return value
+
+
+def export_rows(queryset, file_format, chunk_size=2000):
+    """
+    Yield a feed of ``queryset`` piece by piece.
+
+    Rows are read through a server-side cursor (where the database has
+    them), so memory use does not grow with the size of the catalog.
+    """
+    header, line = _writer(file_format)
+    if header is not None:
+        yield header
+    for row in _export_queryset(queryset).iterator(chunk_size=chunk_size):
+        yield line(row)
+
+
+async def aexport_rows(queryset, file_format, chunk_size=2000):
+    """
+    export_rows() as an async iterator, for responses served under ASGI:
+    Django would read a sync iterator to the end before sending any of it.
+    """
+    header, line = _writer(file_format)
+    if header is not None:
+        yield header
+    async for row in _export_queryset(queryset).aiterator(chunk_size=chunk_size):
+        yield line(row)
+
+
+def _export_queryset(queryset):
+    # values() rather than values_list(): in Django 5.2 the latter runs its
+    # query as soon as aiterator() starts, in the async context.
+    return queryset.with_available_stock().order_by("pk").values(*EXPORT_FIELDS)
+
+
+def _writer(file_format):
+    """The header line of ``file_format`` (None for NDJSON) and a row formatter."""
+    if file_format == "csv":
+        writer = csv.writer(Echo())
+
+        def line(row):
+            return writer.writerow(_export_values(row))
+
+        return writer.writerow(COLUMNS), line
+
+    def line(row):
+        return json.dumps(dict(zip(COLUMNS, _export_values(row)))) + "\n"
+
+    return None, line
+
+
+def _export_values(row):
+    pk, name, description, price, quantity, image_url, slug, created_at = (
+        row[field] for field in EXPORT_FIELDS
+    )
+    return [
+        pk,
+        name,
+        description,
+        str(price),
+        quantity,
+        image_url,
+        slug,
+        created_at.isoformat(),
+    ]
@@ -1,22 +1,47 @@
 import django_filters
+from django.db.models.functions import Lower
+from rest_framework import filters
 from .models import Product
+from . import search
 
 
 class ProductFilter(django_filters.FilterSet):
     price_min = django_filters.NumberFilter(field_name="price", lookup_expr="gte")
     price_max = django_filters.NumberFilter(field_name="price", lookup_expr="lte")
-    category = django_filters.CharFilter(
-        field_name="category__slug", lookup_expr="iexact"
-    )
+    category = django_filters.CharFilter(method="filter_category")
     in_stock = django_filters.BooleanFilter(method="filter_in_stock")
 
     class Meta:
         model = Product
         fields = ["category", "price_min", "price_max", "in_stock"]
 
+    def filter_category(self, queryset, name, value):
+        # Case-insensitive, written as LOWER(slug) = ... so it can use the
+        # catalog_category_slug_lower index (iexact compiles to UPPER/LIKE).
+        return queryset.alias(category_slug=Lower("category__slug")).filter(
+            category_slug=value.lower()
+        )
+
     def filter_in_stock(self, queryset, name, value):
         if value is True:
-            return queryset.filter(stock_quantity__gt=0)
+            return queryset.filter_stock(gt=0)
         if value is False:
-            return queryset.filter(stock_quantity__lte=0)
+            return queryset.filter_stock(lte=0)
         return queryset
+
+
+class ProductSearchFilter(filters.SearchFilter):
+    """
+    Ranked full-text search over name, category and description.
+
+    Results are ordered by relevance unless an explicit ordering is
+    requested. Databases without a full-text index fall back to the
+    ``icontains`` matching of SearchFilter over ``search_fields``.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        if not search.is_supported(queryset.db):
+            return super().filter_queryset(request, queryset, view)
+
+        query = request.query_params.get(self.search_param, "")
+        return search.search(queryset, query)
@@ -0,0 +1,118 @@
+"""
+Idempotency-Key support for POST view methods.
+
+A client that may retry a POST (after a timeout, say) sends an
+``Idempotency-Key`` header. The first request with a key runs the view
+and, when it succeeds, stores the response; retries with the same key
+get the stored response back, with ``Idempotent-Replayed: true``, without
+running the view again. Keys belong to the user and expire after
+IDEMPOTENCY_KEY_TTL seconds.
+
+The key row is inserted in the transaction that runs the view, so it
+commits together with the view's work. A concurrent duplicate's insert
+waits on the unique constraint until the first request commits (or rolls
+back), then replays its response. Failed requests store nothing: their
+work was rolled back, so a retry runs them again. A key reused for a
+different request gets a 422.
+"""
+
+import hashlib
+import json
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import IdempotencyKey
+
+HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+MAX_KEY_LENGTH = IdempotencyKey._meta.get_field("key").max_length
+
+
+def fingerprint(request):
+    """sha256 of the method, path and parsed body of ``request``."""
+    body = json.dumps(request.data, sort_keys=True, cls=JSONEncoder)
+    message = f"{request.method} {request.path}\n{body}"
+    return hashlib.sha256(message.encode("utf-8")).hexdigest()
+
+
+def idempotent(view_method):
+    """
+    Honour the Idempotency-Key header of authenticated requests to a view
+    method; requests without one run as before.
+    """
+
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if key is None or not request.user.is_authenticated:
+            return view_method(self, request, *args, **kwargs)
+        if not key or len(key) > MAX_KEY_LENGTH:
+            return Response(
+                {"error": f"{HEADER} must be 1 to {MAX_KEY_LENGTH} characters"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        digest = fingerprint(request)
+        now = timezone.now()
+        expires_at = now + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+        with transaction.atomic():
+            record, created = IdempotencyKey.objects.get_or_create(
+                user=request.user,
+                key=key,
+                defaults={"fingerprint": digest, "expires_at": expires_at},
+            )
+            if not created and not claim_expired(record, digest, now, expires_at):
+                return replay(record, digest)
+
+            response = view_method(self, request, *args, **kwargs)
+            if status.is_success(response.status_code):
+                record.status_code = response.status_code
+                record.response = response.data
+                record.save(update_fields=["status_code", "response"])
+            else:
+                record.delete()
+            return response
+
+    return wrapper
+
+
+def claim_expired(record, digest, now, expires_at):
+    """
+    Take over an expired key for a new request; False when it has not
+    expired, or a concurrent request took it over first.
+    """
+    if record.expires_at > now:
+        return False
+    claimed = IdempotencyKey.objects.filter(pk=record.pk, expires_at__lte=now).update(
+        fingerprint=digest, status_code=None, response=None, expires_at=expires_at
+    )
+    if claimed:
+        record.fingerprint, record.expires_at = digest, expires_at
+    else:
+        record.refresh_from_db()
+    return bool(claimed)
+
+
+def replay(record, digest):
+    if record.fingerprint != digest:
+        return Response(
+            {"error": f"{HEADER} was already used with a different request"},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+    if record.status_code is None:
+        return Response(
+            {"error": f"A request with this {HEADER} is in progress"},
+            status=status.HTTP_409_CONFLICT,
+        )
+    return Response(
+        record.response,
+        status=record.status_code,
+        headers={REPLAYED_HEADER: "true"},
+    )
@@ -0,0 +1,205 @@
+"""
+Background jobs stored in the database.
+
+Side effects that need not delay a request (emails, alerts, analytics)
+are registered with ``@handler(name)`` and queued with ``enqueue()``
+inside the request's transaction: the job exists only if the request's
+work commits. ``manage.py run_jobs`` workers then run them.
+
+A worker claims a batch of due jobs, highest priority first, with one
+UPDATE that leases them to it for JOBS_LEASE_SECONDS. Its subquery
+selects with FOR UPDATE SKIP LOCKED where the database supports it
+(PostgreSQL, MySQL 8), so workers never wait on each other's batches;
+on SQLite, which runs one write at a time, the UPDATE alone is atomic.
+A job's work and its deletion commit together. A job that raises is
+retried with exponential backoff, and after its max_attempts is moved to
+DeadLetterJob. A worker that dies loses its lease, so its jobs run
+again: jobs run at least once and handlers should be idempotent.
+"""
+
+import logging
+import os
+import random
+import socket
+import traceback
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import DeadLetterJob, Job
+
+logger = logging.getLogger("catalog.jobs")
+
+# Characters of a traceback kept in last_error
+MAX_ERROR_LENGTH = 5000
+
+
+class Handler:
+    def __init__(self, func, priority, max_attempts):
+        self.func = func
+        self.priority = priority
+        self.max_attempts = max_attempts
+
+
+HANDLERS = {}
+
+
+def handler(name, *, priority=0, max_attempts=None):
+    """
+    Register the decorated function as the job ``name``; it is called with
+    the payload as keyword arguments. ``max_attempts`` defaults to
+    JOBS_MAX_ATTEMPTS.
+    """
+
+    def decorator(func):
+        HANDLERS[name] = Handler(func, priority, max_attempts)
+        return func
+
+    return decorator
+
+
+def _max_attempts(name):
+    registered = HANDLERS.get(name)
+    return (registered and registered.max_attempts) or settings.JOBS_MAX_ATTEMPTS
+
+
+def _new_job(name, payload, priority, delay):
+    try:
+        registered = HANDLERS[name]
+    except KeyError:
+        raise ValueError(f"No job handler is registered as {name!r}.")
+    return Job(
+        name=name,
+        payload=payload,
+        priority=registered.priority if priority is None else priority,
+        run_at=timezone.now() + timedelta(seconds=delay),
+        max_attempts=_max_attempts(name),
+    )
+
+
+def enqueue(name, *, priority=None, delay=0, **payload):
+    """Queue the job ``name``, in the current transaction if there is one."""
+    job = _new_job(name, payload, priority, delay)
+    job.save()
+    return job
+
+
+def enqueue_many(name, payloads, *, priority=None, delay=0):
+    """Queue one job ``name`` per payload, with a single INSERT."""
+    return Job.objects.bulk_create(
+        [_new_job(name, payload, priority, delay) for payload in payloads]
+    )
+
+
+def worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def claim(worker, limit):
+    """Lease up to ``limit`` due jobs to ``worker`` and return them."""
+    now = timezone.now()
+    claimable = Job.objects.filter(
+        Q(locked_until__isnull=True) | Q(locked_until__lte=now), run_at__lte=now
+    )
+    due = claimable.order_by("-priority", "run_at", "id")
+    if connection.features.has_select_for_update_skip_locked:
+        due = due.select_for_update(skip_locked=True)
+    with transaction.atomic():
+        leased = claimable.filter(pk__in=due.values("pk")[:limit]).update(
+            locked_by=worker,
+            locked_until=now + timedelta(seconds=settings.JOBS_LEASE_SECONDS),
+        )
+    if not leased:
+        return []
+    return list(
+        Job.objects.filter(locked_by=worker, locked_until__gt=now).order_by(
+            "-priority", "run_at", "id"
+        )
+    )
+
+
+def release(worker):
+    """Give back the jobs leased to ``worker`` that it did not run."""
+    return Job.objects.filter(locked_by=worker).update(locked_by="", locked_until=None)
+
+
+def run(job):
+    """Run a claimed job; returns True when it succeeded."""
+    registered = HANDLERS.get(job.name)
+    try:
+        if registered is None:
+            raise LookupError(f"No job handler is registered as {job.name!r}.")
+        with transaction.atomic():
+            registered.func(**job.payload)
+            Job.objects.filter(pk=job.pk, locked_by=job.locked_by).delete()
+    except Exception:
+        fail(job, traceback.format_exc()[-MAX_ERROR_LENGTH:])
+        return False
+    logger.info("Job %s done", job)
+    return True
+
+
+def backoff(attempts):
+    """Seconds before attempt ``attempts + 1``: exponential, with jitter."""
+    base = settings.JOBS_BACKOFF_SECONDS
+    delay = min(base * 2 ** (attempts - 1), settings.JOBS_BACKOFF_MAX_SECONDS)
+    return delay + random.uniform(0, base)
+
+
+def fail(job, error):
+    attempts = job.attempts + 1
+    if attempts < job.max_attempts:
+        delay = backoff(attempts)
+        Job.objects.filter(pk=job.pk, locked_by=job.locked_by).update(
+            attempts=attempts,
+            last_error=error,
+            run_at=timezone.now() + timedelta(seconds=delay),
+            locked_by="",
+            locked_until=None,
+        )
+        logger.warning(
+            "Job %s failed (attempt %d of %d), retrying in %.0f s:\n%s",
+            job,
+            attempts,
+            job.max_attempts,
+            delay,
+            error,
+        )
+        return
+
+    with transaction.atomic():
+        DeadLetterJob.objects.create(
+            name=job.name,
+            payload=job.payload,
+            priority=job.priority,
+            attempts=attempts,
+            error=error,
+            created_at=job.created_at,
+        )
+        Job.objects.filter(pk=job.pk).delete()
+    logger.error(
+        "Job %s failed %d times, moved to the dead letters:\n%s", job, attempts, error
+    )
+
+
+def requeue_dead(queryset=None):
+    """Queue dead letters (all by default) again with fresh attempts."""
+    if queryset is None:
+        queryset = DeadLetterJob.objects.all()
+    with transaction.atomic():
+        dead = list(queryset.select_for_update())
+        Job.objects.bulk_create(
+            Job(
+                name=job.name,
+                payload=job.payload,
+                priority=job.priority,
+                max_attempts=_max_attempts(job.name),
+            )
+            for job in dead
+        )
+        DeadLetterJob.objects.filter(pk__in=[job.pk for job in dead]).delete()
+    return len(dead)
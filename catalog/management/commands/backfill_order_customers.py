@@ -0,0 +1,83 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models.functions import Lower
+
+from catalog.models import Order
+
+
+class Command(BaseCommand):
+    help = (
+        "Link orders without a customer to the account with their email. "
+        "Works through the orders in id order, one short transaction per "
+        "batch, and can be stopped and resumed with --after-id."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Orders read per batch (default: %(default)s).",
+        )
+        parser.add_argument(
+            "--after-id",
+            type=int,
+            default=0,
+            help="Resume after this order id, as printed by an earlier run.",
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=0,
+            help="Seconds to pause between batches, to spread the load.",
+        )
+
+    def handle(self, *args, batch_size, after_id, sleep, **options):
+        if batch_size < 1:
+            raise CommandError("--batch-size must be at least 1.")
+
+        linked = 0
+        while True:
+            batch = list(
+                Order.objects.filter(customer__isnull=True, pk__gt=after_id)
+                .order_by("pk")
+                .values_list("pk", "customer_email")[:batch_size]
+            )
+            if not batch:
+                break
+
+            linked += self.link(batch)
+            after_id = batch[-1][0]
+            self.stdout.write(f"Up to order {after_id}: {linked} linked")
+            if sleep:
+                time.sleep(sleep)
+
+        self.stdout.write(self.style.SUCCESS(f"Done, {linked} orders linked."))
+
+    def link(self, batch):
+        emails = {email.lower() for _, email in batch}
+        users = dict(
+            get_user_model()
+            .objects.annotate(email_lower=Lower("email"))
+            .filter(email_lower__in=emails)
+            .values_list("email_lower", "pk")
+        )
+
+        orders_by_user = {}
+        for pk, email in batch:
+            user_id = users.get(email.lower())
+            if user_id is not None:
+                orders_by_user.setdefault(user_id, []).append(pk)
+
+        linked = 0
+        with transaction.atomic():
+            for user_id, order_ids in orders_by_user.items():
+                # Orders linked meanwhile (e.g. by a concurrent run) are left
+                # as they are.
+                linked += Order.objects.filter(
+                    pk__in=order_ids, customer__isnull=True
+                ).update(customer_id=user_id)
+        return linked
@@ -0,0 +1,195 @@
+import json
+import platform
+import random
+import subprocess
+import tempfile
+from pathlib import Path
+
+import django
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test.utils import override_settings
+
+from catalog import benchmark
+from e_commerce_API import db_router
+from catalog.models import Order, Product
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway database and load-test the API through its real "
+        "URLconf with concurrent clients; prints (or writes) a JSON report "
+        "of latency percentiles, throughput and queries per request."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--products",
+            type=int,
+            default=1000,
+            help="Products to seed, e.g. 1000, 100000 or 1000000 "
+            "(default: %(default)s).",
+        )
+        parser.add_argument(
+            "--orders", type=int, help="Orders to seed (default: one per product)."
+        )
+        parser.add_argument(
+            "--scenario",
+            action="append",
+            choices=list(benchmark.SCENARIOS),
+            help="Scenario to run; repeat for several (default: all).",
+        )
+        parser.add_argument(
+            "--requests",
+            type=int,
+            default=200,
+            help="Measured requests per scenario (default: %(default)s).",
+        )
+        parser.add_argument(
+            "--clients",
+            type=int,
+            default=8,
+            help="Concurrent clients (default: %(default)s).",
+        )
+        parser.add_argument(
+            "--warmup",
+            type=int,
+            default=20,
+            help="Unmeasured requests before each scenario (default: %(default)s).",
+        )
+        parser.add_argument(
+            "--seed", type=int, default=0, help="Random seed (default: %(default)s)."
+        )
+        parser.add_argument("--output", help="Write the JSON report to this file.")
+        parser.add_argument(
+            "--compare", help="Print the changes against this earlier JSON report."
+        )
+        parser.add_argument(
+            "--keepdb",
+            action="store_true",
+            help="Keep the benchmark database, and reuse it if it is already "
+            "seeded (the seed options are then ignored).",
+        )
+
+    def handle(self, *args, **options):
+        if min(options["products"], options["requests"], options["clients"]) < 1:
+            raise CommandError("--products, --requests and --clients must be >= 1.")
+        baseline = None
+        if options["compare"]:
+            try:
+                baseline = json.loads(Path(options["compare"]).read_text())
+            except (OSError, ValueError) as exc:
+                raise CommandError(f"Cannot read {options['compare']}: {exc}")
+
+        report = self.benchmark(options)
+        output = json.dumps(report, indent=2)
+        if options["output"]:
+            Path(options["output"]).write_text(output + "\n")
+            self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}."))
+        else:
+            self.stdout.write(output)
+
+        if baseline is not None:
+            self.print_comparison(benchmark.compare(baseline, report))
+
+    def benchmark(self, options):
+        products = options["products"]
+        orders = options["orders"] if options["orders"] is not None else products
+        keepdb = options["keepdb"]
+
+        if connection.vendor == "sqlite":
+            test_settings = connection.settings_dict["TEST"]
+            if not test_settings.get("NAME"):
+                # Threads cannot share SQLite's default in-memory test database.
+                test_settings["NAME"] = str(
+                    Path(tempfile.gettempdir()) / "e_commerce_benchmark.sqlite3"
+                )
+            # Concurrent writers queue on the database lock instead of failing
+            # with "database is locked" when a read transaction turns into a
+            # write.
+            connection.settings_dict["OPTIONS"].setdefault(
+                "transaction_mode", "IMMEDIATE"
+            )
+            connection.settings_dict["OPTIONS"].setdefault("timeout", 30)
+        old_name = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, keepdb=keepdb, serialize=False
+        )
+        for alias in db_router.replicas():
+            # Replicas read the benchmark database too
+            connections[alias].creation.set_as_test_mirror(connection.settings_dict)
+        try:
+            if keepdb and Product.objects.exists():
+                self.stdout.write("Reusing the seeded benchmark database.")
+            else:
+                self.stdout.write("Seeding the benchmark database...")
+                benchmark.seed(
+                    products, orders, random.Random(options["seed"]), self.stdout
+                )
+            return self.run_scenarios(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=keepdb)
+
+    def run_scenarios(self, options):
+        data = benchmark.Data()
+        names = options["scenario"] or list(benchmark.SCENARIOS)
+        report = {"meta": self.meta(options, data), "scenarios": {}}
+
+        # Measure the code, not the debug query log, the SQL sampling or the
+        # load shedding (the clients would exceed the analytics budget).
+        with override_settings(
+            DEBUG=False, SQL_INSTRUMENTATION_SAMPLE_RATE=0, ADMISSION_CONTROL=False
+        ):
+            for name in names:
+                cache.clear()
+                self.stdout.write(f"Running {name}...")
+                report["scenarios"][name] = benchmark.run(
+                    benchmark.SCENARIOS[name](data),
+                    requests=options["requests"],
+                    clients=options["clients"],
+                    warmup=options["warmup"],
+                    seed=options["seed"],
+                )
+        return report
+
+    def meta(self, options, data):
+        try:
+            commit = subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"],
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            commit = None
+        return {
+            "commit": commit,
+            "database": connection.vendor,
+            "products": len(data.product_ids),
+            "orders": Order.objects.count(),
+            "requests": options["requests"],
+            "clients": options["clients"],
+            "warmup": options["warmup"],
+            "seed": options["seed"],
+            "python": platform.python_version(),
+            "django": django.get_version(),
+        }
+
+    def print_comparison(self, changes):
+        self.stdout.write("")
+        header = f"{'scenario':<20}" + "".join(
+            f"{metric:>18}" for metric in benchmark.COMPARED
+        )
+        self.stdout.write(self.style.MIGRATE_HEADING(header))
+        for name, metrics in changes.items():
+            cells = []
+            for metric, (old, new, change) in metrics.items():
+                text = "n/a" if change is None else f"{change:+.1%}"
+                cell = f"{text:>18}"
+                if change is not None and abs(change) >= 0.05:
+                    # Higher is better for throughput, lower for the rest
+                    better = (change > 0) == (metric == "rps")
+                    cell = (self.style.SUCCESS if better else self.style.ERROR)(cell)
+                cells.append(cell)
+            self.stdout.write(f"{name:<20}" + "".join(cells))
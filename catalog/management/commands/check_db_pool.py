@@ -0,0 +1,83 @@
+import json
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from e_commerce_API import db_pool
+
+
+class Command(BaseCommand):
+    help = (
+        "Check the database connection pool (DATABASE_POOL): open it, run "
+        "concurrent clients through it and print its configuration and "
+        "statistics."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", default=DEFAULT_DB_ALIAS)
+        parser.add_argument(
+            "--clients",
+            type=int,
+            default=0,
+            help="Concurrent clients (default: twice the pool's max size, to "
+            "exercise waiting).",
+        )
+        parser.add_argument(
+            "--hold",
+            type=float,
+            default=0.05,
+            help="Seconds each client keeps its connection (default: %(default)s).",
+        )
+
+    def handle(self, *args, database, clients, hold, **options):
+        if database not in connections:
+            raise CommandError(f"Unknown database '{database}'.")
+        pool = getattr(connections[database], "pool", None)
+        if pool is None:
+            raise CommandError(
+                f"Database '{database}' is not pooled: set DATABASE_POOL=True "
+                "with a PostgreSQL DATABASE_URL."
+            )
+
+        try:
+            pool.open(wait=True, timeout=pool.timeout)
+        except Exception as exc:
+            raise CommandError(f"Cannot open the pool: {exc!r}")
+        clients = clients or pool.max_size * 2
+        errors = []
+
+        def client():
+            connection = connections[database]
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT pg_sleep(%s)", [hold])
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=client) for _ in range(clients)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        self.stdout.write(
+            json.dumps(
+                {
+                    "database": database,
+                    "clients": clients,
+                    "seconds": round(elapsed, 3),
+                    "errors": [str(exc) for exc in errors[:10]],
+                    "pool": db_pool.stats(database),
+                },
+                indent=2,
+            )
+        )
+        if errors:
+            raise CommandError(f"{len(errors)} of {clients} clients failed.")
+        self.stdout.write(self.style.SUCCESS("Pool OK."))
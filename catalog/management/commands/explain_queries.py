@@ -0,0 +1,99 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from catalog.filters import ProductFilter
+from catalog.models import LOW_STOCK_THRESHOLD, Category, Order, Product
+from catalog.views import ProductViewSet
+from users.models import users_named, users_with_email
+
+# One page of a keyset-paginated list
+PAGE = 21
+
+
+class Command(BaseCommand):
+    help = (
+        "Print the EXPLAIN plan of the queries behind the main endpoints, "
+        "to check which indexes they use."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--analyze",
+            action="store_true",
+            help="Run the queries and report actual timings (PostgreSQL only).",
+        )
+        parser.add_argument(
+            "--only", help="Only explain queries whose label contains this text."
+        )
+
+    def handle(self, *args, **options):
+        explain_options = {}
+        if options["analyze"]:
+            if connection.vendor != "postgresql":
+                raise CommandError("--analyze needs PostgreSQL.")
+            explain_options = {"analyze": True, "buffers": True}
+
+        for label, queryset in self.queries():
+            if options["only"] and options["only"] not in label:
+                continue
+            self.stdout.write(self.style.MIGRATE_HEADING(label))
+            self.stdout.write(queryset.explain(**explain_options))
+            self.stdout.write("")
+
+    def queries(self):
+        # Real values where there are some, so the planner sees typical data
+        slug = Category.objects.values_list("slug", flat=True).first() or "example"
+        customer = (
+            get_user_model().objects.filter(orders__isnull=False).first()
+            or get_user_model()(pk=0, email="customer@example.com")
+        )
+        products = ProductViewSet.queryset.all()
+        newest = ("-created_at", "-id")
+
+        def product_filter(**data):
+            return ProductFilter(data=data, queryset=products).qs
+
+        return [
+            ("products: list", products.order_by(*newest)[:PAGE]),
+            (
+                f"products: ?category={slug}",
+                product_filter(category=slug).order_by(*newest)[:PAGE],
+            ),
+            (
+                f"products: ?category={slug}&ordering=price",
+                product_filter(category=slug).order_by("price", "id")[:PAGE],
+            ),
+            (
+                f"products: by_category?slug={slug}",
+                products.filter(category__slug=slug).order_by(*newest)[:PAGE],
+            ),
+            (
+                "products: ?in_stock=false",
+                product_filter(in_stock=False).order_by(*newest)[:PAGE],
+            ),
+            (
+                "products: low_stock",
+                products.filter_stock(lte=LOW_STOCK_THRESHOLD, gt=0).order_by(*newest)[
+                    :PAGE
+                ],
+            ),
+            (
+                "products: out_of_stock",
+                products.filter_stock(exact=0).order_by(*newest)[:PAGE],
+            ),
+            (
+                "orders: my_orders / customer list",
+                Order.objects.for_customer(customer).order_by(*newest)[:PAGE],
+            ),
+            (
+                "orders: ?status=pending",
+                Order.objects.filter(status="pending").order_by(*newest)[:PAGE],
+            ),
+            (
+                "products: search by name prefix",
+                Product.objects.filter(name__startswith="a").order_by("name")[:PAGE],
+            ),
+            ("users: username, any case", users_named("example")),
+            ("users: email, any case", users_with_email("customer@example.com")),
+        ]
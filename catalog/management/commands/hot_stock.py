@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog import stock
+from catalog.models import Product
+
+
+class Command(BaseCommand):
+    help = (
+        "Manage hot-SKU stock buckets: enable or disable bucket mode for "
+        "products, or rebalance their buckets (all hot products by default)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("mode", choices=["enable", "disable", "rebalance"])
+        parser.add_argument("product_ids", nargs="*", type=int)
+        parser.add_argument(
+            "--buckets",
+            type=int,
+            default=stock.DEFAULT_BUCKETS,
+            help="Number of buckets when enabling (default: %(default)s).",
+        )
+
+    def handle(self, *args, mode, product_ids, buckets, **options):
+        if mode == "enable" and buckets < 1:
+            raise CommandError("--buckets must be at least 1.")
+        if not product_ids:
+            if mode != "rebalance":
+                raise CommandError(f"Give the ids of the products to {mode}.")
+            product_ids = list(
+                Product.objects.filter(is_hot=True).values_list("pk", flat=True)
+            )
+
+        for product_id in product_ids:
+            try:
+                if mode == "enable":
+                    total = stock.enable(product_id, buckets=buckets)
+                elif mode == "disable":
+                    total = stock.disable(product_id)
+                else:
+                    total = stock.rebalance(product_id)
+            except Product.DoesNotExist:
+                raise CommandError(f"Product {product_id} does not exist.")
+            self.stdout.write(f"Product {product_id}: {mode}d, {total} in stock")
+
+        self.stdout.write(self.style.SUCCESS(f"Done ({len(product_ids)} products)."))
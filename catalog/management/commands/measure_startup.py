@@ -0,0 +1,127 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Run in a fresh interpreter, as a new worker would be: load the
+# application, optionally run the worker warm-up, then time two requests
+# to each path. The worker gets a cache of its own, emptied after the
+# warm-up, so the first timed request is never a response cache hit: it
+# shows what warming imports, connections and serializers saves.
+WORKER = """
+import json, os, sys, time
+
+start = time.perf_counter()
+import django
+from django.test import Client
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "e_commerce_API.settings")
+import {module}
+boot = time.perf_counter() - start
+
+warmup_seconds = 0.0
+if os.environ["WARMUP"] == "True":
+    from e_commerce_API import warmup
+    start = time.perf_counter()
+    warmup.connect()
+    warmup.replay()
+    warmup_seconds = time.perf_counter() - start
+    from django.core.cache import cache
+    cache.clear()
+
+client = Client(raise_request_exception=False)
+requests = {{}}
+for path in json.loads(sys.argv[1]):
+    times = []
+    for _ in range(2):
+        start = time.perf_counter()
+        status = client.get(path).status_code
+        times.append(time.perf_counter() - start)
+    requests[path] = {{"status": status, "first": times[0], "second": times[1]}}
+print(json.dumps({{"boot": boot, "warmup": warmup_seconds, "requests": requests}}))
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure worker boot time and first-request latency, with and "
+        "without the warm-up stage (e_commerce_API.warmup), as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--path",
+            action="append",
+            help="Path to request after boot; repeat for several "
+            "(default: WARMUP_REQUESTS).",
+        )
+        parser.add_argument(
+            "--runs",
+            type=int,
+            default=3,
+            help="Fresh processes per mode; medians are reported "
+            "(default: %(default)s).",
+        )
+        parser.add_argument(
+            "--server",
+            choices=["wsgi", "asgi"],
+            default="asgi",
+            help="Application module to load (default: %(default)s, as in "
+            "the Procfile).",
+        )
+
+    def handle(self, *args, path, runs, server, **options):
+        if runs < 1:
+            raise CommandError("--runs must be at least 1.")
+        paths = path or list(settings.WARMUP_REQUESTS) or ["/api/products/"]
+        script = WORKER.format(module=f"e_commerce_API.{server}")
+
+        report = {"server": server, "runs": runs, "paths": paths}
+        for mode, warmup in (("cold", "False"), ("warm", "True")):
+            samples = [self.run_worker(script, paths, warmup) for _ in range(runs)]
+            report[mode] = self.summarize(samples, paths)
+        self.stdout.write(json.dumps(report, indent=2))
+
+    def run_worker(self, script, paths, warmup):
+        env = {
+            **os.environ,
+            "WARMUP": warmup,
+            "SQL_INSTRUMENTATION_SAMPLE_RATE": "0",
+            # Private to the process, so clearing it touches no shared cache
+            # and no run is served entries stored by an earlier one.
+            "CACHE_BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+        result = subprocess.run(
+            [sys.executable, "-c", script, json.dumps(paths)],
+            capture_output=True,
+            text=True,
+            env=env,
+            cwd=settings.BASE_DIR,
+        )
+        if result.returncode != 0:
+            raise CommandError(f"The worker process failed:\n{result.stderr}")
+        return json.loads(result.stdout.strip().splitlines()[-1])
+
+    def summarize(self, samples, paths):
+        def median_ms(values):
+            return round(statistics.median(values) * 1000, 2)
+
+        return {
+            "boot_ms": median_ms([sample["boot"] for sample in samples]),
+            "warmup_ms": median_ms([sample["warmup"] for sample in samples]),
+            "requests": {
+                path: {
+                    "status": samples[-1]["requests"][path]["status"],
+                    "first_ms": median_ms(
+                        [sample["requests"][path]["first"] for sample in samples]
+                    ),
+                    "second_ms": median_ms(
+                        [sample["requests"][path]["second"] for sample in samples]
+                    ),
+                }
+                for path in paths
+            },
+        }
@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from catalog.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete expired idempotency keys, in batches so no long-running "
+        "delete holds locks. Run it periodically, e.g. daily."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Keys deleted per batch (default: %(default)s).",
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=0,
+            help="Seconds to pause between batches, to spread the load.",
+        )
+
+    def handle(self, *args, batch_size, sleep, **options):
+        if batch_size < 1:
+            raise CommandError("--batch-size must be at least 1.")
+
+        now = timezone.now()
+        deleted = 0
+        while True:
+            batch = list(
+                IdempotencyKey.objects.filter(expires_at__lte=now).values_list(
+                    "pk", flat=True
+                )[:batch_size]
+            )
+            if not batch:
+                break
+            deleted += IdempotencyKey.objects.filter(pk__in=batch).delete()[0]
+            if sleep:
+                time.sleep(sleep)
+
+        self.stdout.write(self.style.SUCCESS(f"Done, {deleted} expired keys deleted."))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from catalog import search
+from catalog.models import ProductSearchEntry
+
+
+class Command(BaseCommand):
+    help = "Rebuild the product full-text search index from scratch."
+
+    def handle(self, *args, **options):
+        search.rebuild()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Indexed {ProductSearchEntry.objects.count()} products."
+            )
+        )
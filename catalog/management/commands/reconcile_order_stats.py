@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from catalog.models import OrderStatusCounter
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the order status counters behind /api/orders/statistics/ "
+        "from the orders table and report any drift."
+    )
+
+    def handle(self, *args, **options):
+        drift = 0
+        for status, (counted, actual) in OrderStatusCounter.objects.rebuild().items():
+            if counted == actual:
+                self.stdout.write(f"{status}: {actual[0]} orders, {actual[1]:.2f} revenue")
+                continue
+
+            drift += 1
+            self.stdout.write(
+                self.style.WARNING(
+                    f"{status}: counted {counted[0]} orders / {counted[1]:.2f} revenue, "
+                    f"actual {actual[0]} orders / {actual[1]:.2f} revenue"
+                )
+            )
+
+        if drift:
+            self.stdout.write(
+                self.style.WARNING(f"Corrected drift in {drift} status counter(s).")
+            )
+        else:
+            self.stdout.write(self.style.SUCCESS("Counters were in sync."))
@@ -0,0 +1,78 @@
+import signal
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, close_old_connections
+
+from catalog import jobs
+
+
+class Command(BaseCommand):
+    help = (
+        "Run queued background jobs (catalog.jobs) until stopped. SIGTERM "
+        "and SIGINT stop the worker after its current job."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit once no job is due instead of polling.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=10,
+            help="Jobs claimed at a time (default: %(default)s).",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=1.0,
+            help="Seconds to wait when no job is due (default: %(default)s).",
+        )
+        parser.add_argument(
+            "--requeue-dead",
+            action="store_true",
+            help="Queue every dead-letter job again, then exit.",
+        )
+
+    def handle(self, *args, once, batch_size, poll_interval, requeue_dead, **options):
+        if batch_size < 1:
+            raise CommandError("--batch-size must be at least 1.")
+        if requeue_dead:
+            count = jobs.requeue_dead()
+            self.stdout.write(f"Requeued {count} dead-letter jobs.")
+            return
+
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        worker = jobs.worker_id()
+        self.stdout.write(f"Worker {worker} started.")
+        done = failed = 0
+        while not self.stopping:
+            close_old_connections()
+            try:
+                batch = jobs.claim(worker, batch_size)
+            except OperationalError as e:
+                # Database restarting or locked: try again on the next poll
+                self.stderr.write(f"Could not claim jobs: {e}")
+                batch = []
+            for job in batch:
+                if self.stopping:
+                    break
+                if jobs.run(job):
+                    done += 1
+                else:
+                    failed += 1
+            if not batch:
+                if once:
+                    break
+                time.sleep(poll_interval)
+        jobs.release(worker)
+        self.stdout.write(f"Worker {worker} stopped: {done} done, {failed} failed.")
+
+    def stop(self, signum, frame):
+        self.stopping = True
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.4 on 2026-10-18 06:07
+
+import catalog.search
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def install_search_index(apps, schema_editor):
+    catalog.search.install(schema_editor)
+
+
+def uninstall_search_index(apps, schema_editor):
+    catalog.search.uninstall(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0004_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSearchEntry',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_entry', serialize=False, to='catalog.product')),
+                ('document', catalog.search.SearchDocumentField()),
+            ],
+            options={
+                'db_table': 'catalog_product_search',
+                'managed': False,
+            },
+        ),
+        migrations.RunPython(install_search_index, uninstall_search_index),
+    ]
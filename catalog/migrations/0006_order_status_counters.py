@@ -0,0 +1,55 @@
+# Generated by Django 5.2.4 on 2026-10-18 06:08
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+SHARDS = 8
+
+
+def seed_counters(apps, schema_editor):
+    Order = apps.get_model("catalog", "Order")
+    OrderStatusCounter = apps.get_model("catalog", "OrderStatusCounter")
+
+    actual = {
+        row["status"]: (row["order_count"], row["revenue"] or 0)
+        for row in Order.objects.values("status")
+        .annotate(order_count=Count("id"), revenue=Sum("total_amount"))
+        .order_by()
+    }
+    counters = []
+    for status in ["pending", "processing", "completed", "cancelled"]:
+        order_count, revenue = actual.get(status, (0, 0))
+        counters.append(
+            OrderStatusCounter(
+                status=status, shard=0, order_count=order_count, revenue=revenue
+            )
+        )
+        counters.extend(
+            OrderStatusCounter(status=status, shard=shard)
+            for shard in range(1, SHARDS)
+        )
+    OrderStatusCounter.objects.bulk_create(counters)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0005_product_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderStatusCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('completed', 'Completed'), ('cancelled', 'Cancelled')], max_length=20)),
+                ('shard', models.PositiveSmallIntegerField(default=0)),
+                ('order_count', models.BigIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'unique_together': {('status', 'shard')},
+            },
+        ),
+        migrations.RunPython(seed_counters, migrations.RunPython.noop),
+    ]
@@ -1,24 +1,84 @@
-from django.db import models
+import random
+
+from django.db import models, transaction
+from django.db.models import Case, Count, F, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, Lower
 from django.conf import settings
+from django.utils import timezone
 from django.utils.text import slugify
+from rest_framework.utils.encoders import JSONEncoder
+
+from .search import SearchDocumentField
+
+
+# Stock level at or below which a product counts as low stock
+LOW_STOCK_THRESHOLD = 10
 
 
 class Category(models.Model):
     name = models.CharField(max_length=100, unique=True)
     slug = models.SlugField(unique=True, blank=True)
 
+    class Meta:
+        indexes = [
+            # Case-insensitive slug lookups (ProductFilter.category)
+            models.Index(Lower("slug"), name="catalog_category_slug_lower"),
+        ]
+
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
         super().save(*args, **kwargs)
 
 
+class ProductQuerySet(models.QuerySet):
+    def with_available_stock(self):
+        """
+        Annotate ``stock_total``: the stock of a product including what its
+        buckets hold when it is in hot-SKU mode.
+        """
+        if "stock_total" in self.query.annotations:
+            return self
+        bucket_total = (
+            ProductStockBucket.objects.filter(product=OuterRef("pk"))
+            .values("product")
+            .annotate(total=Sum("quantity"))
+            .values("total")
+        )
+        return self.annotate(
+            stock_total=Case(
+                When(
+                    is_hot=True,
+                    then=F("stock_quantity") + Coalesce(Subquery(bucket_total), 0),
+                ),
+                default=F("stock_quantity"),
+                output_field=models.PositiveIntegerField(),
+            )
+        )
+
+    def filter_stock(self, **lookups):
+        """
+        Filter on total stock, e.g. ``filter_stock(gt=0)``.
+
+        Regular products are compared on the stock_quantity column so the
+        condition can use its indexes; only hot products need the sum.
+        """
+        queryset = self.with_available_stock()
+        for lookup, value in lookups.items():
+            queryset = queryset.filter(
+                Q(is_hot=False, **{f"stock_quantity__{lookup}": value})
+                | Q(is_hot=True, **{f"stock_total__{lookup}": value})
+            )
+        return queryset
+
+
 class Product(models.Model):
     name = models.CharField(max_length=200)
     description = models.TextField(blank=True)
     price = models.DecimalField(max_digits=10, decimal_places=2)
+    # Indexed by the (category, ...) composite indexes below
     category = models.ForeignKey(
-        Category, on_delete=models.PROTECT, related_name="products"
+        Category, on_delete=models.PROTECT, related_name="products", db_index=False
     )
     stock_quantity = models.PositiveIntegerField(default=0)
     image_url = models.URLField(blank=True)
@@ -26,17 +86,98 @@ class Product(models.Model):
     owner = models.ForeignKey(
         settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="products"
     )
+    # Hot-SKU mode: stock is spread over ProductStockBucket rows so orders
+    # do not all lock this row (see catalog.stock)
+    is_hot = models.BooleanField(default=False)
+
+    objects = ProductQuerySet.as_manager()
 
     class Meta:
         ordering = ["-created_at"]
         indexes = [
             models.Index(fields=["name"]),
-            models.Index(fields=["price"]),
+            # Keyset pagination seeks on (ordering field, id)
+            models.Index(fields=["price", "id"]),
+            models.Index(fields=["-created_at", "-id"]),
+            # The same orderings within a category (category filter, by_category)
+            models.Index(fields=["category", "price", "id"]),
+            models.Index(fields=["category", "-created_at", "-id"]),
+            # low_stock / out_of_stock only ever look at the low end
+            models.Index(
+                fields=["stock_quantity"],
+                condition=Q(stock_quantity__lte=LOW_STOCK_THRESHOLD),
+                name="catalog_product_low_stock",
+            ),
+            # Hot products are few; lets the hot branch of filter_stock use an
+            # index too
+            models.Index(
+                fields=["id"], condition=Q(is_hot=True), name="catalog_product_hot"
+            ),
         ]
 
     def __str__(self):
         return self.name
 
+    @property
+    def available_stock(self):
+        """Total stock, including stock held in hot-SKU buckets."""
+        if hasattr(self, "stock_total"):
+            return self.stock_total
+        if not self.is_hot:
+            return self.stock_quantity
+        in_buckets = self.stock_buckets.aggregate(total=Sum("quantity"))["total"]
+        return self.stock_quantity + (in_buckets or 0)
+
+
+class ProductStockBucket(models.Model):
+    """
+    Share of a hot product's stock that orders can draw from independently.
+    """
+
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name="stock_buckets"
+    )
+    bucket = models.PositiveSmallIntegerField()
+    quantity = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ["product", "bucket"]
+
+    def __str__(self):
+        return f"{self.product_id}[{self.bucket}]: {self.quantity}"
+
+
+class ProductSearchEntry(models.Model):
+    """
+    Row of the product full-text index maintained by catalog.search.
+
+    The table is created by a migration with vendor specific SQL (an FTS5
+    virtual table on SQLite, a tsvector column with a GIN index on
+    PostgreSQL), so the model is unmanaged and only used for joins.
+    """
+
+    product = models.OneToOneField(
+        Product,
+        primary_key=True,
+        on_delete=models.DO_NOTHING,
+        related_name="search_entry",
+    )
+    document = SearchDocumentField()
+
+    class Meta:
+        managed = False
+        db_table = "catalog_product_search"
+
+
+class OrderQuerySet(models.QuerySet):
+    def for_customer(self, user):
+        """
+        Orders of ``user``: those linked to the account, and guest orders
+        placed with its email that are not linked to any account yet.
+        """
+        guest = Q(customer__isnull=True, customer_email=user.email.lower())
+        return self.filter(Q(customer=user) | guest)
+
 
 class Order(models.Model):
     STATUS_CHOICES = [
@@ -46,18 +187,71 @@ class Order(models.Model):
         ("cancelled", "Cancelled"),
     ]
 
+    # Statuses an order may move to, with the statuses it may come from
+    ALLOWED_TRANSITIONS = {
+        "processing": ["pending"],
+        "completed": ["pending", "processing"],
+        "cancelled": ["pending", "processing"],
+    }
+
     customer_email = models.EmailField()
+    # The account owning the order; null for guest orders, which are matched
+    # by customer_email (see OrderQuerySet.for_customer).
+    customer = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="orders",
+        # Indexed by the (customer, ...) composite index below
+        db_index=False,
+    )
     total_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = OrderQuerySet.as_manager()
+
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            # Keyset pagination seeks on (ordering field, id)
+            models.Index(fields=["-created_at", "-id"]),
+            models.Index(fields=["total_amount", "id"]),
+            # A customer's orders (for_customer: linked and guest orders)
+            # and the status filter, newest first
+            models.Index(fields=["customer", "-created_at", "-id"]),
+            models.Index(fields=["customer_email", "-created_at", "-id"]),
+            models.Index(fields=["status", "-created_at", "-id"]),
+        ]
 
     def __str__(self):
         return f"Order #{self.id} - {self.customer_email}"
 
+    def is_owned_by(self, user):
+        if self.customer_id is not None:
+            return self.customer_id == user.pk
+        return self.customer_email == user.email.lower()
+
+    def transition_to(self, status):
+        """
+        Move the order to ``status`` and update the status counters.
+
+        The update only applies while the order still has the status we
+        read, so concurrent transitions cannot both succeed. Returns False
+        when another request changed the status first.
+        """
+        updated = Order.objects.filter(pk=self.pk, status=self.status).update(
+            status=status, updated_at=timezone.now()
+        )
+        if not updated:
+            return False
+
+        OrderStatusCounter.objects.record(self.status, status, amount=self.total_amount)
+        self.status = status
+        return True
+
 
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name="items")
@@ -79,3 +273,186 @@ class OrderItem(models.Model):
 
     def __str__(self):
         return f"{self.quantity}x {self.product.name}"
+
+
+class OrderStatusCounterManager(models.Manager):
+    def record(self, from_status, to_status, count=1, amount=0):
+        """
+        Move ``count`` orders worth ``amount`` from one status to another.
+
+        ``from_status`` is None for new orders and ``to_status`` is None for
+        deleted ones. Call it inside the transaction that changes the
+        orders so the counters commit or roll back with them.
+        """
+        shard = random.randrange(OrderStatusCounter.SHARDS)
+        statuses = [status for status in (from_status, to_status) if status]
+        if not statuses or from_status == to_status:
+            return
+
+        sign = Case(When(status=to_status, then=Value(1)), default=Value(-1))
+        changes = {
+            "order_count": F("order_count") + sign * count,
+            "revenue": F("revenue") + sign * Value(amount, output_field=models.DecimalField()),
+        }
+        counters = self.filter(status__in=statuses, shard=shard)
+        if counters.update(**changes) < len(statuses):
+            # A counter row is missing (e.g. SHARDS was raised): create it and
+            # apply the change to it alone.
+            existing = set(counters.values_list("status", flat=True))
+            for status in statuses:
+                if status not in existing:
+                    counter, _ = self.get_or_create(status=status, shard=shard)
+                    self.filter(pk=counter.pk).update(**changes)
+
+    def rebuild(self):
+        """
+        Recompute the counters from the orders table.
+
+        Holds locks on every counter row while counting so transitions that
+        commit concurrently are applied on top of the rebuilt values rather
+        than lost. Returns {status: (counted, actual)} with the previous and
+        the recomputed (order_count, revenue) of each status.
+        """
+        statuses = [status for status, _ in Order.STATUS_CHOICES]
+        self.bulk_create(
+            [
+                OrderStatusCounter(status=status, shard=shard)
+                for status in statuses
+                for shard in range(OrderStatusCounter.SHARDS)
+            ],
+            ignore_conflicts=True,
+        )
+
+        with transaction.atomic():
+            list(self.select_for_update().order_by("pk"))
+            counted = self.totals()
+            actual = {
+                row["status"]: (row["order_count"], row["revenue"] or 0)
+                for row in Order.objects.values("status")
+                .annotate(order_count=Count("id"), revenue=Sum("total_amount"))
+                .order_by()
+            }
+
+            self.update(order_count=0, revenue=0)
+            for status, (order_count, revenue) in actual.items():
+                self.filter(status=status, shard=0).update(
+                    order_count=order_count, revenue=revenue
+                )
+
+        return {
+            status: (counted.get(status, (0, 0)), actual.get(status, (0, 0)))
+            for status in statuses
+        }
+
+    def totals(self):
+        """Return {status: (order_count, revenue)} summed over all shards."""
+        return {
+            row["status"]: (row["order_count"], row["revenue"])
+            for row in self.values("status")
+            .annotate(order_count=Sum("order_count"), revenue=Sum("revenue"))
+            .order_by()
+        }
+
+
+class OrderStatusCounter(models.Model):
+    """
+    Running number of orders and revenue per status.
+
+    Each status is split over SHARDS rows and every update picks one at
+    random, so concurrent orders do not all queue on the same counter row.
+    Individual shards can go negative; only their sum is meaningful.
+    """
+
+    SHARDS = 8
+
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    shard = models.PositiveSmallIntegerField(default=0)
+    order_count = models.BigIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    objects = OrderStatusCounterManager()
+
+    class Meta:
+        unique_together = ["status", "shard"]
+
+    def __str__(self):
+        return f"{self.status}[{self.shard}]: {self.order_count}"
+
+
+class IdempotencyKey(models.Model):
+    """
+    An Idempotency-Key a user sent with a POST, and the response the
+    request got, replayed to retries until ``expires_at`` (see
+    catalog.idempotency).
+    """
+
+    # Indexed by the unique constraint below
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="+",
+        db_index=False,
+    )
+    key = models.CharField(max_length=255)
+    # sha256 of the method, path and body the key was first used with
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True)
+    # Response data, encoded as DRF renders it
+    response = models.JSONField(encoder=JSONEncoder, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Purged by manage.py purge_idempotency_keys
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "key"], name="catalog_idempotencykey_user_key"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.user_id}:{self.key}"
+
+
+class Job(models.Model):
+    """
+    A unit of background work, run by ``manage.py run_jobs`` (see
+    catalog.jobs). Rows are deleted once the job succeeds.
+    """
+
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(encoder=JSONEncoder, default=dict)
+    # Higher runs first
+    priority = models.SmallIntegerField(default=0)
+    run_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField()
+    last_error = models.TextField(blank=True)
+    # The worker running the job, until the lease runs out
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Workers' polling: due jobs, highest priority first
+            models.Index(fields=["-priority", "run_at", "id"], name="catalog_job_due"),
+        ]
+
+    def __str__(self):
+        return f"{self.name}#{self.pk}"
+
+
+class DeadLetterJob(models.Model):
+    """A job that failed max_attempts times, kept for inspection or requeueing."""
+
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(encoder=JSONEncoder, default=dict)
+    priority = models.SmallIntegerField(default=0)
+    attempts = models.PositiveSmallIntegerField()
+    error = models.TextField()
+    created_at = models.DateTimeField()
+    failed_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.name} (dead, {self.attempts} attempts)"
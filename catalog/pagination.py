@@ -0,0 +1,183 @@
+import json
+from base64 import b64decode, b64encode
+from operator import attrgetter
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor pagination keyed on a composite, unique ordering.
+
+    DRF's CursorPagination only seeks on the first ordering field and uses
+    an offset to step over ties. Here the cursor stores the values of every
+    ordering field and pages are fetched with a row comparison such as
+    ``(created_at, id) < (x, y)``, so any page costs the same as the first
+    one as long as an index covers the ordering.
+
+    Orderings chosen through OrderingFilter get ``id`` appended as a
+    tiebreaker in the same direction, which keeps pages stable when many
+    rows share a price or total.
+    """
+
+    ordering = ("-created_at", "-id")
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 100
+
+    def get_ordering(self, request, queryset, view):
+        ordering = None
+        for backend in getattr(view, "filter_backends", []):
+            if hasattr(backend, "get_ordering"):
+                ordering = backend().get_ordering(request, queryset, view)
+                break
+
+        # Without a requested ordering keep the one the queryset already has
+        # (e.g. search relevance), then fall back to the default.
+        ordering = list(ordering or queryset.query.order_by or type(self).ordering)
+        fields = [field.lstrip("-") for field in ordering]
+        if "id" not in fields and "pk" not in fields:
+            ordering.append("-id" if ordering[0].startswith("-") else "id")
+        return tuple(ordering)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = self._page_queryset(queryset, request, view)
+        if queryset is None:
+            return None
+        return self._set_page(list(queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """paginate_queryset for async views, fetching with the async ORM."""
+        queryset = self._page_queryset(queryset, request, view)
+        if queryset is None:
+            return None
+        return self._set_page([row async for row in queryset])
+
+    def _page_queryset(self, queryset, request, view):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.ordering_fields = [
+            _ordering_field(queryset, field.lstrip("-")) for field in self.ordering
+        ]
+        self.cursor = self.decode_cursor(request)
+
+        if self.cursor is None:
+            self.position, self.reverse = None, False
+        else:
+            self.position, self.reverse = self.cursor
+
+        ordering = self.ordering
+        if self.reverse:
+            ordering = tuple(_invert(field) for field in ordering)
+
+        queryset = queryset.order_by(*ordering)
+        if self.position is not None:
+            queryset = queryset.filter(_seek(ordering, self.position))
+
+        # Fetch one extra row to know whether another page follows.
+        return queryset[: self.page_size + 1]
+
+    def _set_page(self, results):
+        self.page = results[: self.page_size]
+        has_more = len(results) > self.page_size
+
+        if self.reverse:
+            self.page.reverse()
+            self.has_previous = has_more
+            self.has_next = self.position is not None
+        else:
+            self.has_next = has_more
+            self.has_previous = self.position is not None
+
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor((self._position(self.page[-1]), False))
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor((self._position(self.page[0]), True))
+
+    def encode_cursor(self, cursor):
+        position, reverse = cursor
+        payload = json.dumps({"p": position, "r": int(reverse)}, separators=(",", ":"))
+        encoded = b64encode(payload.encode("ascii")).decode("ascii")
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+
+        try:
+            payload = json.loads(b64decode(encoded.encode("ascii")).decode("ascii"))
+            position = [str(value) for value in payload["p"]]
+            reverse = bool(payload.get("r", 0))
+        except (TypeError, ValueError, KeyError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+        if len(position) != len(self.ordering):
+            # The cursor was issued for a different ordering.
+            raise NotFound(self.invalid_cursor_message)
+
+        # A tampered position must not reach the query as an invalid value
+        try:
+            position = [
+                field.to_python(value)
+                for field, value in zip(self.ordering_fields, position)
+            ]
+        except (ValidationError, TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+        return position, reverse
+
+    def _position(self, instance):
+        values = []
+        for field in self.ordering:
+            value = attrgetter(field.lstrip("-").replace("__", "."))(instance)
+            values.append(value.isoformat() if hasattr(value, "isoformat") else str(value))
+        return values
+
+
+def _ordering_field(queryset, name):
+    """The model field, or annotation output field, ordered on by ``name``."""
+    if name in queryset.query.annotations:
+        return queryset.query.annotations[name].output_field
+    opts = queryset.model._meta
+    field = None
+    for part in name.split("__"):
+        field = opts.pk if part == "pk" else opts.get_field(part)
+        if field.is_relation:
+            opts = field.related_model._meta
+    return field
+
+
+def _invert(field):
+    return field[1:] if field.startswith("-") else "-" + field
+
+
+def _seek(ordering, position):
+    """
+    Build the keyset condition for rows that come after ``position`` in
+    ``ordering``, expanded as (a > x) OR (a = x AND b > y) OR ...
+    """
+    condition = Q()
+    equal = {}
+    for field, value in zip(ordering, position):
+        name = field.lstrip("-")
+        lookup = "lt" if field.startswith("-") else "gt"
+        condition |= Q(**equal, **{f"{name}__{lookup}": value})
+        equal[name] = value
+    return condition
@@ -0,0 +1,271 @@
+"""
+Full-text search over products.
+
+Each product has one row in the ``catalog_product_search`` shadow table
+holding its name, category name and description with decreasing weights.
+On PostgreSQL the row is a weighted tsvector behind a GIN index, on SQLite
+it lives in an FTS5 virtual table. Other databases fall back to the plain
+``icontains`` search of DRF's SearchFilter.
+
+The index is refreshed from Product/Category signals (see catalog.signals)
+and can be rebuilt with ``manage.py rebuild_search_index``.
+"""
+
+import re
+
+from django.db import connections, router
+from django.db.models import Field, FloatField, Func, Lookup, Value
+
+TABLE = "catalog_product_search"
+
+# Relative weight of each indexed field: name > category > description
+WEIGHTS = {"name": 10.0, "category": 4.0, "description": 1.0}
+
+# The tsvector label of each field, see POSTGRESQL_UPSERT
+LABELS = {"name": "A", "category": "B", "description": "C"}
+
+
+def _ts_rank_weights():
+    """WEIGHTS as the ts_rank array of labels D, C, B, A, scaled to 0..1."""
+    top = max(WEIGHTS.values())
+    by_label = {LABELS[field]: weight / top for field, weight in WEIGHTS.items()}
+    return "{%s}" % ",".join(str(by_label.get(label, 0.0)) for label in "DCBA")
+
+
+TS_RANK_WEIGHTS = _ts_rank_weights()
+
+# Longest query we turn into search terms
+MAX_TERMS = 10
+
+CHUNK_SIZE = 500
+
+WORD_RE = re.compile(r"\w+")
+
+
+class SearchDocumentField(Field):
+    """The indexed document column of ProductSearchEntry."""
+
+    def db_type(self, connection):
+        # The column is created by the search migration, never by Django.
+        return None
+
+
+@SearchDocumentField.register_lookup
+class SearchMatch(Lookup):
+    """``search_entry__document__matches=<query>``: full-text match."""
+
+    lookup_name = "matches"
+
+    def as_sql(self, compiler, connection):
+        raise NotImplementedError(
+            "Full-text search is not supported on %s." % connection.vendor
+        )
+
+    def as_sqlite(self, compiler, connection):
+        rhs, params = self.process_rhs(compiler, connection)
+        # FTS5 matches against the hidden column named after the table.
+        table = connection.ops.quote_name(self.lhs.alias)
+        return f"{table} MATCH {rhs}", params
+
+    def as_postgresql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return (
+            f"{lhs} @@ to_tsquery('english'::regconfig, {rhs})",
+            (*lhs_params, *rhs_params),
+        )
+
+
+class SearchRank(Func):
+    """Relevance of a matched document, higher is better."""
+
+    output_field = FloatField()
+
+    def __init__(self, document, query):
+        super().__init__(document, Value(query))
+
+    def as_sql(self, compiler, connection, **extra_context):
+        raise NotImplementedError(
+            "Full-text search is not supported on %s." % connection.vendor
+        )
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        document, _ = self.source_expressions
+        table = connection.ops.quote_name(document.alias)
+        # bm25 weights follow the column order of the FTS5 table; product_id
+        # is stored unindexed and gets no weight. bm25 is lower-is-better.
+        weights = ", ".join(str(weight) for weight in WEIGHTS.values())
+        return f"-bm25({table}, 0.0, {weights})", []
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        document, query = self.source_expressions
+        lhs, lhs_params = compiler.compile(document)
+        rhs, rhs_params = compiler.compile(query)
+        return (
+            f"ts_rank('{TS_RANK_WEIGHTS}'::float4[], {lhs}, "
+            f"to_tsquery('english'::regconfig, {rhs}))",
+            (*lhs_params, *rhs_params),
+        )
+
+
+def search_terms(query):
+    """Split a user query into lowercase words."""
+    return WORD_RE.findall(query.lower())[:MAX_TERMS]
+
+
+def is_supported(using):
+    return connections[using].vendor in ("sqlite", "postgresql")
+
+
+def build_query(terms, vendor):
+    """Turn search terms into an all-terms, prefix-matching full-text query."""
+    if vendor == "postgresql":
+        return " & ".join(f"{term}:*" for term in terms)
+    return " ".join('"%s"*' % term for term in terms)
+
+
+def search(queryset, query, rank=True):
+    """
+    Filter a Product queryset to full-text matches of ``query``.
+
+    With ``rank`` the queryset is annotated with ``search_rank`` and ordered
+    by relevance.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return queryset
+
+    vendor = connections[queryset.db].vendor
+    match = build_query(terms, vendor)
+    queryset = queryset.filter(search_entry__document__matches=match)
+    if rank:
+        queryset = queryset.annotate(
+            search_rank=SearchRank("search_entry__document", match)
+        ).order_by("-search_rank", "-id")
+    return queryset
+
+
+# Index maintenance
+
+
+def _write_connection():
+    from .models import Product
+
+    return connections[router.db_for_write(Product)]
+
+
+def _chunks(ids):
+    ids = list(ids)
+    for start in range(0, len(ids), CHUNK_SIZE):
+        yield ids[start : start + CHUNK_SIZE]
+
+
+def _placeholders(values):
+    return ", ".join(["%s"] * len(values))
+
+
+SQLITE_SELECT = """
+    SELECT p.id, p.id, p.name, c.name, p.description
+    FROM catalog_product p
+    INNER JOIN catalog_category c ON c.id = p.category_id
+"""
+
+POSTGRESQL_UPSERT = """
+    INSERT INTO catalog_product_search (product_id, document)
+    SELECT
+        p.id,
+        setweight(to_tsvector('english'::regconfig, p.name), 'A')
+        || setweight(to_tsvector('english'::regconfig, c.name), 'B')
+        || setweight(to_tsvector('english'::regconfig, p.description), 'C')
+    FROM catalog_product p
+    INNER JOIN catalog_category c ON c.id = p.category_id
+    WHERE {where}
+    ON CONFLICT (product_id) DO UPDATE SET document = EXCLUDED.document
+"""
+
+
+def _reindex(connection, where, params):
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            cursor.execute(
+                f"DELETE FROM {TABLE} WHERE rowid IN "
+                f"(SELECT p.id FROM catalog_product p WHERE {where})",
+                params,
+            )
+            cursor.execute(
+                f"INSERT INTO {TABLE} (rowid, product_id, name, category, description) "
+                f"{SQLITE_SELECT} WHERE {where}",
+                params,
+            )
+        elif connection.vendor == "postgresql":
+            cursor.execute(POSTGRESQL_UPSERT.format(where=where), params)
+
+
+def index_products(product_ids):
+    """Add or refresh the index rows of the given products."""
+    connection = _write_connection()
+    if not is_supported(connection.alias):
+        return
+    for chunk in _chunks(product_ids):
+        _reindex(connection, f"p.id IN ({_placeholders(chunk)})", chunk)
+
+
+def index_category(category_id):
+    """Refresh the rows of every product in a category, e.g. after a rename."""
+    connection = _write_connection()
+    if is_supported(connection.alias):
+        _reindex(connection, "p.category_id = %s", [category_id])
+
+
+def remove_products(product_ids):
+    connection = _write_connection()
+    if not is_supported(connection.alias):
+        return
+    column = "rowid" if connection.vendor == "sqlite" else "product_id"
+    with connection.cursor() as cursor:
+        for chunk in _chunks(product_ids):
+            cursor.execute(
+                f"DELETE FROM {TABLE} WHERE {column} IN ({_placeholders(chunk)})",
+                chunk,
+            )
+
+
+def rebuild(connection=None):
+    """Drop every index row and re-index the whole catalog."""
+    connection = connection or _write_connection()
+    if not is_supported(connection.alias):
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLE}")
+    _reindex(connection, "1 = 1", [])
+
+
+# Schema
+
+
+def install(schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == "sqlite":
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {TABLE} USING fts5("
+            "product_id UNINDEXED, name, category, description, "
+            "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+        )
+    elif connection.vendor == "postgresql":
+        schema_editor.execute(
+            f"CREATE TABLE {TABLE} ("
+            "product_id bigint PRIMARY KEY REFERENCES catalog_product (id) "
+            "ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, "
+            "document tsvector NOT NULL)"
+        )
+        schema_editor.execute(
+            f"CREATE INDEX catalog_product_search_gin ON {TABLE} USING gin (document)"
+        )
+    else:
+        return
+    rebuild(connection)
+
+
+def uninstall(schema_editor):
+    if schema_editor.connection.vendor in ("sqlite", "postgresql"):
+        schema_editor.execute(f"DROP TABLE IF EXISTS {TABLE}")
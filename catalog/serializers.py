@@ -1,6 +1,14 @@
+from decimal import Decimal
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.functional import cached_property
 from rest_framework import serializers
-from .models import Product, Category, Order, OrderItem
-from django.db import transaction
+from .models import Product, Category, Order, OrderItem, OrderStatusCounter
+from .cache import bump_version
+from . import jobs, stock
+from django.db import models, transaction
+from django.db.models import Case, F, Q, When
 
 
 class CategorySerializer(serializers.ModelSerializer):
@@ -41,8 +49,123 @@ class ProductSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Stock quantity cannot be negative.")
         return value
 
+    def update(self, instance, validated_data):
+        # A hot product's stock lives in its buckets: setting the quantity
+        # replaces the total instead of adding to what the buckets hold.
+        if instance.is_hot and "stock_quantity" in validated_data:
+            stock.set_total(instance.pk, validated_data.pop("stock_quantity"))
+            instance.stock_quantity = 0
+            instance.__dict__.pop("stock_total", None)
+        return super().update(instance, validated_data)
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        data["stock_quantity"] = instance.available_stock
+        return data
+
+
+CENTS = Decimal("0.01")
+
+
+def _decimal(value):
+    """Render a two-place decimal the way DRF's DecimalField does."""
+    return "{:f}".format(value.quantize(CENTS))
+
+
+class ReadSerializer(serializers.BaseSerializer):
+    """Base of the read-only serializers, with DRF-compatible formatting."""
+
+    @cached_property
+    def output_timezone(self):
+        # Resolved once per serializer rather than once per row.
+        return timezone.get_current_timezone() if settings.USE_TZ else None
+
+    def datetime(self, value):
+        """Render a datetime the way DRF's DateTimeField does (ISO 8601)."""
+        if self.output_timezone is not None:
+            value = value.astimezone(self.output_timezone)
+        value = value.isoformat()
+        if value.endswith("+00:00"):
+            value = value[:-6] + "Z"
+        return value
+
+
+class ProductReadSerializer(ReadSerializer):
+    """
+    Read-only twin of ProductSerializer for list and detail responses.
+
+    Builds the same JSON straight from the instance instead of going
+    through a field object per attribute and a nested CategorySerializer.
+    Expects the category to be selected with the product.
+    """
+
+    def to_representation(self, product):
+        category = product.category
+        return {
+            "id": product.id,
+            "name": product.name,
+            "description": product.description,
+            "price": _decimal(product.price),
+            "category": {
+                "id": category.id,
+                "name": category.name,
+                "slug": category.slug,
+            },
+            "stock_quantity": product.available_stock,
+            "image_url": product.image_url,
+            "created_at": self.datetime(product.created_at),
+        }
+
+
+class OrderItemProductField(serializers.PrimaryKeyRelatedField):
+    """
+    Primary key field that resolves products from a batch lookup made by
+    OrderItemListSerializer, falling back to a single query otherwise.
+    """
+
+    def to_internal_value(self, data):
+        products = getattr(self, "prefetched", None)
+        if products is not None:
+            try:
+                product = products.get(int(data))
+            except (TypeError, ValueError):
+                product = None
+            if product is not None:
+                return product
+        return super().to_internal_value(data)
+
+
+class OrderItemListSerializer(serializers.ListSerializer):
+    def to_internal_value(self, data):
+        # Resolve every product of the order with one IN query instead of
+        # letting each line look its product up separately.
+        product_field = self.child.fields["product"]
+        product_field.prefetched = None
+        if isinstance(data, list):
+            product_ids = set()
+            for item in data:
+                try:
+                    product_ids.add(int(item["product"]))
+                except (KeyError, TypeError, ValueError):
+                    continue
+            product_field.prefetched = Product.objects.with_available_stock().in_bulk(
+                product_ids
+            )
+        try:
+            return super().to_internal_value(data)
+        finally:
+            product_field.prefetched = None
+
+    def get_attribute(self, instance):
+        # An order just placed carries its items, see OrderSerializer.create
+        placed = getattr(instance, "placed_items", None)
+        if placed is not None:
+            return placed
+        return super().get_attribute(instance)
+
 
 class OrderItemSerializer(serializers.ModelSerializer):
+    product = OrderItemProductField(queryset=Product.objects.all())
     product_name = serializers.CharField(source="product.name", read_only=True)
     product_price = serializers.DecimalField(
         source="product.price", max_digits=10, decimal_places=2, read_only=True
@@ -59,15 +182,16 @@ class OrderItemSerializer(serializers.ModelSerializer):
             "subtotal",
         ]
         read_only_fields = ["id", "subtotal"]
+        list_serializer_class = OrderItemListSerializer
 
     def validate(self, data):
         product = data.get("product")
         quantity = data.get("quantity")
 
-        if quantity > product.stock_quantity:
+        if quantity > product.available_stock:
             raise serializers.ValidationError(
                 {
-                    "quantity": f"Only {product.stock_quantity} units available for {product.name}."
+                    "quantity": f"Only {product.available_stock} units available for {product.name}."
                 }
             )
 
@@ -103,6 +227,12 @@ class OrderSerializer(serializers.ModelSerializer):
     def validate_items(self, value):
         if not value:
             raise serializers.ValidationError("Order must contain at least one item.")
+
+        product_ids = [item["product"].pk for item in value]
+        if len(product_ids) != len(set(product_ids)):
+            raise serializers.ValidationError(
+                "Each product can only appear once per order."
+            )
         return value
 
     @transaction.atomic
@@ -110,56 +240,91 @@ class OrderSerializer(serializers.ModelSerializer):
         """
         Create order with atomic transaction.
         If any step fails, everything rolls back automatically.
+
+        The whole order is placed as a set, so the number of statements
+        does not grow with the number of lines: one locking SELECT for all
+        products, one INSERT for the order, one bulk INSERT for the items
+        and one conditional UPDATE for the stock.
         """
         items_data = validated_data.pop("items")
+        quantities = {item["product"].pk: item["quantity"] for item in items_data}
+        products = {item["product"].pk: item["product"] for item in items_data}
+
+        # Lock every regular product row in one query. Locking in primary key
+        # order means concurrent orders always acquire locks in the same
+        # sequence and cannot deadlock each other. Hot products are not
+        # locked; their lines are drawn from stock buckets below.
+        products.update(
+            (product.pk, product)
+            for product in Product.objects.select_for_update()
+            .filter(pk__in=[pk for pk, product in products.items() if not product.is_hot])
+            .order_by("pk")
+        )
+        regular = {pk: q for pk, q in quantities.items() if not products[pk].is_hot}
+
+        # Re-check stock after locking (stock might have changed)
+        for pk in regular:
+            product = products[pk]
+            if quantities[pk] > product.stock_quantity:
+                raise serializers.ValidationError(
+                    {
+                        "items": f"Insufficient stock for {product.name}. Only {product.stock_quantity} available."
+                    }
+                )
 
-        # Create the order
-        order = Order.objects.create(**validated_data)
-
-        total_amount = 0
+        total_amount = sum(
+            products[pk].price * quantity for pk, quantity in quantities.items()
+        )
+        order = Order.objects.create(total_amount=total_amount, **validated_data)
+        OrderStatusCounter.objects.record(None, order.status, amount=total_amount)
 
-        try:
-            for item_data in items_data:
-                product = item_data["product"]
-                quantity = item_data["quantity"]
-
-                # Use select_for_update to lock the product row
-                # This prevents race conditions with concurrent orders
-                product = Product.objects.select_for_update().get(pk=product.pk)
-
-                # Re-check stock after locking (stock might have changed)
-                if quantity > product.stock_quantity:
-                    raise serializers.ValidationError(
-                        {
-                            "items": f"Insufficient stock for {product.name}. Only {product.stock_quantity} available."
-                        }
-                    )
-
-                # Create order item
-                order_item = OrderItem.objects.create(
+        order_items = OrderItem.objects.bulk_create(
+            [
+                OrderItem(
                     order=order,
-                    product=product,
+                    product=products[pk],
                     quantity=quantity,
-                    price=product.price,  # Save price at time of order
+                    price=products[pk].price,  # Save price at time of order
+                )
+                for pk, quantity in quantities.items()
+            ]
+        )
+
+        # Reduce stock for every regular product in a single UPDATE. Each row
+        # is only matched while it still holds enough stock, so the row count
+        # tells us whether every decrement was applied.
+        if regular:
+            enough_stock = Q()
+            decrement = []
+            for pk, quantity in regular.items():
+                enough_stock |= Q(pk=pk, stock_quantity__gte=quantity)
+                decrement.append(When(pk=pk, then=F("stock_quantity") - quantity))
+
+            updated = Product.objects.filter(enough_stock).update(
+                stock_quantity=Case(
+                    *decrement,
+                    default=F("stock_quantity"),
+                    output_field=models.PositiveIntegerField(),
+                )
+            )
+            if updated != len(regular):
+                raise serializers.ValidationError(
+                    {"items": "Insufficient stock for one or more products."}
                 )
 
-                # Reduce stock
-                product.stock_quantity -= quantity
-                product.save(update_fields=["stock_quantity"])
-
-                # Calculate total
-                total_amount += order_item.subtotal
-
-            # Update order total
-            order.total_amount = total_amount
-            order.save(update_fields=["total_amount"])
+        for pk in sorted(set(quantities) - set(regular)):
+            try:
+                stock.take(products[pk], quantities[pk])
+            except stock.InsufficientStock as e:
+                raise serializers.ValidationError({"items": str(e)})
+        bump_version(Product)
+        jobs.enqueue("order_placed", order_id=order.pk)
 
-            return order
+        # Render the response from the rows we just inserted, so it does not
+        # query the items and their products again (see OrderItemListSerializer).
+        order.placed_items = order_items
 
-        except Exception as e:
-            # Transaction will automatically rollback
-            # Re-raise the exception to let DRF handle it
-            raise
+        return order
 
     @transaction.atomic
     def update(self, instance, validated_data):
@@ -167,12 +332,21 @@ class OrderSerializer(serializers.ModelSerializer):
         Handle order updates with transaction protection.
         """
         items_data = validated_data.pop("items", None)
+        previous_status = instance.status
 
         # Update basic order fields
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
         instance.save()
 
+        OrderStatusCounter.objects.record(
+            previous_status, instance.status, amount=instance.total_amount
+        )
+        if instance.status != previous_status:
+            jobs.enqueue(
+                "order_status_changed", order_id=instance.pk, status=instance.status
+            )
+
         if items_data is not None:
             # This is complex - you might want to prevent updates
             # or handle stock restoration for cancelled items
@@ -181,3 +355,82 @@ class OrderSerializer(serializers.ModelSerializer):
             )
 
         return instance
+
+
+class BulkOrderFilterSerializer(serializers.Serializer):
+    status = serializers.ChoiceField(choices=Order.STATUS_CHOICES, required=False)
+    customer_email = serializers.EmailField(required=False)
+    created_after = serializers.DateTimeField(required=False)
+    created_before = serializers.DateTimeField(required=False)
+
+    def validate(self, data):
+        if not data:
+            raise serializers.ValidationError("Provide at least one filter.")
+        return data
+
+
+class BulkOrderTransitionSerializer(serializers.Serializer):
+    """Select orders by ``ids`` or by ``filter`` and a target ``status``."""
+
+    MAX_ORDERS = 5000
+
+    status = serializers.ChoiceField(choices=list(Order.ALLOWED_TRANSITIONS))
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        required=False,
+        allow_empty=False,
+        max_length=MAX_ORDERS,
+    )
+    filter = BulkOrderFilterSerializer(required=False)
+
+    def validate(self, data):
+        if ("ids" in data) == ("filter" in data):
+            raise serializers.ValidationError("Provide either ids or filter.")
+        return data
+
+    def get_queryset(self):
+        """Orders selected by this request, in primary key order."""
+        queryset = Order.objects.order_by("pk")
+        if "ids" in self.validated_data:
+            return queryset.filter(pk__in=self.validated_data["ids"])
+
+        lookups = {
+            "status": "status",
+            "customer_email": "customer_email__iexact",
+            "created_after": "created_at__gte",
+            "created_before": "created_at__lte",
+        }
+        return queryset.filter(
+            **{
+                lookups[name]: value
+                for name, value in self.validated_data["filter"].items()
+            }
+        )
+
+
+class OrderReadSerializer(ReadSerializer):
+    """
+    Read-only twin of OrderSerializer for list and detail responses.
+
+    Expects ``items__product`` to be prefetched.
+    """
+
+    def to_representation(self, order):
+        return {
+            "id": order.id,
+            "customer_email": order.customer_email,
+            "items": [
+                {
+                    "id": item.id,
+                    "product": item.product_id,
+                    "product_name": item.product.name,
+                    "product_price": _decimal(item.product.price),
+                    "quantity": item.quantity,
+                    "subtotal": item.subtotal,
+                }
+                for item in order.items.all()
+            ],
+            "total_amount": _decimal(order.total_amount),
+            "status": order.status,
+            "created_at": self.datetime(order.created_at),
+        }
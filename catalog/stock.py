@@ -0,0 +1,171 @@
+"""
+Hot-SKU stock buckets.
+
+Every order for a product normally locks its row, so a product that sells
+very fast caps throughput at one transaction at a time. Products flagged
+``is_hot`` keep their stock spread over ProductStockBucket rows instead.
+Each order draws from one bucket with a conditional UPDATE, so concurrent
+orders for the same product only contend when they pick the same bucket.
+
+The total stock of a product is always ``stock_quantity`` plus the sum of
+its buckets. When no single bucket can cover a line the buckets are
+rebalanced under the product lock, and ``manage.py hot_stock rebalance``
+evens them out periodically or on demand.
+"""
+
+import random
+
+from django.db import models, transaction
+from django.db.models import Case, F, When
+
+from .cache import bump_version
+from .models import Product, ProductStockBucket
+
+DEFAULT_BUCKETS = 8
+
+
+class InsufficientStock(Exception):
+    def __init__(self, product, available):
+        self.product = product
+        self.available = available
+        super().__init__(
+            f"Insufficient stock for {product.name}. Only {available} available."
+        )
+
+
+def _lock(product_id):
+    """Lock a product and its buckets, returning them with their total."""
+    product = Product.objects.select_for_update().get(pk=product_id)
+    buckets = list(
+        ProductStockBucket.objects.select_for_update()
+        .filter(product_id=product_id)
+        .order_by("bucket")
+    )
+    total = product.stock_quantity + sum(bucket.quantity for bucket in buckets)
+    return product, buckets, total
+
+
+def _distribute(product, buckets, total):
+    """Spread ``total`` evenly over ``buckets``, leaving the product row at 0."""
+    share, remainder = divmod(total, len(buckets))
+    for index, bucket in enumerate(buckets):
+        bucket.quantity = share + (1 if index < remainder else 0)
+    ProductStockBucket.objects.bulk_update(buckets, ["quantity"])
+    Product.objects.filter(pk=product.pk).update(stock_quantity=0)
+    product.stock_quantity = 0
+
+
+@transaction.atomic
+def enable(product_id, buckets=DEFAULT_BUCKETS):
+    """Switch a product to hot-SKU mode with ``buckets`` sub-counters."""
+    product, existing, total = _lock(product_id)
+    ProductStockBucket.objects.bulk_create(
+        [
+            ProductStockBucket(product=product, bucket=bucket)
+            for bucket in range(len(existing), buckets)
+        ]
+    )
+    ProductStockBucket.objects.filter(product=product, bucket__gte=buckets).delete()
+    _, bucket_rows, _ = _lock(product_id)
+
+    Product.objects.filter(pk=product.pk).update(is_hot=True)
+    _distribute(product, bucket_rows, total)
+    bump_version(Product)
+    return total
+
+
+@transaction.atomic
+def disable(product_id):
+    """Fold the buckets back into stock_quantity and leave hot-SKU mode."""
+    product, buckets, total = _lock(product_id)
+    ProductStockBucket.objects.filter(product=product).delete()
+    Product.objects.filter(pk=product.pk).update(is_hot=False, stock_quantity=total)
+    bump_version(Product)
+    return total
+
+
+@transaction.atomic
+def rebalance(product_id):
+    """Consolidate a hot product's stock and split it evenly again."""
+    product, buckets, total = _lock(product_id)
+    if buckets:
+        _distribute(product, buckets, total)
+    return total
+
+
+@transaction.atomic
+def set_total(product_id, quantity):
+    """Set the total stock of a hot product, e.g. after a restock."""
+    product, buckets, _ = _lock(product_id)
+    if buckets:
+        _distribute(product, buckets, quantity)
+    else:
+        Product.objects.filter(pk=product.pk).update(stock_quantity=quantity)
+    bump_version(Product)
+
+
+def take(product, quantity):
+    """
+    Remove ``quantity`` units of a hot product inside the current transaction.
+
+    Tries the buckets one by one starting at a random one and takes the
+    whole line from the first that can cover it. If none can, the buckets
+    are rebalanced under the product lock and the line is taken from the
+    pooled stock. Raises InsufficientStock when the total is too low.
+    """
+    bucket_count = ProductStockBucket.objects.filter(product=product).count()
+    start = random.randrange(bucket_count) if bucket_count else 0
+    for offset in range(bucket_count):
+        bucket = (start + offset) % bucket_count
+        updated = ProductStockBucket.objects.filter(
+            product=product, bucket=bucket, quantity__gte=quantity
+        ).update(quantity=F("quantity") - quantity)
+        if updated:
+            return
+
+    product, buckets, total = _lock(product.pk)
+    if quantity > total:
+        raise InsufficientStock(product, total)
+    if buckets:
+        _distribute(product, buckets, total - quantity)
+    else:
+        Product.objects.filter(pk=product.pk).update(stock_quantity=total - quantity)
+
+
+def release(quantities):
+    """
+    Put stock back, e.g. for a cancelled order. ``quantities`` maps product
+    ids to the number of units to return.
+
+    Regular products are restored with one UPDATE; hot products get their
+    units added to one of their buckets, picked at random.
+    """
+    hot = set(
+        Product.objects.filter(pk__in=quantities, is_hot=True).values_list(
+            "pk", flat=True
+        )
+    )
+    for product_id in sorted(hot):
+        buckets = ProductStockBucket.objects.filter(product_id=product_id)
+        numbers = list(buckets.values_list("bucket", flat=True))
+        # No buckets left (disabled meanwhile): restore stock_quantity instead
+        restored = numbers and buckets.filter(bucket=random.choice(numbers)).update(
+            quantity=F("quantity") + quantities[product_id]
+        )
+        if not restored:
+            hot.discard(product_id)
+
+    regular = {pk: quantity for pk, quantity in quantities.items() if pk not in hot}
+    if regular:
+        Product.objects.filter(pk__in=regular).update(
+            stock_quantity=Case(
+                *[
+                    When(pk=pk, then=F("stock_quantity") + quantity)
+                    for pk, quantity in sorted(regular.items())
+                ],
+                default=F("stock_quantity"),
+                output_field=models.PositiveIntegerField(),
+            )
+        )
+    bump_version(Product)
+
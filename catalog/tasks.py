@@ -0,0 +1,62 @@
+"""
+Job handlers for order side effects (see catalog.jobs).
+
+Orders enqueue these inside their transaction; they run in ``run_jobs``
+workers, so a slow or failing mail server neither delays nor fails the
+request. Handlers may run more than once for a job.
+"""
+
+import logging
+
+from django.conf import settings
+from django.core.mail import send_mail
+
+from . import jobs
+from .models import LOW_STOCK_THRESHOLD, Order, Product
+
+logger = logging.getLogger("catalog.jobs")
+
+
+@jobs.handler("order_placed", priority=10)
+def order_placed(order_id):
+    """Confirm the order to the customer and report products running low."""
+    order = Order.objects.filter(pk=order_id).first()
+    if order is None:
+        return
+    send_mail(
+        f"Order #{order.pk} received",
+        f"We received your order #{order.pk} of {order.total_amount}.",
+        settings.DEFAULT_FROM_EMAIL,
+        [order.customer_email],
+    )
+
+    low = (
+        Product.objects.filter(pk__in=order.items.values("product_id"))
+        .filter_stock(lte=LOW_STOCK_THRESHOLD)
+        .select_related("owner")
+    )
+    for product in low:
+        if product.owner.email:
+            send_mail(
+                f"{product.name} is running low",
+                f"{product.stock_total} of {product.name} left after order "
+                f"#{order.pk}.",
+                settings.DEFAULT_FROM_EMAIL,
+                [product.owner.email],
+            )
+        else:
+            logger.warning("%s is running low: %d left", product, product.stock_total)
+
+
+@jobs.handler("order_status_changed")
+def order_status_changed(order_id, status):
+    """Tell the customer their order moved to ``status``."""
+    order = Order.objects.filter(pk=order_id).only("pk", "customer_email").first()
+    if order is None:
+        return
+    send_mail(
+        f"Order #{order.pk} is {status}",
+        f"Your order #{order.pk} is now {status}.",
+        settings.DEFAULT_FROM_EMAIL,
+        [order.customer_email],
+    )
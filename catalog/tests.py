@@ -1,3 +1,923 @@
-from django.test import TestCase
+import json
+from base64 import b64encode
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import AsyncClient, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from e_commerce_API import db_pool
+from users.models import User
+
+from . import checks, jobs, search, stock
+from .models import (
+    Category,
+    DeadLetterJob,
+    Job,
+    Order,
+    OrderItem,
+    OrderStatusCounter,
+    Product,
+)
+from .serializers import (
+    OrderReadSerializer,
+    OrderSerializer,
+    ProductReadSerializer,
+    ProductSerializer,
+)
+from .views import OrderViewSet
+
+
+class ReadSerializerParityTests(TestCase):
+    """The read serializers must render exactly what the full ones do."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("owner", "owner@example.com", "pw123456")
+        cls.category = Category.objects.create(name="Garden Tools")
+        cls.other = Category.objects.create(name="Kitchen")
+        cls.products = [
+            Product.objects.create(
+                name="Spade",
+                description="Steel spade",
+                price=Decimal("19.9"),
+                stock_quantity=12,
+                category=cls.category,
+                owner=cls.user,
+            ),
+            Product.objects.create(
+                name="Whisk",
+                price=3,
+                stock_quantity=0,
+                image_url="https://example.com/whisk.png",
+                category=cls.other,
+                owner=cls.user,
+            ),
+            Product.objects.create(
+                name="Kettle",
+                description="",
+                price=Decimal("1234567.05"),
+                stock_quantity=40,
+                category=cls.other,
+                owner=cls.user,
+            ),
+        ]
+        stock.enable(cls.products[2].pk, buckets=3)
+
+        cls.order = Order.objects.create(
+            customer_email="owner@example.com", total_amount=Decimal("46.80")
+        )
+        OrderItem.objects.create(
+            order=cls.order, product=cls.products[0], quantity=2, price=Decimal("19.90")
+        )
+        OrderItem.objects.create(
+            order=cls.order, product=cls.products[1], quantity=1, price=Decimal("7")
+        )
+        cls.empty_order = Order.objects.create(
+            customer_email="owner@example.com", status="cancelled"
+        )
+
+    def setUp(self):
+        # Cache versions are bumped on commit, which TestCase never does.
+        cache.clear()
+
+    def product_queryset(self):
+        return Product.objects.with_available_stock().select_related("category")
+
+    def order_queryset(self):
+        return Order.objects.prefetch_related("items__product")
+
+    def assertSameJSON(self, fast, full):
+        self.assertEqual(fast, full)
+        self.assertEqual(JSONRenderer().render(fast), JSONRenderer().render(full))
+
+    def test_product_list(self):
+        products = self.product_queryset()
+        self.assertSameJSON(
+            ProductReadSerializer(products, many=True).data,
+            ProductSerializer(products, many=True).data,
+        )
+
+    def test_product_without_stock_annotation(self):
+        for product in Product.objects.select_related("category"):
+            self.assertSameJSON(
+                ProductReadSerializer(product).data, ProductSerializer(product).data
+            )
+
+    def test_order_list(self):
+        orders = self.order_queryset()
+        self.assertSameJSON(
+            OrderReadSerializer(orders, many=True).data,
+            OrderSerializer(orders, many=True).data,
+        )
+
+    def test_datetimes_in_other_timezone(self):
+        with timezone.override("America/New_York"):
+            product = self.product_queryset().first()
+            self.assertSameJSON(
+                ProductReadSerializer(product).data, ProductSerializer(product).data
+            )
+            order = self.order_queryset().get(pk=self.order.pk)
+            self.assertSameJSON(
+                OrderReadSerializer(order).data, OrderSerializer(order).data
+            )
+
+    def assertRendersAs(self, response, data, key=None):
+        body = response.json()
+        self.assertEqual(
+            body[key] if key else body, json.loads(JSONRenderer().render(data))
+        )
+
+    def test_endpoints(self):
+        client = APIClient()
+        self.assertRendersAs(
+            client.get("/api/products/"),
+            ProductSerializer(
+                self.product_queryset().order_by("-created_at", "-id"), many=True
+            ).data,
+            key="results",
+        )
+
+        client.force_authenticate(self.user)
+        self.assertRendersAs(
+            client.get("/api/orders/my_orders/"),
+            OrderSerializer(
+                self.order_queryset().order_by("-created_at", "-id"), many=True
+            ).data,
+            key="results",
+        )
+        self.assertRendersAs(
+            client.get(f"/api/orders/{self.order.pk}/"),
+            OrderSerializer(self.order_queryset().get(pk=self.order.pk)).data,
+        )
+
+
+@override_settings(CATALOG_RESPONSE_CACHE=True)
+class ResponseCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("owner", "owner@example.com", "pw123456")
+        cls.category = Category.objects.create(name="Garden Tools")
+        cls.product = Product.objects.create(
+            name="Rake",
+            price=5,
+            stock_quantity=10,
+            category=cls.category,
+            owner=cls.user,
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def get(self, path):
+        response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return response.get("X-Cache"), response.json()
+
+    def get_product(self):
+        return self.get(f"/api/products/{self.product.pk}/")
+
+    def test_hit_until_save(self):
+        self.assertEqual(self.get_product()[0], "MISS")
+        self.assertEqual(self.get_product()[0], "HIT")
+
+        # Versions are bumped on commit, which TestCase only simulates
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.name = "Leaf rake"
+            self.product.save()
+        self.assertEqual(self.get_product(), ("MISS", mock.ANY))
+        self.assertEqual(self.get_product()[1]["name"], "Leaf rake")
+
+    def test_category_save(self):
+        self.get_product()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.name = "Tools"
+            self.category.save()
+        cached, data = self.get_product()
+        self.assertEqual((cached, data["category"]["name"]), ("MISS", "Tools"))
+
+    def test_delete(self):
+        self.assertEqual(len(self.get("/api/products/")[1]["results"]), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.delete()
+        cached, data = self.get("/api/products/")
+        self.assertEqual((cached, data["results"]), ("MISS", []))
+
+    def test_order_create_and_cancel(self):
+        self.get_product()
+        self.client.force_authenticate(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                "/api/orders/",
+                {
+                    "customer_email": "owner@example.com",
+                    "items": [{"product": self.product.pk, "quantity": 3}],
+                },
+                format="json",
+            )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.get_product()[1]["stock_quantity"], 7)
+
+        order_id = response.json()["order"]["id"]
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f"/api/orders/{order_id}/cancel/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.get_product(), ("MISS", mock.ANY))
+        self.assertEqual(self.get_product()[1]["stock_quantity"], 10)
+
+    @override_settings(CATALOG_RESPONSE_CACHE=False)
+    def test_off(self):
+        self.get_product()
+        self.assertEqual(self.get_product()[0], None)
+
+    @override_settings(CACHE_IS_SHARED=False)
+    def test_needs_shared_cache(self):
+        self.assertEqual(
+            [error.id for error in checks.check_response_cache(None)],
+            ["catalog.E001"],
+        )
+
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user("owner", "owner@example.com", "pw123456")
+        category = Category.objects.create(name="Garden Tools")
+        for price in (5, 10, 15):
+            Product.objects.create(
+                name=f"Rake {price}", price=price, category=category, owner=user
+            )
+
+    def cursor(self, payload):
+        return b64encode(json.dumps(payload).encode("ascii")).decode("ascii")
+
+    def test_follows_next_link(self):
+        client = APIClient()
+        first = client.get("/api/products/", {"page_size": 2}).json()
+        second = client.get(first["next"]).json()
+        self.assertEqual(len(second["results"]), 1)
+        self.assertIsNone(second["next"])
+
+    def test_tampered_cursor(self):
+        client = APIClient()
+        for params, position in [
+            ({}, ["notadate", "1"]),
+            ({}, ["2024-01-01T00:00:00+00:00", "one"]),
+            ({"ordering": "price"}, ["NaN", "1"]),
+            ({"ordering": "price"}, [["5"], "1"]),
+        ]:
+            with self.subTest(position=position):
+                cursor = self.cursor({"p": position, "r": 0})
+                response = client.get("/api/products/", {**params, "cursor": cursor})
+                self.assertEqual(response.status_code, 404)
+
+
+class ProductExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("owner", "owner@example.com", "pw123456")
+        cls.token = Token.objects.create(user=cls.user)
+        category = Category.objects.create(name="Garden Tools")
+        for price in (5, 10, 15):
+            Product.objects.create(
+                name=f"Rake {price}", price=price, category=category, owner=cls.user
+            )
+
+    async def test_streams_under_asgi(self):
+        response = await AsyncClient().get(
+            "/api/products/export/",
+            {"file_format": "csv"},
+            headers={"Authorization": f"Token {self.token.key}"},
+        )
+        self.assertEqual(response.status_code, 200)
+        # A sync iterator would be read whole before the first byte is sent
+        self.assertTrue(response.is_async)
+        chunks = [chunk async for chunk in response.streaming_content]
+        # The header, then one chunk per product
+        self.assertEqual(len(chunks), 4)
+
+        self.assertEqual(b"".join(chunks), await sync_to_async(self.wsgi_export)())
+
+    def wsgi_export(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.get("/api/products/export/", {"file_format": "csv"})
+        self.assertFalse(response.is_async)
+        return b"".join(response.streaming_content)
+
+
+class DatabasePoolTests(SimpleTestCase):
+    def test_pool_checks_connections(self):
+        """Pooled connections must be pinged before the pool hands them out."""
+        from django.db.backends.postgresql.base import DatabaseWrapper
+
+        database = db_pool.configure(
+            {
+                "ENGINE": "django.db.backends.postgresql",
+                "NAME": "pool_check",
+                "USER": "",
+                "PASSWORD": "",
+                "HOST": "",
+                "PORT": "",
+                "OPTIONS": {},
+                "TIME_ZONE": None,
+                "AUTOCOMMIT": True,
+                "ATOMIC_REQUESTS": False,
+            },
+            max_connections=10,
+            workers=2,
+            min_size=1,
+            timeout=1,
+            max_idle=60,
+            max_lifetime=600,
+        )
+        with mock.patch("psycopg_pool.ConnectionPool") as pool_class:
+            DatabaseWrapper(database, alias="pool_check").pool
+        self.assertIs(
+            pool_class.call_args.kwargs["check"], pool_class.check_connection
+        )
+
+
+class HotStockTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user("owner", "owner@example.com", "pw123456")
+        category = Category.objects.create(name="Garden Tools")
+        cls.product = Product.objects.create(
+            name="Spade", price=5, stock_quantity=20, category=category, owner=user
+        )
+        cls.regular = Product.objects.create(
+            name="Rake", price=5, stock_quantity=4, category=category, owner=user
+        )
+        stock.enable(cls.product.pk, buckets=4)
+
+    def buckets(self):
+        return list(
+            self.product.stock_buckets.order_by("bucket").values_list(
+                "quantity", flat=True
+            )
+        )
+
+    def total(self):
+        product = Product.objects.with_available_stock().get(pk=self.product.pk)
+        return product.stock_quantity, product.stock_total
+
+    def test_enable(self):
+        self.assertEqual(self.buckets(), [5, 5, 5, 5])
+        self.assertEqual(self.total(), (0, 20))
+
+    def test_take_from_one_bucket(self):
+        stock.take(self.product, 3)
+        self.assertEqual(sorted(self.buckets()), [2, 5, 5, 5])
+        self.assertEqual(self.total(), (0, 17))
+
+    def test_take_more_than_a_bucket(self):
+        # No bucket holds 7: rebalanced from the pooled 20
+        stock.take(self.product, 7)
+        self.assertEqual(self.buckets(), [4, 3, 3, 3])
+        self.assertEqual(self.total(), (0, 13))
+
+    def test_insufficient_stock(self):
+        with self.assertRaises(stock.InsufficientStock) as raised:
+            stock.take(self.product, 21)
+        self.assertEqual(raised.exception.available, 20)
+        self.assertEqual(self.total(), (0, 20))
+
+    def test_rebalance(self):
+        for _ in range(3):
+            stock.take(self.product, 4)
+        self.assertEqual(stock.rebalance(self.product.pk), 8)
+        self.assertEqual(self.buckets(), [2, 2, 2, 2])
+
+    def test_release(self):
+        stock.release({self.product.pk: 3, self.regular.pk: 2})
+        self.assertEqual(self.total(), (0, 23))
+        self.assertEqual(sorted(self.buckets()), [5, 5, 5, 8])
+        self.regular.refresh_from_db()
+        self.assertEqual(self.regular.stock_quantity, 6)
+
+    def test_release_to_own_buckets(self):
+        stock.enable(self.product.pk, buckets=2)
+        with mock.patch("random.choice", side_effect=lambda numbers: numbers[-1]):
+            stock.release({self.product.pk: 3})
+        self.assertEqual(self.buckets(), [10, 13])
+
+    def test_release_without_buckets(self):
+        self.product.stock_buckets.all().delete()
+        stock.release({self.product.pk: 3})
+        self.assertEqual(self.total(), (3, 3))
+
+
+class SearchRankTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user("owner", "owner@example.com", "pw123456")
+        tools = Category.objects.create(name="Hand Tools")
+        spades = Category.objects.create(name="Spade Sets")
+        for name, category, description in [
+            ("Hoe", tools, "Lighter than a spade"),
+            ("Fork", spades, "Four tines"),
+            ("Garden Spade", tools, "Steel blade"),
+            ("Rake", tools, "Twelve tines"),
+        ]:
+            Product.objects.create(
+                name=name,
+                description=description,
+                price=5,
+                category=category,
+                owner=user,
+            )
+
+    def test_name_before_category_before_description(self):
+        results = search.search(Product.objects.all(), "spade")
+        self.assertEqual(
+            [product.name for product in results], ["Garden Spade", "Fork", "Hoe"]
+        )
+
+    def test_postgresql_weights(self):
+        self.assertEqual(search.TS_RANK_WEIGHTS, "{0.0,0.1,0.4,1.0}")
+        compiler = mock.Mock()
+        compiler.compile.side_effect = [("document", []), ("%s", ["spade:*"])]
+        rank = search.SearchRank("search_entry__document", "spade:*")
+        self.assertEqual(
+            rank.as_postgresql(compiler, None),
+            (
+                "ts_rank('{0.0,0.1,0.4,1.0}'::float4[], document, "
+                "to_tsquery('english'::regconfig, %s))",
+                ("spade:*",),
+            ),
+        )
+
+
+class OrderPlacementTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("owner", "owner@example.com", "pw123456")
+        category = Category.objects.create(name="Garden Tools")
+        cls.products = [
+            Product.objects.create(
+                name=f"Tool {index}",
+                price=10 + index,
+                stock_quantity=10,
+                category=category,
+                owner=cls.user,
+            )
+            for index in range(5)
+        ]
+        cls.hot = Product.objects.create(
+            name="Spade", price=5, stock_quantity=10, category=category, owner=cls.user
+        )
+        stock.enable(cls.hot.pk, buckets=2)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def place(self, lines):
+        return self.client.post(
+            "/api/orders/",
+            {
+                "customer_email": "buyer@example.com",
+                "items": [
+                    {"product": product.pk, "quantity": quantity}
+                    for product, quantity in lines
+                ],
+            },
+            format="json",
+        )
+
+    def stock_levels(self):
+        return list(
+            Product.objects.with_available_stock()
+            .order_by("pk")
+            .values_list("stock_total", flat=True)
+        )
+
+    def test_statements_do_not_grow_with_lines(self):
+        counts = []
+        for lines in ([(self.products[0], 1)], [(p, 2) for p in self.products]):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.place(lines)
+            self.assertEqual(response.status_code, 201, response.json())
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+        order = response.json()["order"]
+        self.assertEqual(order["total_amount"], "120.00")
+        self.assertEqual(len(order["items"]), 5)
+        self.assertEqual(self.stock_levels(), [7, 8, 8, 8, 8, 10])
+
+    def test_insufficient_stock(self):
+        response = self.place([(self.products[0], 2), (self.products[1], 11)])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.stock_levels(), [10] * 6)
+        self.assertFalse(Order.objects.exists())
+
+    def test_rolls_back_when_stock_runs_out_meanwhile(self):
+        totals = OrderStatusCounter.objects.totals()
+        # The hot product sold out after validation, and after the regular
+        # products were decremented
+        sold_out = stock.InsufficientStock(self.hot, 0)
+        with mock.patch.object(stock, "take", side_effect=sold_out):
+            response = self.place([(self.products[0], 2), (self.hot, 1)])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Insufficient stock for Spade", response.json()["details"])
+
+        self.assertEqual(self.stock_levels(), [10] * 6)
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(OrderItem.objects.exists())
+        self.assertEqual(OrderStatusCounter.objects.totals(), totals)
+
+
+class OrderStatusCounterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(
+            "staff", "staff@example.com", "pw123456", is_staff=True
+        )
+        category = Category.objects.create(name="Garden Tools")
+        cls.product = Product.objects.create(
+            name="Rake", price=5, stock_quantity=10, category=category, owner=cls.staff
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+
+    def place(self, quantity=1):
+        response = self.client.post(
+            "/api/orders/",
+            {
+                "customer_email": "buyer@example.com",
+                "items": [{"product": self.product.pk, "quantity": quantity}],
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201)
+        return response.json()["order"]["id"]
+
+    def post(self, pk, action):
+        return self.client.post(f"/api/orders/{pk}/{action}/")
+
+    def statistics(self):
+        response = self.client.get("/api/orders/statistics/")
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_counters_follow_orders(self):
+        first, second, third = self.place(1), self.place(2), self.place(3)
+        self.assertEqual(self.post(first, "cancel").status_code, 200)
+        self.assertEqual(self.post(second, "mark_processing").status_code, 200)
+        self.assertEqual(self.post(second, "mark_completed").status_code, 200)
+
+        stats = self.statistics()
+        self.assertEqual(stats["total_orders"], 3)
+        self.assertEqual(Decimal(str(stats["total_revenue"])), 30)
+        self.assertEqual(
+            [stats[f"{status}_orders"] for status, _ in Order.STATUS_CHOICES],
+            [
+                Order.objects.filter(status=status).count()
+                for status, _ in Order.STATUS_CHOICES
+            ],
+        )
+        self.assertEqual(stats["pending_orders"], 1)
+
+        # The counters match a recount of the orders table
+        for counted, actual in OrderStatusCounter.objects.rebuild().values():
+            self.assertEqual(counted, actual)
+
+        self.assertEqual(self.client.delete(f"/api/orders/{third}/").status_code, 204)
+        self.assertEqual(self.statistics()["total_orders"], 2)
+
+    def test_concurrent_transition(self):
+        pk = self.place(2)
+        get_object = OrderViewSet.get_object
+
+        def completed_meanwhile(view):
+            order = get_object(view)
+            Order.objects.filter(pk=pk).update(status="completed")
+            return order
+
+        with mock.patch.object(OrderViewSet, "get_object", completed_meanwhile):
+            response = self.post(pk, "cancel")
+        self.assertEqual(response.status_code, 409)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, 8)
+        self.assertEqual(self.statistics()["cancelled_orders"], 0)
+
+    def test_reconcile_order_stats(self):
+        self.place()
+        OrderStatusCounter.objects.filter(status="pending").update(
+            order_count=0, revenue=0
+        )
+        out = StringIO()
+        call_command("reconcile_order_stats", stdout=out)
+        self.assertIn("pending: counted 0 orders / 0.00 revenue", out.getvalue())
+        self.assertIn("Corrected drift in 1 status counter(s).", out.getvalue())
+        self.assertEqual(self.statistics()["pending_orders"], 1)
+
+        out = StringIO()
+        call_command("reconcile_order_stats", stdout=out)
+        self.assertIn("Counters were in sync.", out.getvalue())
+
+
+class BulkTransitionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(
+            "staff", "staff@example.com", "pw123456", is_staff=True
+        )
+        category = Category.objects.create(name="Garden Tools")
+        cls.product = Product.objects.create(
+            name="Rake", price=5, stock_quantity=10, category=category, owner=cls.staff
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+        self.orders = []
+        for quantity in (1, 2, 3):
+            response = self.client.post(
+                "/api/orders/",
+                {
+                    "customer_email": "buyer@example.com",
+                    "items": [{"product": self.product.pk, "quantity": quantity}],
+                },
+                format="json",
+            )
+            self.orders.append(response.json()["order"]["id"])
+        Order.objects.filter(pk=self.orders[2]).update(status="completed")
+        OrderStatusCounter.objects.rebuild()
+
+    def transition(self, data):
+        return self.client.post("/api/orders/bulk_transition/", data, format="json")
+
+    def test_reports_each_order(self):
+        missing = self.orders[-1] + 100
+        ids = [*self.orders, missing]
+        response = self.transition({"status": "cancelled", "ids": ids})
+        self.assertEqual(response.status_code, 200)
+        first, second, third = self.orders
+        self.assertEqual(
+            response.json(),
+            {
+                "status": "cancelled",
+                "updated": 2,
+                "has_more": False,
+                "results": [
+                    {"id": first, "previous_status": "pending", "result": "updated"},
+                    {"id": second, "previous_status": "pending", "result": "updated"},
+                    {
+                        "id": third,
+                        "previous_status": "completed",
+                        "result": "skipped",
+                        "detail": "Cannot move a completed order to cancelled",
+                    },
+                    {"id": missing, "result": "not_found"},
+                ],
+            },
+        )
+
+        # The stock of both cancelled orders is back; the completed one's not
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, 7)
+        totals = OrderStatusCounter.objects.totals()
+        self.assertEqual(totals["cancelled"], (2, Decimal("15.00")))
+        self.assertEqual(totals["pending"], (0, Decimal("0.00")))
+
+    def test_by_filter(self):
+        response = self.transition(
+            {"status": "processing", "filter": {"status": "pending"}}
+        )
+        self.assertEqual(response.json()["updated"], 2)
+        self.assertEqual(
+            Order.objects.filter(status="processing").count(),
+            OrderStatusCounter.objects.totals()["processing"][0],
+        )
+
+    def test_staff_only(self):
+        customer = User.objects.create_user("buyer", "buyer@example.com", "pw123456")
+        self.client.force_authenticate(customer)
+        response = self.transition({"status": "cancelled", "ids": self.orders})
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(Order.objects.filter(status="cancelled").exists())
+
+
+class IdempotencyKeyTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("buyer", "buyer@example.com", "pw123456")
+        category = Category.objects.create(name="Garden Tools")
+        cls.product = Product.objects.create(
+            name="Rake", price=5, stock_quantity=3, category=category, owner=cls.user
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def place(self, quantity=1, key="order-1"):
+        return self.client.post(
+            "/api/orders/",
+            {
+                "customer_email": "buyer@example.com",
+                "items": [{"product": self.product.pk, "quantity": quantity}],
+            },
+            format="json",
+            headers={"Idempotency-Key": key},
+        )
+
+    def stock_quantity(self):
+        self.product.refresh_from_db()
+        return self.product.stock_quantity
+
+    def test_replays_response(self):
+        first = self.place()
+        self.assertEqual(first.status_code, 201)
+        self.assertNotIn("Idempotent-Replayed", first)
+
+        retry = self.place()
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(self.stock_quantity(), 2)
+
+        # A new key places a new order
+        self.assertEqual(self.place(key="order-2").status_code, 201)
+        self.assertEqual(self.stock_quantity(), 1)
+
+    def test_replays_cancel(self):
+        pk = self.place().json()["order"]["id"]
+        headers = {"Idempotency-Key": "cancel-1"}
+        path = f"/api/orders/{pk}/cancel/"
+        self.assertEqual(self.client.post(path, headers=headers).status_code, 200)
+        retry = self.client.post(path, headers=headers)
+        self.assertEqual(retry.status_code, 200)
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertEqual(self.stock_quantity(), 3)
+
+    def test_key_reused_for_other_request(self):
+        self.place()
+        response = self.place(quantity=2)
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_failed_request_releases_key(self):
+        self.assertEqual(self.place(quantity=4).status_code, 400)
+        Product.objects.filter(pk=self.product.pk).update(stock_quantity=5)
+
+        retry = self.place(quantity=4)
+        self.assertEqual(retry.status_code, 201)
+        self.assertNotIn("Idempotent-Replayed", retry)
+        self.assertEqual(self.stock_quantity(), 1)
+
+    def test_cors(self):
+        origin = {"Origin": "http://localhost:3000"}
+        preflight = self.client.options(
+            "/api/orders/",
+            headers={
+                **origin,
+                "Access-Control-Request-Method": "POST",
+                "Access-Control-Request-Headers": "idempotency-key",
+            },
+        )
+        self.assertIn("idempotency-key", preflight["Access-Control-Allow-Headers"])
+        response = self.client.get("/api/orders/", headers=origin)
+        self.assertEqual(
+            response["Access-Control-Expose-Headers"], "idempotent-replayed"
+        )
+
+
+@override_settings(JOBS_MAX_ATTEMPTS=2, JOBS_BACKOFF_SECONDS=10)
+class JobQueueTests(TestCase):
+    def setUp(self):
+        self.calls = []
+        patcher = mock.patch.dict(
+            jobs.HANDLERS,
+            {
+                "record": jobs.Handler(self.record, 0, None),
+                "urgent": jobs.Handler(self.record, 10, None),
+                "broken": jobs.Handler(self.broken, 0, None),
+            },
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def record(self, **payload):
+        self.calls.append(payload)
+
+    def broken(self, **payload):
+        raise RuntimeError("mail server down")
+
+    def test_enqueued_with_transaction(self):
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                jobs.enqueue("record", value=1)
+                raise RuntimeError
+        self.assertFalse(Job.objects.exists())
+
+        user = User.objects.create_user("buyer", "buyer@example.com", "pw123456")
+        category = Category.objects.create(name="Garden Tools")
+        product = Product.objects.create(
+            name="Rake", price=5, stock_quantity=1, category=category, owner=user
+        )
+        client = APIClient()
+        client.force_authenticate(user)
+        for quantity in (2, 1):
+            client.post(
+                "/api/orders/",
+                {
+                    "customer_email": "buyer@example.com",
+                    "items": [{"product": product.pk, "quantity": quantity}],
+                },
+                format="json",
+            )
+        # Only the order that was placed
+        order = Order.objects.get()
+        job = Job.objects.get()
+        self.assertEqual(job.name, "order_placed")
+        self.assertEqual(job.payload, {"order_id": order.pk})
+        self.assertEqual(job.priority, 10)
+
+        self.assertTrue(jobs.run(jobs.claim("worker", 10)[0]))
+        self.assertEqual(mail.outbox[0].subject, f"Order #{order.pk} received")
+        self.assertFalse(Job.objects.exists())
+
+    def test_claim(self):
+        jobs.enqueue("record", value=1)
+        jobs.enqueue("urgent", value=2)
+        jobs.enqueue("record", value=3)
+        jobs.enqueue("record", delay=60, value=4)
+
+        first = jobs.claim("first", 2)
+        self.assertEqual([job.payload["value"] for job in first], [2, 1])
+        second = jobs.claim("second", 10)
+        self.assertEqual([job.payload["value"] for job in second], [3])
+        self.assertEqual(jobs.claim("third", 10), [])
+
+        # Released or expired leases are claimed again
+        jobs.release("first")
+        third = jobs.claim("third", 10)
+        self.assertEqual(len(third), 2)
+        Job.objects.filter(locked_by="second").update(locked_until=timezone.now())
+        fourth = jobs.claim("fourth", 10)
+        self.assertEqual(len(fourth), 1)
+
+        for job in third + fourth:
+            self.assertTrue(jobs.run(job))
+        self.assertEqual([call["value"] for call in self.calls], [2, 1, 3])
+        self.assertEqual(Job.objects.get().payload, {"value": 4})
+
+    def test_retry_then_dead_letter(self):
+        jobs.enqueue("broken", value=1)
+        job = jobs.claim("worker", 10)[0]
+        with self.assertLogs("catalog.jobs", "WARNING"):
+            self.assertFalse(jobs.run(job))
+
+        job.refresh_from_db()
+        self.assertEqual((job.attempts, job.locked_by, job.locked_until), (1, "", None))
+        self.assertIn("mail server down", job.last_error)
+        delay = (job.run_at - timezone.now()).total_seconds()
+        self.assertTrue(8 < delay <= 20, delay)
+        self.assertEqual(jobs.claim("worker", 10), [])
+
+        Job.objects.update(run_at=timezone.now())
+        with self.assertLogs("catalog.jobs", "ERROR"):
+            self.assertFalse(jobs.run(jobs.claim("worker", 10)[0]))
+        self.assertFalse(Job.objects.exists())
+        dead = DeadLetterJob.objects.get()
+        self.assertEqual((dead.name, dead.attempts), ("broken", 2))
+
+        out = StringIO()
+        call_command("run_jobs", "--requeue-dead", stdout=out)
+        self.assertEqual(out.getvalue(), "Requeued 1 dead-letter jobs.\n")
+        self.assertFalse(DeadLetterJob.objects.exists())
+        job = Job.objects.get()
+        self.assertEqual((job.name, job.attempts), ("broken", 0))
+
+    def test_backoff(self):
+        with mock.patch("random.uniform", return_value=0):
+            delays = [jobs.backoff(attempts) for attempts in (1, 2, 3, 10, 20)]
+        self.assertEqual(delays, [10, 20, 40, 3600, 3600])
+
+    def test_run_jobs_once(self):
+        jobs.enqueue("record", value=1)
+        jobs.enqueue("broken", value=2)
+        out = StringIO()
+        with self.assertLogs("catalog.jobs"):
+            call_command("run_jobs", "--once", stdout=out)
+        self.assertIn("1 done, 1 failed", out.getvalue())
+        self.assertEqual(self.calls, [{"value": 1}])
@@ -1,40 +1,100 @@
+from decimal import Decimal, InvalidOperation
+
 from rest_framework import viewsets, permissions, filters, status
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from django_filters.rest_framework import DjangoFilterBackend
+from django.core.handlers.asgi import ASGIRequest
 from django.db import transaction
-from django.db.models import Count, Sum, Q  # Add Q here
-from .models import Product, Category, Order
+from django.http import StreamingHttpResponse
+from django.db.models import Sum
+from django.utils import timezone
+from users.models import users_with_email
+from .models import (
+    LOW_STOCK_THRESHOLD,
+    Product,
+    Category,
+    Order,
+    OrderItem,
+    OrderStatusCounter,
+)
 from .serializers import (
     ProductSerializer,
     CategorySerializer,
     OrderSerializer,
+    BulkOrderTransitionSerializer,
+    ProductReadSerializer,
+    OrderReadSerializer,
 )
 from .permissions import IsOwnerOrReadOnly
-from .filters import ProductFilter
+from .filters import ProductFilter, ProductSearchFilter
+from .cache import cache_response
+from .idempotency import idempotent
+from . import feeds, jobs, stock
+from .facets import Facets
+
+
+# Longest cart bulk_availability accepts
+MAX_CART_LINES = 100
+
+
+def parse_quantity(value):
+    """Validate a requested quantity, returning ``(quantity, error)``."""
+    try:
+        quantity = int(value)
+    except (ValueError, TypeError):
+        return None, "Quantity must be a valid number"
+
+    if quantity <= 0:
+        return None, "Quantity must be greater than 0"
+    return quantity, None
+
+
+def availability(product, quantity):
+    """What check_availability reports for ``quantity`` units of a product."""
+    available = product.available_stock >= quantity
+    return {
+        "product": product.name,
+        "requested_quantity": quantity,
+        "available_stock": product.available_stock,
+        "is_available": available,
+        "message": f"{'Available' if available else 'Insufficient stock'}",
+    }
 
 
 class CategoryViewSet(viewsets.ModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
+    pagination_class = None  # small lookup table, always returned whole
 
     def get_permissions(self):
         if self.action in ["list", "retrieve"]:  # public routes
             return [permissions.AllowAny()]
         return [permissions.IsAuthenticated()]
 
+    @cache_response(Category)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @cache_response(Category)
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
 
 class ProductViewSet(viewsets.ModelViewSet):
-    queryset = Product.objects.select_related("category", "owner").all()
+    queryset = Product.objects.with_available_stock().select_related(
+        "category", "owner"
+    )
     serializer_class = ProductSerializer
     permission_classes = [IsOwnerOrReadOnly]
     filterset_class = ProductFilter
     filter_backends = [
         DjangoFilterBackend,
-        filters.SearchFilter,
+        ProductSearchFilter,
         filters.OrderingFilter,
     ]
-    search_fields = ["name", "category__name"]  # partial matches
+    # Only used where the database has no full-text index
+    search_fields = ["name", "category__name", "description"]
     ordering_fields = ["price", "created_at", "name"]
 
     def perform_create(self, serializer):
@@ -44,7 +104,26 @@ class ProductViewSet(viewsets.ModelViewSet):
         """Ensure owner cannot be changed during update."""
         serializer.save(owner=self.request.user)
 
+    # Reads are rendered by ProductReadSerializer, writes still go through
+    # ProductSerializer.
+    @cache_response(Product, Category)
+    def list(self, request, *args, **kwargs):
+        qs = self.filter_queryset(self.get_queryset())
+
+        page = self.paginate_queryset(qs)
+        if page is not None:
+            ser = ProductReadSerializer(page, many=True)
+            return self.get_paginated_response(ser.data)
+
+        ser = ProductReadSerializer(qs, many=True)
+        return Response(ser.data)
+
+    @cache_response(Product, Category)
+    def retrieve(self, request, *args, **kwargs):
+        return Response(ProductReadSerializer(self.get_object()).data)
+
     @action(detail=False, methods=["get"])
+    @cache_response(Product, Category)
     def by_category(self, request):
         """Get products by category slug."""
         slug = request.query_params.get("slug")
@@ -55,72 +134,200 @@ class ProductViewSet(viewsets.ModelViewSet):
         )
         page = self.paginate_queryset(qs)
         if page is not None:
-            ser = self.get_serializer(page, many=True)
+            ser = ProductReadSerializer(page, many=True)
             return self.get_paginated_response(ser.data)
-        ser = self.get_serializer(qs, many=True)
+        ser = ProductReadSerializer(qs, many=True)
         return Response(ser.data)
 
     @action(detail=False, methods=["get"])
+    @cache_response(Product, Category)
     def low_stock(self, request):
         """Get products with low stock (less than 10 items)."""
-        threshold = int(request.query_params.get("threshold", 10))
-        qs = self.get_queryset().filter(
-            stock_quantity__lte=threshold, stock_quantity__gt=0
-        )
+        threshold = int(request.query_params.get("threshold", LOW_STOCK_THRESHOLD))
+        qs = self.get_queryset().filter_stock(lte=threshold, gt=0)
 
         page = self.paginate_queryset(qs)
         if page is not None:
-            ser = self.get_serializer(page, many=True)
+            ser = ProductReadSerializer(page, many=True)
             return self.get_paginated_response(ser.data)
 
-        ser = self.get_serializer(qs, many=True)
+        ser = ProductReadSerializer(qs, many=True)
         return Response(ser.data)
 
     @action(detail=False, methods=["get"])
+    @cache_response(Product, Category)
     def out_of_stock(self, request):
         """Get products that are out of stock."""
-        qs = self.get_queryset().filter(stock_quantity=0)
+        qs = self.get_queryset().filter_stock(exact=0)
 
         page = self.paginate_queryset(qs)
         if page is not None:
-            ser = self.get_serializer(page, many=True)
+            ser = ProductReadSerializer(page, many=True)
             return self.get_paginated_response(ser.data)
 
-        ser = self.get_serializer(qs, many=True)
+        ser = ProductReadSerializer(qs, many=True)
         return Response(ser.data)
 
-    @action(detail=True, methods=["post"])
-    def check_availability(self, request, pk=None):
-        """Check if requested quantity is available."""
-        product = self.get_object()
-        quantity = request.data.get("quantity", 1)
+    @action(detail=False, methods=["get"])
+    @cache_response(Product, Category)
+    def facets(self, request):
+        """
+        Category counts, in-stock split and price histogram for the list
+        filters (search, category, price_min/price_max, in_stock). Histogram
+        bounds can be set with ?price_breaks=10,50,100.
+        """
+        return Response(Facets(request, self).data())
 
-        try:
-            quantity = int(quantity)
-        except (ValueError, TypeError):
+    @action(
+        detail=False, methods=["post"], permission_classes=[permissions.AllowAny]
+    )
+    def bulk_availability(self, request):
+        """
+        Check a whole cart at once.
+
+        Accepts [{"product": id, "quantity": n, "price": "9.99"}, ...] (or
+        {"items": [...]}) and answers every line from one query. ``price``
+        is optional: the price the cart shows, compared with the current one.
+        Lines are validated like check_availability and report their own
+        errors.
+        """
+        lines = request.data
+        if isinstance(lines, dict):
+            lines = lines.get("items")
+        if not isinstance(lines, list) or not lines:
             return Response(
-                {"error": "Quantity must be a valid number"},
+                {"error": "Provide a non-empty list of cart lines"},
                 status=status.HTTP_400_BAD_REQUEST,
             )
-
-        if quantity <= 0:
+        if len(lines) > MAX_CART_LINES:
             return Response(
-                {"error": "Quantity must be greater than 0"},
+                {"error": f"At most {MAX_CART_LINES} lines can be checked at once"},
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        available = product.stock_quantity >= quantity
+        product_ids = {}
+        for index, line in enumerate(lines):
+            try:
+                product_ids[index] = int(line["product"])
+            except (KeyError, TypeError, ValueError):
+                continue
+        products = self.get_queryset().in_bulk(set(product_ids.values()))
+
+        results = []
+        for index, line in enumerate(lines):
+            raw = line.get("product") if isinstance(line, dict) else None
+            product = products.get(product_ids.get(index))
+            if index not in product_ids:
+                results.append({"product_id": raw, "error": "Not found."})
+                continue
+            if product is None:
+                results.append(
+                    {"product_id": raw, "error": "No Product matches the given query."}
+                )
+                continue
+
+            quantity, error = parse_quantity(line.get("quantity", 1))
+            if error:
+                results.append({"product_id": product.pk, "error": error})
+                continue
+
+            result = {"product_id": product.pk, **availability(product, quantity)}
+            result["current_price"] = str(product.price)
+            if line.get("price") is not None:
+                try:
+                    cart_price = Decimal(str(line["price"]))
+                except InvalidOperation:
+                    cart_price = None
+                # NaN and Infinity parse, but compare as unequal (sNaN raises)
+                if cart_price is None or not cart_price.is_finite():
+                    error = "Price must be a valid number"
+                    results.append({"product_id": product.pk, "error": error})
+                    continue
+                result["cart_price"] = str(line["price"])
+                result["price_changed"] = cart_price != product.price
+            results.append(result)
 
         return Response(
             {
-                "product": product.name,
-                "requested_quantity": quantity,
-                "available_stock": product.stock_quantity,
-                "is_available": available,
-                "message": f"{'Available' if available else 'Insufficient stock'}",
+                "all_available": all(line.get("is_available") for line in results),
+                "lines": results,
             }
         )
 
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="import",
+        permission_classes=[permissions.IsAuthenticated],
+    )
+    def import_products(self, request):
+        """
+        Create or update products from an uploaded CSV or NDJSON feed.
+
+        The feed is sent as the multipart ``file`` field; its format comes
+        from ``file_format`` or the file extension. Rows with an ``id``
+        update the requester's product, others create one. Invalid rows
+        are reported per line and skipped.
+        """
+        upload = request.FILES.get("file")
+        if upload is None:
+            return Response(
+                {"error": "Upload the feed as the 'file' field"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            file_format = feeds.detect_format(
+                upload.name, request.data.get("file_format")
+            )
+            report = feeds.ProductImporter(request.user).run(
+                feeds.read_rows(upload, file_format)
+            )
+        except feeds.FeedError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(report)
+
+    @action(
+        detail=False, methods=["get"], permission_classes=[permissions.IsAuthenticated]
+    )
+    def export(self, request):
+        """
+        Stream the catalog as CSV (default) or NDJSON (?file_format=ndjson).
+
+        Accepts the same filters as the product list.
+        """
+        file_format = request.query_params.get("file_format", "csv").lower()
+        if file_format not in feeds.FORMATS:
+            return Response(
+                {"error": f"file_format must be one of {', '.join(feeds.FORMATS)}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        queryset = self.filter_queryset(Product.objects.all())
+        content_type = "text/csv" if file_format == "csv" else "application/x-ndjson"
+        # Under ASGI only an async iterator is streamed; Django would read a
+        # sync one to the end first.
+        if isinstance(request._request, ASGIRequest):
+            rows = feeds.aexport_rows(queryset, file_format)
+        else:
+            rows = feeds.export_rows(queryset, file_format)
+        response = StreamingHttpResponse(rows, content_type=content_type)
+        response["Content-Disposition"] = (
+            f'attachment; filename="products.{file_format}"'
+        )
+        return response
+
+    @action(detail=True, methods=["post"])
+    def check_availability(self, request, pk=None):
+        """Check if requested quantity is available."""
+        product = self.get_object()
+        quantity, error = parse_quantity(request.data.get("quantity", 1))
+        if error:
+            return Response({"error": error}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(availability(product, quantity))
+
 
 class OrderViewSet(viewsets.ModelViewSet):
     """
@@ -144,13 +351,33 @@ class OrderViewSet(viewsets.ModelViewSet):
                 Order.objects.select_related().prefetch_related("items__product").all()
             )
 
-        # For regular users, show orders they created
-        return (
-            Order.objects.filter(customer_email=self.request.user.email)
-            .select_related()
-            .prefetch_related("items__product")
+        # For regular users, show their own orders
+        return Order.objects.for_customer(self.request.user).prefetch_related(
+            "items__product"
+        )
+
+    def list(self, request, *args, **kwargs):
+        orders = self.filter_queryset(self.get_queryset())
+
+        page = self.paginate_queryset(orders)
+        if page is not None:
+            serializer = OrderReadSerializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+
+        serializer = OrderReadSerializer(orders, many=True)
+        return Response(serializer.data)
+
+    def retrieve(self, request, *args, **kwargs):
+        return Response(OrderReadSerializer(self.get_object()).data)
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        OrderStatusCounter.objects.record(
+            instance.status, None, amount=instance.total_amount
         )
+        instance.delete()
 
+    @idempotent
     def create(self, request, *args, **kwargs):
         """
         Create order with stock validation.
@@ -160,7 +387,9 @@ class OrderViewSet(viewsets.ModelViewSet):
 
         try:
             serializer.is_valid(raise_exception=True)
-            order = serializer.save()
+            order = serializer.save(
+                customer=self.get_customer(serializer.validated_data["customer_email"])
+            )
 
             headers = self.get_success_headers(serializer.data)
             return Response(
@@ -186,7 +415,14 @@ class OrderViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
+    def get_customer(self, email):
+        """The account an order placed for ``email`` belongs to, if any."""
+        if email == self.request.user.email.lower():
+            return self.request.user
+        return users_with_email(email).first()
+
     @action(detail=True, methods=["post"])
+    @idempotent
     @transaction.atomic
     def cancel(self, request, pk=None):
         """
@@ -196,7 +432,7 @@ class OrderViewSet(viewsets.ModelViewSet):
         order = self.get_object()
 
         # Check if user owns this order or is staff
-        if not request.user.is_staff and order.customer_email != request.user.email:
+        if not request.user.is_staff and not order.is_owned_by(request.user):
             return Response(
                 {"error": "You do not have permission to cancel this order"},
                 status=status.HTTP_403_FORBIDDEN,
@@ -214,15 +450,17 @@ class OrderViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        # Restore stock for each item
-        for item in order.items.all():
-            product = Product.objects.select_for_update().get(pk=item.product.pk)
-            product.stock_quantity += item.quantity
-            product.save(update_fields=["stock_quantity"])
+        # Update order status first so a concurrent cancel cannot restore
+        # the stock twice
+        if not order.transition_to("cancelled"):
+            return Response(
+                {"error": "Order status changed, please retry"},
+                status=status.HTTP_409_CONFLICT,
+            )
+        jobs.enqueue("order_status_changed", order_id=order.pk, status="cancelled")
 
-        # Update order status
-        order.status = "cancelled"
-        order.save(update_fields=["status"])
+        # Restore stock for every item at once
+        stock.release(dict(order.items.values_list("product_id", "quantity")))
 
         serializer = self.get_serializer(order)
         return Response(
@@ -233,6 +471,7 @@ class OrderViewSet(viewsets.ModelViewSet):
         )
 
     @action(detail=True, methods=["post"])
+    @transaction.atomic
     def mark_completed(self, request, pk=None):
         """
         Mark order as completed (staff only).
@@ -257,8 +496,12 @@ class OrderViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        order.status = "completed"
-        order.save(update_fields=["status"])
+        if not order.transition_to("completed"):
+            return Response(
+                {"error": "Order status changed, please retry"},
+                status=status.HTTP_409_CONFLICT,
+            )
+        jobs.enqueue("order_status_changed", order_id=order.pk, status="completed")
 
         serializer = self.get_serializer(order)
         return Response(
@@ -266,6 +509,7 @@ class OrderViewSet(viewsets.ModelViewSet):
         )
 
     @action(detail=True, methods=["post"])
+    @transaction.atomic
     def mark_processing(self, request, pk=None):
         """
         Mark order as processing (staff only).
@@ -284,31 +528,120 @@ class OrderViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        order.status = "processing"
-        order.save(update_fields=["status"])
+        if not order.transition_to("processing"):
+            return Response(
+                {"error": "Order status changed, please retry"},
+                status=status.HTTP_409_CONFLICT,
+            )
+        jobs.enqueue("order_status_changed", order_id=order.pk, status="processing")
 
         serializer = self.get_serializer(order)
         return Response(
             {"order": serializer.data, "message": "Order marked as processing"}
         )
 
+    @action(detail=False, methods=["post"])
+    @transaction.atomic
+    def bulk_transition(self, request):
+        """
+        Move many orders to a new status at once (staff only).
+
+        Accepts {"status": ..., "ids": [...]} or {"status": ..., "filter":
+        {...}} and reports the outcome for every selected order. Runs a
+        fixed number of statements whatever the number of orders.
+        """
+        if not request.user.is_staff:
+            return Response(
+                {"error": "Only staff can change orders in bulk"},
+                status=status.HTTP_403_FORBIDDEN,
+            )
+
+        serializer = BulkOrderTransitionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        target = serializer.validated_data["status"]
+        sources = Order.ALLOWED_TRANSITIONS[target]
+        limit = serializer.MAX_ORDERS
+
+        # Lock the selected orders in primary key order
+        selected = list(
+            serializer.get_queryset()
+            .select_for_update()
+            .values_list("pk", "status", "total_amount")[: limit + 1]
+        )
+        has_more = len(selected) > limit
+        selected = selected[:limit]
+
+        eligible = [pk for pk, current, _ in selected if current in sources]
+        if eligible:
+            # The allowed transition is enforced by the UPDATE itself
+            Order.objects.filter(pk__in=eligible, status__in=sources).update(
+                status=target, updated_at=timezone.now()
+            )
+            jobs.enqueue_many(
+                "order_status_changed",
+                [{"order_id": pk, "status": target} for pk in eligible],
+            )
+
+            if target == "cancelled":
+                # One aggregated restore for all items of all cancelled orders
+                stock.release(
+                    dict(
+                        OrderItem.objects.filter(order_id__in=eligible)
+                        .values("product_id")
+                        .annotate(total=Sum("quantity"))
+                        .values_list("product_id", "total")
+                    )
+                )
+
+            for source in sources:
+                moved = [
+                    amount for _, current, amount in selected if current == source
+                ]
+                if moved:
+                    OrderStatusCounter.objects.record(
+                        source, target, count=len(moved), amount=sum(moved)
+                    )
+
+        results = []
+        for pk, current, _ in selected:
+            result = {"id": pk, "previous_status": current}
+            if current in sources:
+                result["result"] = "updated"
+            else:
+                result["result"] = "skipped"
+                result["detail"] = f"Cannot move a {current} order to {target}"
+            results.append(result)
+
+        found = {pk for pk, _, _ in selected}
+        for pk in serializer.validated_data.get("ids", []):
+            if pk not in found:
+                found.add(pk)
+                results.append({"id": pk, "result": "not_found"})
+
+        return Response(
+            {
+                "status": target,
+                "updated": len(eligible),
+                "has_more": has_more,
+                "results": results,
+            }
+        )
+
     @action(detail=False, methods=["get"])
     def my_orders(self, request):
         """
         Get current user's orders.
         """
-        orders = (
-            Order.objects.filter(customer_email=request.user.email)
-            .select_related()
-            .prefetch_related("items__product")
+        orders = Order.objects.for_customer(request.user).prefetch_related(
+            "items__product"
         )
 
         page = self.paginate_queryset(orders)
         if page is not None:
-            serializer = self.get_serializer(page, many=True)
+            serializer = OrderReadSerializer(page, many=True)
             return self.get_paginated_response(serializer.data)
 
-        serializer = self.get_serializer(orders, many=True)
+        serializer = OrderReadSerializer(orders, many=True)
         return Response(serializer.data)
 
     @action(detail=False, methods=["get"])
@@ -322,14 +655,19 @@ class OrderViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_403_FORBIDDEN,
             )
 
-        # Fixed: Use Q from django.db.models, not models.Q
-        stats = Order.objects.aggregate(
-            total_orders=Count("id"),
-            total_revenue=Sum("total_amount"),
-            pending_orders=Count("id", filter=Q(status="pending")),
-            processing_orders=Count("id", filter=Q(status="processing")),
-            completed_orders=Count("id", filter=Q(status="completed")),
-            cancelled_orders=Count("id", filter=Q(status="cancelled")),
-        )
+        # Read the running counters instead of scanning every order
+        totals = OrderStatusCounter.objects.totals()
+        total_orders = sum(count for count, _ in totals.values())
+
+        stats = {
+            "total_orders": total_orders,
+            "total_revenue": (
+                sum(revenue for _, revenue in totals.values())
+                if total_orders
+                else None
+            ),
+        }
+        for value, _ in Order.STATUS_CHOICES:
+            stats[f"{value}_orders"] = totals.get(value, (0, 0))[0]
 
         return Response(stats)
@@ -0,0 +1,232 @@
+"""
+Admission control: a concurrency budget per class of route.
+
+Each class of ROUTES may run ADMISSION_CLASSES[name]["limit"] requests
+at once across all worker processes. A request over the limit waits up
+to the class's "queue_timeout" seconds for a slot, then is answered 503
+with Retry-After. A saturated class thus sheds its own load within its
+deadline instead of tying up every worker, and the other classes (order
+placement while browsing spikes, say) keep their share. Routes in no
+class, such as /health, are never held back.
+
+Budgets are counted in the cache, so they hold across worker processes
+only when the cache is shared (Redis, Memcached); ADMISSION_CONTROL is
+off by default otherwise (see CACHE_IS_SHARED). A waiting request polls
+for a slot, backing off from POLL_INTERVAL to MAX_POLL_INTERVAL. A
+slot is counted in the ADMISSION_WINDOW-seconds window it was taken in
+and the next one only, so slots a killed worker never gave back are
+forgotten after two windows. Requests running longer than that stop
+counting, and so do streaming responses once the view has returned.
+"""
+
+import asyncio
+import random
+import re
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+
+RUNNING_KEY = "admission:{name}:running:{window}"
+WAITING_KEY = "admission:{name}:waiting:{window}"
+REJECTED_KEY = "admission:{name}:rejected"
+# Seconds between the first attempts of a queued request, doubling with
+# jitter up to MAX_POLL_INTERVAL
+POLL_INTERVAL = 0.02
+MAX_POLL_INTERVAL = 0.2
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+# (class, True for safe methods only, False for unsafe ones only, None for
+# any, path); the first match applies.
+ROUTES = [
+    ("analytics", None, re.compile(r"^/api/orders/statistics/")),
+    ("auth", None, re.compile(r"^/api/auth/")),
+    ("order_writes", False, re.compile(r"^/api/orders/")),
+    ("order_reads", True, re.compile(r"^/api/orders/")),
+    ("catalog_reads", True, re.compile(r"^/api/(products|categories)/")),
+]
+
+
+async def _aincr(key):
+    # BaseCache.aincr() is a get then a set, which concurrent requests can
+    # interleave; incr() is atomic. Not thread-sensitive, to stay off the
+    # thread that runs the ORM queries of async views.
+    return await sync_to_async(cache.incr, thread_sensitive=False)(key)
+
+
+async def _adecr(key):
+    return await sync_to_async(cache.decr, thread_sensitive=False)(key)
+
+
+def _poll_delays(deadline):
+    """Seconds to wait before each new attempt, never past ``deadline``."""
+    interval = POLL_INTERVAL
+    while True:
+        remaining = deadline - time.monotonic()
+        yield max(0, min(random.uniform(interval / 2, interval), remaining))
+        interval = min(interval * 2, MAX_POLL_INTERVAL)
+
+
+def classify(method, path):
+    """The class of a request, None when it has no budget."""
+    safe = method in SAFE_METHODS
+    for name, safe_only, pattern in ROUTES:
+        if safe_only in (None, safe) and pattern.match(path):
+            return name
+    return None
+
+
+class WindowedCounter:
+    """
+    A count per class in the cache, of increments made in this window and
+    the previous one.
+    """
+
+    def __init__(self, template):
+        self.template = template
+
+    def keys(self, name):
+        """The keys of this window and the previous one."""
+        window = int(time.time() // settings.ADMISSION_WINDOW)
+        return (
+            self.template.format(name=name, window=window),
+            self.template.format(name=name, window=window - 1),
+        )
+
+    def timeout(self):
+        return settings.ADMISSION_WINDOW * 3
+
+    def incr(self, name):
+        """Count one; returns the key to decr() later and the new total."""
+        current, previous = self.keys(name)
+        cache.add(current, 0, self.timeout())
+        try:
+            count = cache.incr(current)
+        except ValueError:
+            # Expired in between
+            count = 1
+            cache.set(current, count, self.timeout())
+        return current, count + cache.get(previous, 0)
+
+    async def aincr(self, name):
+        current, previous = self.keys(name)
+        await cache.aadd(current, 0, self.timeout())
+        try:
+            count = await _aincr(current)
+        except ValueError:
+            count = 1
+            await cache.aset(current, count, self.timeout())
+        return current, count + await cache.aget(previous, 0)
+
+    def decr(self, key):
+        try:
+            cache.decr(key)
+        except ValueError:
+            # Already forgotten
+            pass
+
+    async def adecr(self, key):
+        try:
+            await _adecr(key)
+        except ValueError:
+            pass
+
+    def value(self, name):
+        return max(0, sum(cache.get_many(self.keys(name)).values()))
+
+
+running = WindowedCounter(RUNNING_KEY)
+waiting = WindowedCounter(WAITING_KEY)
+
+
+class Budget:
+    """The concurrency budget of one class of route."""
+
+    def __init__(self, name, limit, queue_timeout):
+        self.name = name
+        self.limit = limit
+        self.queue_timeout = queue_timeout
+
+    def acquire(self):
+        """Take a slot; returns its key, or None when none freed up in time."""
+        deadline = time.monotonic() + self.queue_timeout
+        delays = _poll_delays(deadline)
+        queued = None
+        try:
+            while True:
+                key, count = running.incr(self.name)
+                if count <= self.limit:
+                    return key
+                running.decr(key)
+                if time.monotonic() >= deadline:
+                    self.count_rejection()
+                    return None
+                if queued is None:
+                    queued, _ = waiting.incr(self.name)
+                time.sleep(next(delays))
+        finally:
+            if queued is not None:
+                waiting.decr(queued)
+
+    async def aacquire(self):
+        deadline = time.monotonic() + self.queue_timeout
+        delays = _poll_delays(deadline)
+        queued = None
+        try:
+            while True:
+                key, count = await running.aincr(self.name)
+                if count <= self.limit:
+                    return key
+                await running.adecr(key)
+                if time.monotonic() >= deadline:
+                    await self.acount_rejection()
+                    return None
+                if queued is None:
+                    queued, _ = await waiting.aincr(self.name)
+                await asyncio.sleep(next(delays))
+        finally:
+            if queued is not None:
+                await waiting.adecr(queued)
+
+    def release(self, key):
+        running.decr(key)
+
+    async def arelease(self, key):
+        await running.adecr(key)
+
+    def count_rejection(self):
+        key = REJECTED_KEY.format(name=self.name)
+        cache.add(key, 0, None)
+        cache.incr(key)
+
+    async def acount_rejection(self):
+        key = REJECTED_KEY.format(name=self.name)
+        await cache.aadd(key, 0, None)
+        await _aincr(key)
+
+    def stats(self):
+        return {
+            "limit": self.limit,
+            "queue_timeout": self.queue_timeout,
+            "running": running.value(self.name),
+            "waiting": waiting.value(self.name),
+            "rejected": cache.get(REJECTED_KEY.format(name=self.name), 0),
+        }
+
+
+def budget_for(request):
+    """The budget of ``request``'s class, None when it has none."""
+    name = classify(request.method, request.path_info)
+    options = settings.ADMISSION_CLASSES.get(name)
+    if options is None:
+        return None
+    return Budget(name, **options)
+
+
+def stats():
+    """Running and waiting requests and rejections so far, per class."""
+    return {
+        name: Budget(name, **options).stats()
+        for name, options in settings.ADMISSION_CLASSES.items()
+    }
@@ -12,5 +12,16 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'e_commerce_API.settings')
+# Under ASGI the hot read endpoints run as native async views
+os.environ.setdefault('ASYNC_READ_VIEWS', 'True')
 
 application = get_asgi_application()
+
+from django.conf import settings  # noqa: E402
+
+if settings.WARMUP:
+    from e_commerce_API import warmup  # noqa: E402
+
+    # Initialize now rather than on the first requests; each gunicorn worker
+    # then connects and replays requests (gunicorn.conf.py).
+    warmup.prepare()
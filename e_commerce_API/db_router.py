@@ -0,0 +1,78 @@
+"""
+Primary/replica database routing.
+
+Replicas are the ``replicaN`` entries of DATABASES (see
+DATABASE_REPLICA_URLS in settings). Writes always go to the primary.
+Reads go to a replica only during a request the middleware marked as
+replica-safe: a GET/HEAD/OPTIONS from a client that has not written in
+the last DATABASE_PIN_SECONDS. Reads inside a transaction (e.g.
+select_for_update), and anything outside a request such as management
+commands, use the primary.
+
+A client is pinned to the primary after a write by a cookie and, for
+token clients that ignore cookies, by a cache entry keyed on its
+Authorization header. DATABASE_PIN_SECONDS should exceed the replication
+lag.
+"""
+
+import hashlib
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA_PREFIX = "replica"
+PIN_COOKIE = "db_pin"
+PIN_KEY = "db:pin:{digest}"
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+# The replica the current request may read from, None for the primary
+_replica = ContextVar("db_replica", default=None)
+
+
+def replicas():
+    return [alias for alias in settings.DATABASES if alias.startswith(REPLICA_PREFIX)]
+
+
+@contextmanager
+def use_replica(alias):
+    token = _replica.set(alias)
+    try:
+        yield
+    finally:
+        _replica.reset(token)
+
+
+@contextmanager
+def use_primary():
+    """Read from the primary in the block, e.g. where lag is not acceptable."""
+    with use_replica(None):
+        yield
+
+
+def pin_key(request):
+    """Cache key pinning the client of a token-authenticated request."""
+    authorization = request.headers.get("Authorization")
+    if not authorization:
+        return None
+    digest = hashlib.sha256(authorization.encode("utf-8")).hexdigest()
+    return PIN_KEY.format(digest=digest)
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        alias = _replica.get()
+        if alias is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return not db.startswith(REPLICA_PREFIX)
@@ -0,0 +1,126 @@
+"""
+Per-request SQL statistics.
+
+An execute wrapper, installed on every database connection as it is
+opened, times each statement and adds it to the collector of the current
+context, if there is one. Outside ``collect_queries()`` it only does a
+context variable lookup, so it is left installed all the time; the
+middleware decides which requests get a collector.
+
+Statements are fingerprinted by their SQL with the parameters left out
+(and ``IN`` lists of any length folded together), so the same statement
+run for every row of a list, the usual N+1, shows up as one fingerprint
+with a high count.
+"""
+
+import hashlib
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+_collector = ContextVar("sql_collector", default=None)
+
+IN_LIST = re.compile(r"IN \((?:%s, )*%s\)")
+
+# Longest SQL kept in reports
+MAX_SQL_LENGTH = 300
+
+
+def fingerprint(sql):
+    return IN_LIST.sub("IN (...)", sql)
+
+
+class QueryStats:
+    """Queries run while collecting: count, time and repeated statements."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+        self.calls = Counter()
+
+    @property
+    def duplicates(self):
+        """Statements run again with the very same parameters."""
+        return sum(count - 1 for count in self.calls.values())
+
+    def record(self, sql, params, many, duration):
+        self.count += 1
+        self.duration += duration
+        self.statements[fingerprint(sql)] += 1
+        if not many:
+            self.calls[sql, repr(params)] += 1
+
+    def merge(self, other):
+        self.count += other.count
+        self.duration += other.duration
+        self.statements.update(other.statements)
+        self.calls.update(other.calls)
+
+    def repeated(self, threshold=None):
+        """Statements run at least ``threshold`` times, most frequent first."""
+        if threshold is None:
+            threshold = settings.SQL_N_PLUS_ONE_THRESHOLD
+        return [
+            {
+                "id": hashlib.sha1(sql.encode()).hexdigest()[:12],
+                "count": count,
+                "sql": sql[:MAX_SQL_LENGTH],
+            }
+            for sql, count in self.statements.most_common()
+            if count >= threshold
+        ]
+
+    def as_dict(self):
+        return {
+            "queries": self.count,
+            "db_ms": round(self.duration * 1000, 2),
+            "duplicates": self.duplicates,
+            "n_plus_one": self.repeated(),
+        }
+
+
+@contextmanager
+def collect_queries():
+    """
+    Record the queries run in the block (on any connection, including from
+    sync_to_async threads) into the yielded QueryStats. Nested blocks also
+    count toward the enclosing one.
+    """
+    stats = QueryStats()
+    parent = _collector.get()
+    token = _collector.set(stats)
+    try:
+        yield stats
+    finally:
+        _collector.reset(token)
+        if parent is not None:
+            parent.merge(stats)
+
+
+def record_query(execute, sql, params, many, context):
+    stats = _collector.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.record(sql, params, many, time.perf_counter() - start)
+
+
+def install(connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+connection_created.connect(install)
+for _connection in connections.all(initialized_only=True):
+    install(_connection)
@@ -0,0 +1,237 @@
+import json
+import logging
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import JsonResponse
+from whitenoise.middleware import WhiteNoiseMiddleware as BaseWhiteNoiseMiddleware
+
+from . import admission, db_pool, db_router
+from .instrumentation import collect_queries
+
+sql_logger = logging.getLogger("e_commerce_API.sql")
+
+
+class WhiteNoiseMiddleware(BaseWhiteNoiseMiddleware):
+    """
+    WhiteNoise that also runs in async mode.
+
+    WhiteNoise's middleware is sync only, which under ASGI forces Django to
+    run every request below it through a thread. Serving a file is a
+    dictionary lookup (or a disk check with autorefresh in development), so
+    it is safe to do on the event loop.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, *args, **kwargs):
+        super().__init__(get_response, *args, **kwargs)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = self.find_file(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return self.serve(static_file, request)
+        return await self.get_response(request)
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Measure the SQL of a sample of requests.
+
+    A sampled request gets a ``Server-Timing`` header with its query count
+    and database time, and one JSON log line on ``e_commerce_API.sql``,
+    with the connection pool's usage when DATABASE_POOL is on. The line is
+    logged as a warning when a statement repeats often enough to look like
+    an N+1. SQL_INSTRUMENTATION_SAMPLE_RATE sets the share of
+    requests measured. Queries run while a streaming response is consumed
+    are not counted.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.sampled():
+            return self.get_response(request)
+
+        start = time.perf_counter()
+        with collect_queries() as stats:
+            response = self.get_response(request)
+        self.report(request, response, stats, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        if not self.sampled():
+            return await self.get_response(request)
+
+        start = time.perf_counter()
+        with collect_queries() as stats:
+            response = await self.get_response(request)
+        self.report(request, response, stats, time.perf_counter() - start)
+        return response
+
+    def sampled(self):
+        rate = settings.SQL_INSTRUMENTATION_SAMPLE_RATE
+        return rate >= 1 or (rate > 0 and random.random() < rate)
+
+    def report(self, request, response, stats, duration):
+        response["Server-Timing"] = (
+            f'db;dur={stats.duration * 1000:.2f};desc="{stats.count} queries", '
+            f"total;dur={duration * 1000:.2f}"
+        )
+
+        entry = {
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "total_ms": round(duration * 1000, 2),
+            **stats.as_dict(),
+        }
+        pool = db_pool.stats()
+        if pool is not None:
+            entry["db_pool"] = {
+                key: pool[key] for key in ("size", "in_use", "waiting", "wait_ms")
+            }
+        level = logging.WARNING if entry["n_plus_one"] else logging.INFO
+        sql_logger.log(level, json.dumps(entry))
+
+
+class AdmissionControlMiddleware:
+    """
+    Hold each class of route to its concurrency budget (see
+    e_commerce_API.admission): a request that gets no slot within its
+    class's queue deadline is answered 503 with Retry-After. Not used when
+    ADMISSION_CONTROL is off.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.ADMISSION_CONTROL:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        budget = admission.budget_for(request)
+        if budget is None:
+            return self.get_response(request)
+        slot = budget.acquire()
+        if slot is None:
+            return self.reject(budget)
+        try:
+            return self.get_response(request)
+        finally:
+            budget.release(slot)
+
+    async def __acall__(self, request):
+        budget = admission.budget_for(request)
+        if budget is None:
+            return await self.get_response(request)
+        slot = await budget.aacquire()
+        if slot is None:
+            return self.reject(budget)
+        try:
+            return await self.get_response(request)
+        finally:
+            await budget.arelease(slot)
+
+    def reject(self, budget):
+        response = JsonResponse(
+            {"error": "Server busy, please retry shortly", "class": budget.name},
+            status=503,
+        )
+        response["Retry-After"] = str(settings.ADMISSION_RETRY_AFTER)
+        return response
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Let safe requests read from a replica, and pin clients that write to
+    the primary for DATABASE_PIN_SECONDS (see e_commerce_API.db_router).
+    Not used when no replica is configured.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.replicas = db_router.replicas()
+        if not self.replicas:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        key = db_router.pin_key(request)
+        if request.method not in db_router.SAFE_METHODS:
+            with db_router.use_primary():
+                response = self.get_response(request)
+            if key:
+                cache.set(key, True, settings.DATABASE_PIN_SECONDS)
+            return self.pin(response)
+
+        pinned = db_router.PIN_COOKIE in request.COOKIES or (
+            key is not None and cache.get(key) is not None
+        )
+        with db_router.use_replica(None if pinned else self.choose()):
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        key = db_router.pin_key(request)
+        if request.method not in db_router.SAFE_METHODS:
+            with db_router.use_primary():
+                response = await self.get_response(request)
+            if key:
+                await cache.aset(key, True, settings.DATABASE_PIN_SECONDS)
+            return self.pin(response)
+
+        pinned = db_router.PIN_COOKIE in request.COOKIES or (
+            key is not None and await cache.aget(key) is not None
+        )
+        with db_router.use_replica(None if pinned else self.choose()):
+            return await self.get_response(request)
+
+    def choose(self):
+        return random.choice(self.replicas)
+
+    def pin(self, response):
+        response.set_cookie(
+            db_router.PIN_COOKIE,
+            "1",
+            max_age=settings.DATABASE_PIN_SECONDS,
+            httponly=True,
+            samesite="Lax",
+        )
+        return response
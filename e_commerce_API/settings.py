@@ -1,5 +1,5 @@
 from pathlib import Path
-from decouple import config
+from decouple import Csv, config
 import os
 import dj_database_url
 
@@ -38,8 +38,11 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "e_commerce_API.middleware.QueryInstrumentationMiddleware",
+    "e_commerce_API.middleware.AdmissionControlMiddleware",
+    "e_commerce_API.middleware.ReplicaRoutingMiddleware",
     "django.middleware.security.SecurityMiddleware",
-    "whitenoise.middleware.WhiteNoiseMiddleware",
+    "e_commerce_API.middleware.WhiteNoiseMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -80,10 +83,204 @@ DATABASES = {
     "default": dj_database_url.config(
         default=config("DATABASE_URL"),  # decouple will read from .env locally
         conn_max_age=600,
+        # Test reused connections, so one dropped by a failover is replaced
+        conn_health_checks=True,
         ssl_require=not DEBUG,  # force SSL on Render, not locally
     )
 }
 
+# Read replicas, as comma-separated database URLs. Safe requests read from
+# one of them, except for clients that wrote in the last
+# DATABASE_PIN_SECONDS (see e_commerce_API/db_router.py). Tests run them as
+# mirrors of the default database.
+DATABASE_REPLICA_URLS = config("DATABASE_REPLICA_URLS", default="", cast=Csv())
+for _index, _url in enumerate(DATABASE_REPLICA_URLS, start=1):
+    DATABASES[f"replica{_index}"] = {
+        **dj_database_url.parse(
+            _url, conn_max_age=600, conn_health_checks=True, ssl_require=not DEBUG
+        ),
+        "TEST": {"MIRROR": "default"},
+    }
+DATABASE_ROUTERS = ["e_commerce_API.db_router.PrimaryReplicaRouter"]
+DATABASE_PIN_SECONDS = config("DATABASE_PIN_SECONDS", default=5, cast=int)
+
+# Connection pooling (PostgreSQL, psycopg 3): each worker process gets a
+# pool of at most DATABASE_MAX_CONNECTIONS / WEB_CONCURRENCY connections per
+# database, instead of a persistent connection per thread. WEB_CONCURRENCY
+# is also gunicorn's default worker count. See e_commerce_API/db_pool.py.
+DATABASE_POOL = config("DATABASE_POOL", default=False, cast=bool)
+DATABASE_MAX_CONNECTIONS = config("DATABASE_MAX_CONNECTIONS", default=80, cast=int)
+WEB_CONCURRENCY = config("WEB_CONCURRENCY", default=1, cast=int)
+if DATABASE_POOL:
+    from e_commerce_API import db_pool
+
+    for _database in DATABASES.values():
+        db_pool.configure(
+            _database,
+            max_connections=DATABASE_MAX_CONNECTIONS,
+            workers=WEB_CONCURRENCY,
+            min_size=config("DATABASE_POOL_MIN_SIZE", default=2, cast=int),
+            timeout=config("DATABASE_POOL_TIMEOUT", default=10, cast=float),
+            max_idle=config("DATABASE_POOL_MAX_IDLE", default=300, cast=float),
+            max_lifetime=config("DATABASE_POOL_MAX_LIFETIME", default=1800, cast=float),
+        )
+
+
+# Django REST Framework
+REST_FRAMEWORK = {
+    "DEFAULT_AUTHENTICATION_CLASSES": [
+        "users.authentication.CachedTokenAuthentication",
+        "rest_framework.authentication.SessionAuthentication",
+        "rest_framework.authentication.BasicAuthentication",
+    ],
+    "DEFAULT_PAGINATION_CLASS": "catalog.pagination.KeysetPagination",
+}
+
+
+# Cache
+# Local memory by default; point CACHE_BACKEND/CACHE_LOCATION at Redis or
+# Memcached in production so all workers share entries.
+CACHES = {
+    "default": {
+        "BACKEND": config(
+            "CACHE_BACKEND", default="django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": config("CACHE_LOCATION", default="e-commerce-api"),
+    }
+}
+
+# Whether every worker process sees the same cache entries: a process-local
+# backend only qualifies with a single worker. Features that coordinate
+# workers through the cache are off by default without it.
+PROCESS_LOCAL_CACHES = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+CACHE_IS_SHARED = (
+    WEB_CONCURRENCY == 1 or CACHES["default"]["BACKEND"] not in PROCESS_LOCAL_CACHES
+)
+
+# Cache public catalog responses (catalog.cache). Writes invalidate them by
+# bumping version counters in the cache, which other workers only see when
+# it is shared; turning it on without one fails a system check.
+CATALOG_RESPONSE_CACHE = config(
+    "CATALOG_RESPONSE_CACHE", default=CACHE_IS_SHARED, cast=bool
+)
+
+# Seconds a cached public catalog response is kept. Entries are versioned
+# and invalidated on writes, so this only bounds memory use.
+CATALOG_CACHE_TIMEOUT = config("CATALOG_CACHE_TIMEOUT", default=300, cast=int)
+
+# Resolved auth tokens: seconds kept in the shared cache, seconds and entries
+# kept in each process. The local TTL bounds how long another worker may
+# still accept a token that was just revoked.
+TOKEN_CACHE_TIMEOUT = config("TOKEN_CACHE_TIMEOUT", default=300, cast=int)
+TOKEN_CACHE_LOCAL_TTL = config("TOKEN_CACHE_LOCAL_TTL", default=5, cast=float)
+TOKEN_CACHE_LOCAL_SIZE = config("TOKEN_CACHE_LOCAL_SIZE", default=1024, cast=int)
+
+# Seconds an Idempotency-Key (order create and cancel) replays its response
+# (catalog.idempotency); expired keys are deleted by purge_idempotency_keys.
+IDEMPOTENCY_KEY_TTL = config("IDEMPOTENCY_KEY_TTL", default=24 * 60 * 60, cast=int)
+
+# Background jobs (catalog.jobs), run by ``manage.py run_jobs``: attempts
+# before a job is moved to the dead letters, seconds a worker holds a
+# claimed job before others may take it over, and the first and longest
+# retry delays (doubling in between).
+JOBS_MAX_ATTEMPTS = config("JOBS_MAX_ATTEMPTS", default=5, cast=int)
+JOBS_LEASE_SECONDS = config("JOBS_LEASE_SECONDS", default=300, cast=int)
+JOBS_BACKOFF_SECONDS = config("JOBS_BACKOFF_SECONDS", default=10, cast=float)
+JOBS_BACKOFF_MAX_SECONDS = config("JOBS_BACKOFF_MAX_SECONDS", default=3600, cast=float)
+
+# Order emails, sent by background jobs (catalog.tasks)
+EMAIL_BACKEND = config(
+    "EMAIL_BACKEND", default="django.core.mail.backends.console.EmailBackend"
+)
+DEFAULT_FROM_EMAIL = config("DEFAULT_FROM_EMAIL", default="orders@localhost")
+
+# Serve the hot read endpoints with native async views (catalog.async_views).
+# Turned on by asgi.py; under WSGI they would only add an event loop per
+# request.
+ASYNC_READ_VIEWS = config("ASYNC_READ_VIEWS", default=False, cast=bool)
+
+# SQL instrumentation (e_commerce_API.middleware.QueryInstrumentationMiddleware):
+# the share of requests measured, and how many times one statement may run in
+# a request before it is reported as a likely N+1.
+SQL_INSTRUMENTATION_SAMPLE_RATE = config(
+    "SQL_INSTRUMENTATION_SAMPLE_RATE", default=1.0 if DEBUG else 0.05, cast=float
+)
+SQL_N_PLUS_ONE_THRESHOLD = config("SQL_N_PLUS_ONE_THRESHOLD", default=5, cast=int)
+
+# Admission control (e_commerce_API.admission): how many requests of each
+# class of route may run at once across all workers, and how many seconds
+# one may wait for a slot before it gets a 503 with Retry-After. Counts are
+# kept in the cache per ADMISSION_WINDOW seconds; a slot is forgotten after
+# two windows if its worker dies.
+ADMISSION_CONTROL = config("ADMISSION_CONTROL", default=CACHE_IS_SHARED, cast=bool)
+ADMISSION_CLASSES = {
+    "catalog_reads": {
+        "limit": config("ADMISSION_CATALOG_READS", default=48, cast=int),
+        "queue_timeout": 0.1,
+    },
+    "order_reads": {
+        "limit": config("ADMISSION_ORDER_READS", default=16, cast=int),
+        "queue_timeout": 0.25,
+    },
+    "order_writes": {
+        "limit": config("ADMISSION_ORDER_WRITES", default=16, cast=int),
+        "queue_timeout": 2.0,
+    },
+    "auth": {
+        "limit": config("ADMISSION_AUTH", default=8, cast=int),
+        "queue_timeout": 1.0,
+    },
+    "analytics": {
+        "limit": config("ADMISSION_ANALYTICS", default=2, cast=int),
+        "queue_timeout": 0.5,
+    },
+}
+ADMISSION_WINDOW = config("ADMISSION_WINDOW", default=60, cast=int)
+ADMISSION_RETRY_AFTER = config("ADMISSION_RETRY_AFTER", default=1, cast=int)
+
+# Worker warm-up (e_commerce_API/warmup.py): initialize the application when
+# wsgi.py/asgi.py load it, and have each gunicorn worker open its connections
+# and GET the WARMUP_REQUESTS paths before serving traffic.
+WARMUP = config("WARMUP", default=True, cast=bool)
+WARMUP_REQUESTS = config(
+    "WARMUP_REQUESTS", default="/api/products/,/api/categories/", cast=Csv()
+)
+# Host the WARMUP_REQUESTS are made for. Responses are cached per host, so
+# set it to the public host name clients use (Render provides it).
+WARMUP_HOST = config(
+    "WARMUP_HOST",
+    default=next(
+        (host for host in ALLOWED_HOSTS if "*" not in host and host[:1] != "."),
+        config("RENDER_EXTERNAL_HOSTNAME", default="localhost"),
+    ),
+)
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {"console": {"class": "logging.StreamHandler"}},
+    "loggers": {
+        "e_commerce_API.sql": {
+            "handlers": ["console"],
+            "level": config("SQL_LOG_LEVEL", default="INFO"),
+            "propagate": False,
+        },
+        "e_commerce_API.warmup": {
+            "handlers": ["console"],
+            "level": "INFO",
+            "propagate": False,
+        },
+        "catalog.jobs": {
+            "handlers": ["console"],
+            "level": config("JOBS_LOG_LEVEL", default="INFO"),
+            "propagate": False,
+        },
+    },
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -118,6 +315,13 @@ USE_TZ = True
 # Custom user model
 AUTH_USER_MODEL = "users.User"
 
+# Logins by email or username in one query (users.backends). Served async,
+# password hashing runs on LOGIN_HASH_WORKERS threads per process; beyond
+# LOGIN_HASH_QUEUE attempts queued or running, logins get a 503.
+AUTHENTICATION_BACKENDS = ["users.backends.EmailOrUsernameBackend"]
+LOGIN_HASH_WORKERS = config("LOGIN_HASH_WORKERS", default=2, cast=int)
+LOGIN_HASH_QUEUE = config("LOGIN_HASH_QUEUE", default=64, cast=int)
+
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/5.2/howto/static-files/
 
@@ -170,8 +374,11 @@ CORS_ALLOW_HEADERS = [
     "authorization",
     "content-type",
     "dnt",
+    "idempotency-key",
     "origin",
     "user-agent",
     "x-csrftoken",
     "x-requested-with",
 ]
+# Response headers browser clients may read (catalog.idempotency)
+CORS_EXPOSE_HEADERS = ["idempotent-replayed"]
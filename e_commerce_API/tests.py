@@ -0,0 +1,161 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from django.test import (
+    AsyncClient,
+    RequestFactory,
+    SimpleTestCase,
+    TestCase,
+    override_settings,
+)
+from rest_framework.test import APIClient
+
+from catalog.models import Product
+from users.models import User
+
+from . import admission, db_router
+from .middleware import AdmissionControlMiddleware, ReplicaRoutingMiddleware
+
+ONE_SLOT = {"catalog_reads": {"limit": 1, "queue_timeout": 0.05}}
+
+
+class AdmissionClassTests(SimpleTestCase):
+    def test_classify(self):
+        for method, path, name in [
+            ("GET", "/api/products/", "catalog_reads"),
+            ("HEAD", "/api/categories/garden/", "catalog_reads"),
+            ("POST", "/api/products/", None),
+            ("GET", "/api/orders/", "order_reads"),
+            ("POST", "/api/orders/", "order_writes"),
+            ("POST", "/api/orders/5/cancel/", "order_writes"),
+            ("GET", "/api/orders/statistics/", "analytics"),
+            ("POST", "/api/auth/login/", "auth"),
+            ("GET", "/health", None),
+            ("GET", "/health/admission", None),
+        ]:
+            with self.subTest(method=method, path=path):
+                self.assertEqual(admission.classify(method, path), name)
+
+
+@override_settings(ADMISSION_CONTROL=True, ADMISSION_CLASSES=ONE_SLOT)
+class AdmissionControlTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        # The middleware is set up with the handler: a new client picks up
+        # the settings above
+        self.client = APIClient()
+        self.budget = admission.Budget("catalog_reads", **ONE_SLOT["catalog_reads"])
+
+    def running(self):
+        return admission.stats()["catalog_reads"]["running"]
+
+    def test_rejects_when_full(self):
+        slot = self.budget.acquire()
+        response = self.client.get("/api/products/")
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], "1")
+        self.assertEqual(response.json()["class"], "catalog_reads")
+        self.assertEqual(admission.stats()["catalog_reads"]["rejected"], 1)
+        # Routes in no class are not held back
+        self.assertEqual(self.client.get("/health").status_code, 200)
+
+        self.budget.release(slot)
+        self.assertEqual(self.client.get("/api/products/").status_code, 200)
+
+    async def test_rejects_when_full_async(self):
+        slot = await self.budget.aacquire()
+        response = await AsyncClient().get("/api/products/")
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], "1")
+
+        await self.budget.arelease(slot)
+        response = await AsyncClient().get("/api/products/")
+        self.assertEqual(response.status_code, 200)
+
+    def test_releases_slot(self):
+        for _ in range(3):
+            self.assertEqual(self.client.get("/api/products/").status_code, 200)
+        self.assertEqual(self.running(), 0)
+
+        middleware = AdmissionControlMiddleware(mock.Mock(side_effect=RuntimeError))
+        with self.assertRaises(RuntimeError):
+            middleware(RequestFactory().get("/api/products/"))
+        self.assertEqual(self.running(), 0)
+
+    def test_queued_request_gets_freed_slot(self):
+        slot = self.budget.acquire()
+        # Freed while the second request waits for its first retry
+        with mock.patch(
+            "time.sleep", side_effect=lambda seconds: self.budget.release(slot)
+        ):
+            second = self.budget.acquire()
+        self.assertIsNotNone(second)
+        self.assertEqual(admission.stats()["catalog_reads"]["waiting"], 0)
+
+    def test_stats_staff_only(self):
+        self.assertEqual(self.client.get("/health/admission").status_code, 401)
+        user = User.objects.create_user("shopper", "shopper@example.com", "pw123456")
+        self.client.force_authenticate(user)
+        self.assertEqual(self.client.get("/health/admission").status_code, 403)
+
+        user.is_staff = True
+        user.save()
+        response = self.client.get("/health/admission")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["catalog_reads"]["limit"], 1)
+
+
+class ReplicaRoutingTests(SimpleTestCase):
+    databases = {"default"}
+
+    def setUp(self):
+        cache.clear()
+        with mock.patch.object(db_router, "replicas", return_value=["replica1"]):
+            self.middleware = ReplicaRoutingMiddleware(self.read_alias)
+
+    def read_alias(self, request):
+        # Where the view's queries would go
+        return HttpResponse(Product.objects.all().db)
+
+    def request(self, method="get", token=None, **cookies):
+        request = getattr(RequestFactory(), method)(
+            "/api/products/",
+            headers={"Authorization": f"Token {token}"} if token else {},
+        )
+        request.COOKIES.update(cookies)
+        return self.middleware(request)
+
+    def test_router(self):
+        router = db_router.PrimaryReplicaRouter()
+        self.assertEqual(router.db_for_read(Product), "default")
+        with db_router.use_replica("replica1"):
+            self.assertEqual(router.db_for_read(Product), "replica1")
+            self.assertEqual(router.db_for_write(Product), "default")
+            # e.g. select_for_update, or reading back the transaction's writes
+            with transaction.atomic():
+                self.assertEqual(router.db_for_read(Product), "default")
+            with db_router.use_primary():
+                self.assertEqual(router.db_for_read(Product), "default")
+        self.assertTrue(router.allow_migrate("default", "catalog"))
+        self.assertFalse(router.allow_migrate("replica1", "catalog"))
+
+    def test_safe_requests_read_from_replica(self):
+        response = self.request()
+        self.assertEqual(response.content, b"replica1")
+        self.assertNotIn(db_router.PIN_COOKIE, response.cookies)
+
+    def test_writes_pin_client(self):
+        response = self.request("post")
+        self.assertEqual(response.content, b"default")
+        self.assertEqual(response.cookies[db_router.PIN_COOKIE]["max-age"], 5)
+
+        pinned = self.request(**{db_router.PIN_COOKIE: "1"})
+        self.assertEqual(pinned.content, b"default")
+
+    def test_writes_pin_token(self):
+        self.request("post", token="abc")
+        self.assertEqual(self.request(token="abc").content, b"default")
+        self.assertEqual(self.request(token="xyz").content, b"replica1")
+        self.assertEqual(self.request().content, b"replica1")
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
@@ -5,6 +6,10 @@ from catalog.views import ProductViewSet, CategoryViewSet, OrderViewSet
 from users.views import UserViewSet, RegisterView, LoginView, LogoutView
 from rest_framework.authtoken.views import obtain_auth_token
 from django.http import JsonResponse
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from e_commerce_API import admission
 
 
 # Define a simple function to return JSON OK
@@ -12,12 +17,29 @@ def health_check(request):
     return JsonResponse({"status": "ok"})
 
 
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+def admission_stats(request):
+    """Requests running and queued, and rejections, per admission class (staff)."""
+    return Response(admission.stats())
+
+
 router = DefaultRouter()
 router.register(r"users", UserViewSet, basename="user")
 router.register(r"categories", CategoryViewSet, basename="category")
 router.register(r"products", ProductViewSet, basename="product")
 router.register(r"orders", OrderViewSet, basename="order")
 
+api_urls = router.urls
+if settings.ASYNC_READ_VIEWS:
+    from catalog import async_views as catalog_async_views
+    from users import async_views as users_async_views
+
+    # Native async versions of the hot read endpoints (ASGI deployments)
+    api_urls = catalog_async_views.install(
+        api_urls, {**catalog_async_views.VIEWS, **users_async_views.VIEWS}
+    )
+
 
 def home(request):
     return JsonResponse(
@@ -45,12 +67,17 @@ def home(request):
                     "low_stock": "/api/products/low_stock/",
                     "out_of_stock": "/api/products/out_of_stock/",
                     "check_availability": "/api/products/<id>/check_availability/",
+                    "bulk_availability": "/api/products/bulk_availability/",
+                    "facets": "/api/products/facets/?category=&search=&price_breaks=",
+                    "import": "/api/products/import/",
+                    "export": "/api/products/export/?file_format=csv|ndjson",
                 },
                 "order_endpoints": {
                     "my_orders": "/api/orders/my_orders/",
                     "cancel": "/api/orders/<id>/cancel/",
                     "mark_completed": "/api/orders/<id>/mark_completed/",
                     "mark_processing": "/api/orders/<id>/mark_processing/",
+                    "bulk_transition": "/api/orders/bulk_transition/",
                     "statistics": "/api/orders/statistics/",
                 },
             },
@@ -61,10 +88,15 @@ def home(request):
 urlpatterns = [
     path("", home),
     path("health", health_check),
+    path("health/admission", admission_stats),
     path("admin/", admin.site.urls),
-    path("api/", include(router.urls)),
+    path("api/", include(api_urls)),
     path("api/auth/token/", obtain_auth_token, name="api_token_auth"),
     path("api/auth/register/", RegisterView.as_view(), name="register"),
     path("api/auth/login/", LoginView.as_view(), name="login"),
     path("api/auth/logout/", LogoutView.as_view(), name="logout"),  # Added LogoutView
 ]
+
+if settings.ASYNC_READ_VIEWS:
+    # Login hashes passwords off the event loop, see users.backends
+    urlpatterns = catalog_async_views.install(urlpatterns, users_async_views.AUTH_VIEWS)
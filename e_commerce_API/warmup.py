@@ -0,0 +1,132 @@
+"""
+Worker warm-up, so the first requests to a new worker are not the slow
+ones.
+
+``prepare()`` runs when wsgi.py/asgi.py load the application: it imports
+and initializes what the first requests would otherwise pay for, namely
+the URLconf (and with it every view, DRF, django_filters and the
+serializers), DRF's default classes, serializer fields and translations.
+It opens no connection, so it is safe in a gunicorn master that forks
+its workers afterwards (preload_app).
+
+``connect()`` and ``replay()`` run in each worker once it has started
+(gunicorn.conf.py): they open the database pools or connections and the
+cache connection, then make the WARMUP_REQUESTS requests in process.
+They are made for WARMUP_HOST, so they also fill the response cache
+entries of requests to that host.
+"""
+
+import inspect
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.urls import get_resolver
+from django.utils import translation
+
+logger = logging.getLogger("e_commerce_API.warmup")
+
+# DRF settings naming classes it imports on first access
+API_CLASSES = [
+    "DEFAULT_RENDERER_CLASSES",
+    "DEFAULT_PARSER_CLASSES",
+    "DEFAULT_AUTHENTICATION_CLASSES",
+    "DEFAULT_PERMISSION_CLASSES",
+    "DEFAULT_CONTENT_NEGOTIATION_CLASS",
+    "DEFAULT_PAGINATION_CLASS",
+    "DEFAULT_FILTER_BACKENDS",
+    "EXCEPTION_HANDLER",
+]
+
+
+def prepare():
+    """Import and initialize the application code; returns the seconds taken."""
+    start = time.perf_counter()
+
+    resolver = get_resolver()
+    resolver.url_patterns
+    # Compiles the pattern of every route
+    resolver.reverse_dict
+
+    from rest_framework.settings import api_settings
+
+    for name in API_CLASSES:
+        getattr(api_settings, name)
+
+    from catalog import serializers as catalog_serializers
+    from users import serializers as users_serializers
+
+    for module in (catalog_serializers, users_serializers):
+        for serializer_class in _serializers(module):
+            # ModelSerializer builds its fields from the model on first use
+            serializer_class().fields
+
+    translation.activate(settings.LANGUAGE_CODE)
+    translation.gettext("Not found.")
+    translation.deactivate()
+
+    return time.perf_counter() - start
+
+
+def _serializers(module):
+    from rest_framework.serializers import Serializer
+
+    for obj in vars(module).values():
+        if (
+            inspect.isclass(obj)
+            and issubclass(obj, Serializer)
+            and obj.__module__ == module.__name__
+        ):
+            yield obj
+
+
+def connect():
+    """
+    Open the connection pool of each database (the connection of this
+    thread where there is no pool) and the cache connection; returns the
+    seconds taken.
+    """
+    start = time.perf_counter()
+    for connection in connections.all():
+        pool = getattr(connection, "pool", None)
+        if pool is not None:
+            pool.open(wait=True, timeout=pool.timeout)
+        else:
+            connection.ensure_connection()
+    cache.get("warmup")
+    return time.perf_counter() - start
+
+
+def replay(paths=None):
+    """
+    GET each of ``paths`` (WARMUP_REQUESTS by default) for WARMUP_HOST in
+    process; returns ``[(path, status, seconds)]``.
+    """
+    from django.test import Client
+
+    if paths is None:
+        paths = settings.WARMUP_REQUESTS
+    client = Client(raise_request_exception=False, HTTP_HOST=settings.WARMUP_HOST)
+    results = []
+    for path in paths:
+        start = time.perf_counter()
+        status = client.get(path).status_code
+        results.append((path, status, time.perf_counter() - start))
+    return results
+
+
+def warm_up_worker():
+    """The per-worker stage: connect, then replay; logs what it did."""
+    connect_seconds = connect()
+    replayed = replay()
+    logger.info(
+        "Worker warmed up: connections in %.0f ms, %s",
+        connect_seconds * 1000,
+        ", ".join(
+            f"{path} {status} in {seconds * 1000:.0f} ms"
+            for path, status, seconds in replayed
+        )
+        or "no requests replayed",
+    )
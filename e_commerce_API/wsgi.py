@@ -14,3 +14,12 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'e_commerce_API.settings')
 
 application = get_wsgi_application()
+
+from django.conf import settings  # noqa: E402
+
+if settings.WARMUP:
+    from e_commerce_API import warmup  # noqa: E402
+
+    # Initialize now rather than on the first requests; each gunicorn worker
+    # then connects and replays requests (gunicorn.conf.py).
+    warmup.prepare()
@@ -0,0 +1,23 @@
+"""
+gunicorn settings, read from the working directory (see Procfile).
+
+Workers, bind address and the rest come from the command line or the
+environment (WEB_CONCURRENCY, PORT); this file adds the worker warm-up.
+"""
+
+import decouple
+
+# Load the application in the master before forking, so workers start
+# with it already imported and initialized (e_commerce_API.warmup.prepare).
+preload_app = decouple.config("GUNICORN_PRELOAD", default=True, cast=bool)
+
+
+def post_worker_init(worker):
+    # Each worker opens its own connections and warms its caches before it
+    # accepts requests.
+    from django.conf import settings
+
+    if settings.WARMUP:
+        from e_commerce_API import warmup
+
+        warmup.warm_up_worker()
@@ -0,0 +1,44 @@
+from django.contrib.auth import aauthenticate
+from rest_framework import status
+from rest_framework.response import Response
+
+from catalog.async_views import AsyncReadView
+
+from .backends import HashingBusy
+from .views import LoginView as SyncLoginView
+from .views import UserViewSet, alogin_token
+
+
+class MeView(AsyncReadView):
+    viewset = UserViewSet
+    action = "me"
+
+    async def handle(self, view):
+        return Response(view.get_serializer(view.request.user).data)
+
+
+class LoginView(AsyncReadView):
+    viewset = SyncLoginView
+    action = "post"
+    async_methods = ("POST",)
+
+    async def handle(self, view):
+        credentials, error = view.get_credentials(view.request.data)
+        if error:
+            return error
+        try:
+            user = await aauthenticate(view.request._request, **credentials)
+        except HashingBusy:
+            return Response(
+                {"error": "Too many logins in progress, please retry"},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={"Retry-After": "1"},
+            )
+        return view.login_response(user, await alogin_token(user) if user else None)
+
+
+# Router URL names served asynchronously
+VIEWS = {"user-me": MeView}
+
+# Other URL names served asynchronously
+AUTH_VIEWS = {"login": LoginView}
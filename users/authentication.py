@@ -0,0 +1,254 @@
+"""
+Token authentication without a database round-trip per request.
+
+Resolved tokens are kept at two levels: a small in-process LRU whose
+entries live for ``TOKEN_CACHE_LOCAL_TTL`` seconds, backed by the shared
+Django cache. Entries hold the token and the user fields authentication
+and permissions need, never the password hash; the user is rebuilt from
+them with its other fields deferred.
+
+Deleting a token (logout, password change) or saving its user
+(deactivation, profile edits) replaces the shared entry with a tombstone
+for REVOKED_TTL seconds and drops the local one, see users.signals.
+Entries are only written with cache.add(), so a request that read the
+token from the database before the invalidation cannot cache it again.
+Other processes may keep serving their local copy until it expires,
+which bounds how long a revoked token can still be accepted.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import (
+    TokenAuthentication,
+    get_authorization_header,
+)
+from rest_framework.authtoken.models import Token
+
+from e_commerce_API.db_router import use_primary
+
+TOKEN_KEY = "users:token:{digest}"
+USER_KEY = "users:token-user:{user_id}"
+# Stored in place of an invalidated entry
+REVOKED = "revoked"
+# Seconds a tombstone blocks the entry: longer than a lookup that started
+# before the invalidation could take to write it back.
+REVOKED_TTL = 30
+# Everything request handling reads from request.user
+USER_FIELDS = ["id", "username", "email", "is_active", "is_staff", "is_superuser"]
+
+
+def _digest(key):
+    # Never put raw tokens in cache key names.
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def _dump(token):
+    return {
+        "key": token.key,
+        "created": token.created,
+        "user": {name: getattr(token.user, name) for name in USER_FIELDS},
+    }
+
+
+def _load(payload):
+    """A Token with its user, from a cache entry; each call builds new ones."""
+    model = get_user_model()
+    # from_db() takes the values in the order of the model's fields
+    names = [
+        field.attname
+        for field in model._meta.concrete_fields
+        if field.attname in payload["user"]
+    ]
+    user = model.from_db(None, names, [payload["user"][name] for name in names])
+    token = Token.from_db(
+        None,
+        ["key", "user_id", "created"],
+        [payload["key"], user.pk, payload["created"]],
+    )
+    # Caches the relation both ways: token.user and user.auth_token
+    user.auth_token = token
+    return token
+
+
+class TokenCache:
+    """Two-level cache of Token instances with their user's auth fields."""
+
+    def __init__(self):
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.local_hits = self.shared_hits = self.misses = 0
+
+    def stats(self):
+        lookups = self.local_hits + self.shared_hits + self.misses
+        hits = self.local_hits + self.shared_hits
+        return {
+            "local_hits": self.local_hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "hit_rate": hits / lookups if lookups else None,
+            "local_size": len(self._local),
+        }
+
+    def get(self, key):
+        digest = _digest(key)
+        token = self._get_local(digest)
+        if token is None:
+            payload = cache.get(TOKEN_KEY.format(digest=digest))
+            token = self._load_shared(digest, payload)
+        return token
+
+    async def aget(self, key):
+        digest = _digest(key)
+        token = self._get_local(digest)
+        if token is None:
+            payload = await cache.aget(TOKEN_KEY.format(digest=digest))
+            token = self._load_shared(digest, payload)
+        return token
+
+    def set(self, token):
+        """Cache ``token`` unless its entry exists, or was just invalidated."""
+        digest, payload = _digest(token.key), _dump(token)
+        timeout = settings.TOKEN_CACHE_TIMEOUT
+        if cache.add(TOKEN_KEY.format(digest=digest), payload, timeout):
+            cache.set(USER_KEY.format(user_id=token.user_id), digest, timeout)
+            self._store_local(digest, token.user_id, payload)
+
+    async def aset(self, token):
+        digest, payload = _digest(token.key), _dump(token)
+        timeout = settings.TOKEN_CACHE_TIMEOUT
+        if await cache.aadd(TOKEN_KEY.format(digest=digest), payload, timeout):
+            await cache.aset(USER_KEY.format(user_id=token.user_id), digest, timeout)
+            self._store_local(digest, token.user_id, payload)
+
+    def invalidate(self, key):
+        self._drop(_digest(key))
+
+    def invalidate_user(self, user_id):
+        digest = cache.get(USER_KEY.format(user_id=user_id))
+        if digest is not None:
+            self._drop(digest)
+        with self._lock:
+            for local_digest, entry in list(self._local.items()):
+                if entry[1] == user_id:
+                    del self._local[local_digest]
+
+    def clear_local(self):
+        with self._lock:
+            self._local.clear()
+
+    def _get_local(self, digest):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._local.get(digest)
+            if entry is not None and entry[0] > now:
+                self._local.move_to_end(digest)
+                self.local_hits += 1
+                # Rebuilt per request so no two requests share a user object.
+                return _load(entry[2])
+            self._local.pop(digest, None)
+        return None
+
+    def _load_shared(self, digest, payload):
+        if payload is None or payload == REVOKED:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        token = _load(payload)
+        with self._lock:
+            self.shared_hits += 1
+        self._store_local(digest, token.user_id, payload)
+        return token
+
+    def _store_local(self, digest, user_id, payload):
+        expires = time.monotonic() + settings.TOKEN_CACHE_LOCAL_TTL
+        with self._lock:
+            self._local[digest] = (expires, user_id, payload)
+            self._local.move_to_end(digest)
+            while len(self._local) > settings.TOKEN_CACHE_LOCAL_SIZE:
+                self._local.popitem(last=False)
+
+    def _drop(self, digest):
+        cache.set(TOKEN_KEY.format(digest=digest), REVOKED, REVOKED_TTL)
+        with self._lock:
+            self._local.pop(digest, None)
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication that serves known tokens from token_cache."""
+
+    def authenticate_credentials(self, key):
+        token = token_cache.get(key)
+        if token is not None:
+            return token.user, token
+
+        try:
+            user, token = super().authenticate_credentials(key)
+        except exceptions.AuthenticationFailed:
+            # A token created moments ago may not have reached the replica.
+            with use_primary():
+                user, token = super().authenticate_credentials(key)
+        token_cache.set(token)
+        return user, token
+
+    async def aauthenticate(self, request):
+        """authenticate() for async views, using the async cache and ORM."""
+        key = self.get_key(request)
+        if key is None:
+            return None
+
+        token = await token_cache.aget(key)
+        if token is not None:
+            return token.user, token
+
+        model = self.get_model()
+        tokens = model.objects.select_related("user")
+        try:
+            token = await tokens.aget(key=key)
+        except model.DoesNotExist:
+            with use_primary():
+                try:
+                    token = await tokens.aget(key=key)
+                except model.DoesNotExist:
+                    raise exceptions.AuthenticationFailed(_("Invalid token."))
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(_("User inactive or deleted."))
+
+        await token_cache.aset(token)
+        return token.user, token
+
+    def get_key(self, request):
+        """The token of the Authorization header, validated like authenticate()."""
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+
+        if len(auth) == 1:
+            msg = _("Invalid token header. No credentials provided.")
+            raise exceptions.AuthenticationFailed(msg)
+        if len(auth) > 2:
+            msg = _("Invalid token header. Token string should not contain spaces.")
+            raise exceptions.AuthenticationFailed(msg)
+
+        try:
+            return auth[1].decode()
+        except UnicodeError:
+            msg = _(
+                "Invalid token header. "
+                "Token string should not contain invalid characters."
+            )
+            raise exceptions.AuthenticationFailed(msg)
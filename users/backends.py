@@ -0,0 +1,123 @@
+"""
+Authentication with an email address or a username in one query.
+
+``EmailOrUsernameBackend`` looks the account up through the unique index
+of the identifier it is given and fetches the user's auth token in the
+same query, so the login view does not look either up again.
+
+Password hashing is CPU-bound and slow by design. Served async
+(``aauthenticate``), it runs on a thread pool of its own, with
+LOGIN_HASH_WORKERS threads per process, instead of the thread that runs
+the ORM queries of async views or asgiref's shared executor: a burst of
+logins queues for those threads rather than holding up catalog requests.
+Beyond LOGIN_HASH_QUEUE verifications queued or running, attempts are
+refused with HashingBusy until the queue drains.
+"""
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.hashers import verify_password
+from django.db.models import Q
+from django.db.models.functions import Lower
+
+UserModel = get_user_model()
+
+
+class HashingBusy(Exception):
+    """Too many password verifications are already queued in this process."""
+
+
+class PasswordHasherPool:
+    """Bounded executor for password hashing in async views."""
+
+    def __init__(self):
+        self._executor = None
+        self._lock = threading.Lock()
+        self.pending = 0
+
+    def executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=settings.LOGIN_HASH_WORKERS,
+                    thread_name_prefix="password-hash",
+                )
+            return self._executor
+
+    async def run(self, func, *args):
+        with self._lock:
+            if self.pending >= settings.LOGIN_HASH_QUEUE:
+                raise HashingBusy
+            self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor(), func, *args)
+        finally:
+            with self._lock:
+                self.pending -= 1
+
+
+hasher_pool = PasswordHasherPool()
+
+
+class EmailOrUsernameBackend(ModelBackend):
+    """ModelBackend accepting ``email`` or ``username`` as the identifier."""
+
+    def get_login_queryset(self, username=None, email=None):
+        # Emails match regardless of case, on users_user_email_lower_unique
+        users = UserModel._default_manager.alias(email_lower=Lower("email"))
+        if email is not None:
+            condition = Q(email_lower=email.lower())
+        elif "@" in username:
+            # Usernames may contain "@" too, see pick().
+            condition = Q(username=username) | Q(email_lower=username.lower())
+        else:
+            condition = Q(username=username)
+        return users.select_related("auth_token").filter(condition)[:2]
+
+    def pick(self, users, username):
+        """The account matched, an exact username match first."""
+        users = sorted(users, key=lambda user: user.get_username() != username)
+        return users[0] if users else None
+
+    def authenticate(self, request, username=None, password=None, email=None, **kwargs):
+        username = username or kwargs.get(UserModel.USERNAME_FIELD)
+        if (username is None and email is None) or password is None:
+            return None
+        user = self.pick(self.get_login_queryset(username, email), username)
+        if user is None:
+            # Hash anyway, so response times do not reveal which accounts
+            # exist (as ModelBackend does).
+            UserModel().set_password(password)
+            return None
+        if user.check_password(password) and self.user_can_authenticate(user):
+            return user
+        return None
+
+    async def aauthenticate(
+        self, request, username=None, password=None, email=None, **kwargs
+    ):
+        username = username or kwargs.get(UserModel.USERNAME_FIELD)
+        if (username is None and email is None) or password is None:
+            return None
+        users = [user async for user in self.get_login_queryset(username, email)]
+        user = self.pick(users, username)
+        if user is None:
+            await hasher_pool.run(UserModel().set_password, password)
+            return None
+
+        is_correct, must_update = await hasher_pool.run(
+            verify_password, password, user.password
+        )
+        if is_correct and must_update:
+            # Stored with outdated hasher settings, as check_password does
+            await hasher_pool.run(user.set_password, password)
+            await user.asave(update_fields=["password"])
+        if is_correct and self.user_can_authenticate(user):
+            return user
+        return None
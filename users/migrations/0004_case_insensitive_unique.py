@@ -0,0 +1,53 @@
+# Generated by Django 5.2.4 on 2026-10-18 06:43
+
+import django.db.models.functions.text
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import Lower
+
+
+def check_duplicates(apps, schema_editor):
+    # Name the accounts to merge or rename rather than fail on the index.
+    User = apps.get_model("users", "User")
+    for field in ("email", "username"):
+        duplicates = list(
+            User.objects.values(value=Lower(field))
+            .annotate(count=Count("id"))
+            .filter(count__gt=1)
+            .values_list("value", flat=True)[:20]
+        )
+        if duplicates:
+            raise RuntimeError(
+                f"Users share a {field} that differs only in case: "
+                f"{', '.join(duplicates)}. Resolve them before migrating."
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('users', '0003_username_lower_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='user',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Lower('email'), name='users_user_email_lower_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='user',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Lower('username'), name='users_user_username_lower_unique'),
+        ),
+        # Both replaced by the constraints above
+        migrations.RemoveIndex(
+            model_name='user',
+            name='users_user_username_lower',
+        ),
+        migrations.AlterField(
+            model_name='user',
+            name='email',
+            field=models.EmailField(max_length=254),
+        ),
+    ]
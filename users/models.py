@@ -1,11 +1,47 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.db.models.functions import Lower
 
 
 class User(AbstractUser):
-    email = models.EmailField(unique=True)
+    # Unique regardless of case, see Meta.constraints
+    email = models.EmailField()
 
     REQUIRED_FIELDS = ["email"]
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Keyset pagination of the staff user list
+            models.Index(fields=["-date_joined", "-id"]),
+        ]
+        constraints = [
+            # Registration relies on these rather than on lookups first; they
+            # also serve case-insensitive lookups, see users_named() and
+            # users_with_email().
+            models.UniqueConstraint(
+                Lower("email"), name="users_user_email_lower_unique"
+            ),
+            models.UniqueConstraint(
+                Lower("username"), name="users_user_username_lower_unique"
+            ),
+        ]
+
     def __str__(self):
         return self.username
+
+
+def users_named(username):
+    """
+    Users whose username matches case-insensitively, compared as
+    LOWER(username) so the users_user_username_lower_unique index applies.
+    """
+    return User.objects.alias(username_lower=Lower("username")).filter(
+        username_lower=username.lower()
+    )
+
+
+def users_with_email(email):
+    """Users whose email matches case-insensitively, as users_named()."""
+    return User.objects.alias(email_lower=Lower("email")).filter(
+        email_lower=email.lower()
+    )
@@ -1,14 +1,84 @@
+import re
+
 from rest_framework import serializers
 from rest_framework.authtoken.models import Token
 from django.contrib.auth import get_user_model
 from django.contrib.auth.password_validation import validate_password
+from django.contrib.auth.validators import UnicodeUsernameValidator
+from django.db import IntegrityError, transaction
 from django.core.exceptions import ValidationError as DjangoValidationError
 
 
 User = get_user_model()
 
+# Field errors for the unique constraints of users_user, by constraint name
+UNIQUE_ERRORS = {
+    "users_user_email_lower_unique": (
+        "email",
+        "A user with this email already exists.",
+    ),
+    "users_user_username_lower_unique": (
+        "username",
+        "A user with this username already exists.",
+    ),
+    # The unique=True of AbstractUser.username
+    "users_user_username_key": (
+        "username",
+        "A user with this username already exists.",
+    ),
+}
+
+# SQLite names the index of an expression constraint, or the table and
+# column of a unique column
+SQLITE_UNIQUE_FAILED = re.compile(
+    r"UNIQUE constraint failed: (?:index '(?P<index>\w+)'|(?P<column>\w+\.\w+))"
+)
+
+
+def constraint_name(exc):
+    """The name of the constraint an IntegrityError violated, if known."""
+    diag = getattr(exc.__cause__, "diag", None)
+    if diag is not None:
+        # PostgreSQL
+        return diag.constraint_name
+    match = SQLITE_UNIQUE_FAILED.search(str(exc))
+    if match is None:
+        return None
+    if match["index"]:
+        return match["index"]
+    # As PostgreSQL names the constraint of a unique column
+    return match["column"].replace(".", "_") + "_key"
+
+
+def unique_error(exc):
+    """The field error for an IntegrityError on a unique email or username."""
+    try:
+        field, message = UNIQUE_ERRORS[constraint_name(exc)]
+    except KeyError:
+        return None
+    return serializers.ValidationError({field: [message]})
+
+
+class UniqueConstraintMixin:
+    """
+    Leave email and username uniqueness to the database constraints (see
+    users.models.User): saves run in a savepoint and constraint errors
+    become the field errors a lookup beforehand would have given, without
+    the lookups or their race between concurrent requests.
+    """
+
+    def save(self, **kwargs):
+        try:
+            with transaction.atomic():
+                return super().save(**kwargs)
+        except IntegrityError as exc:
+            error = unique_error(exc)
+            if error is None:
+                raise
+            raise error from exc
+
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(UniqueConstraintMixin, serializers.ModelSerializer):
     password = serializers.CharField(
         write_only=True, required=True, style={"input_type": "password"}, min_length=6
     )
@@ -17,22 +87,22 @@ class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ["id", "username", "email", "password"]
-        extra_kwargs = {"password": {"write_only": True}, "id": {"read_only": True}}
+        extra_kwargs = {
+            "password": {"write_only": True},
+            "id": {"read_only": True},
+            # Without the UniqueValidator query, see UniqueConstraintMixin
+            "username": {"validators": [UnicodeUsernameValidator()]},
+        }
 
     def validate_email(self, value):
-        """Validate email format and uniqueness."""
+        """Validate and normalize email; uniqueness is left to the database."""
         if not value:
             raise serializers.ValidationError("Email is required.")
 
-        value = value.lower().strip()
-
-        if User.objects.filter(email=value).exists():
-            raise serializers.ValidationError("A user with this email already exists.")
-
-        return value
+        return value.lower().strip()
 
     def validate_username(self, value):
-        """Validate username uniqueness and format."""
+        """Validate username format; uniqueness is left to the database."""
         if not value:
             raise serializers.ValidationError("Username is required.")
 
@@ -43,11 +113,6 @@ class UserSerializer(serializers.ModelSerializer):
                 "Username must be at least 3 characters long."
             )
 
-        if User.objects.filter(username__iexact=value).exists():
-            raise serializers.ValidationError(
-                "A user with this username already exists."
-            )
-
         return value
 
     def validate_password(self, value):
@@ -67,7 +132,7 @@ class UserSerializer(serializers.ModelSerializer):
         return value
 
     def create(self, validated_data):
-        """Create user with validated data."""
+        """Create user and its token (cached on user.auth_token)."""
         user = User.objects.create_user(
             username=validated_data["username"],
             email=validated_data["email"],
@@ -95,7 +160,7 @@ class LoginSerializer(serializers.Serializer):
         return data
 
 
-class UserUpdateSerializer(serializers.ModelSerializer):
+class UserUpdateSerializer(UniqueConstraintMixin, serializers.ModelSerializer):
     """Serializer for updating user profile."""
 
     email = serializers.EmailField(required=False)
@@ -104,28 +169,15 @@ class UserUpdateSerializer(serializers.ModelSerializer):
         model = User
         fields = ["id", "username", "email"]
         read_only_fields = ["id"]
+        extra_kwargs = {"username": {"validators": [UnicodeUsernameValidator()]}}
 
     def validate_email(self, value):
-        """Validate email uniqueness (excluding current user)."""
-        value = value.lower().strip()
-        user = self.instance
-
-        if User.objects.filter(email=value).exclude(pk=user.pk).exists():
-            raise serializers.ValidationError("A user with this email already exists.")
-
-        return value
+        """Normalize email; uniqueness is left to the database."""
+        return value.lower().strip()
 
     def validate_username(self, value):
-        """Validate username uniqueness (excluding current user)."""
-        value = value.strip()
-        user = self.instance
-
-        if User.objects.filter(username__iexact=value).exclude(pk=user.pk).exists():
-            raise serializers.ValidationError(
-                "A user with this username already exists."
-            )
-
-        return value
+        """Normalize username; uniqueness is left to the database."""
+        return value.strip()
 
 
 class ChangePasswordSerializer(serializers.Serializer):
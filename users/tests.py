@@ -1,3 +1,158 @@
-from django.test import TestCase
+from types import SimpleNamespace
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import IntegrityError
+from django.test import SimpleTestCase, TestCase
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from .authentication import TOKEN_KEY, USER_FIELDS, _digest, token_cache
+from .models import User
+from .serializers import constraint_name, unique_error
+
+
+class RegistrationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("alice", "alice@example.com", "pw123456")
+
+    def register(self, username, email):
+        return APIClient().post(
+            "/api/auth/register/",
+            {"username": username, "email": email, "password": "s3cret-pass"},
+        )
+
+    def test_registers(self):
+        response = self.register("bob", "bob@example.com")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["user"]["email"], "bob@example.com")
+
+    def test_duplicate_email_any_case(self):
+        for email in ("alice@example.com", "Alice@Example.COM"):
+            with self.subTest(email=email):
+                response = self.register("bob", email)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(
+                    response.json()["details"],
+                    {"email": ["A user with this email already exists."]},
+                )
+
+    def test_duplicate_username_any_case(self):
+        for username in ("alice", "ALICE"):
+            with self.subTest(username=username):
+                response = self.register(username, "bob@example.com")
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(
+                    response.json()["details"],
+                    {"username": ["A user with this username already exists."]},
+                )
+        self.assertEqual(User.objects.count(), 1)
+
+    def test_update_to_taken_email(self):
+        bob = User.objects.create_user("bob", "bob@example.com", "pw123456")
+        client = APIClient()
+        client.force_authenticate(bob)
+        response = client.patch(f"/api/users/{bob.pk}/", {"email": "ALICE@example.com"})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            response.json(), {"email": ["A user with this email already exists."]}
+        )
+
+
+class UniqueErrorTests(SimpleTestCase):
+    def test_constraint_name(self):
+        for message, name in [
+            (
+                "UNIQUE constraint failed: index 'users_user_email_lower_unique'",
+                "users_user_email_lower_unique",
+            ),
+            (
+                "UNIQUE constraint failed: users_user.username",
+                "users_user_username_key",
+            ),
+            ("NOT NULL constraint failed: users_user.email", None),
+        ]:
+            with self.subTest(message=message):
+                self.assertEqual(constraint_name(IntegrityError(message)), name)
+
+    def test_postgresql_constraint_name(self):
+        exc = IntegrityError("duplicate key value violates unique constraint")
+        exc.__cause__ = Exception()
+        exc.__cause__.diag = SimpleNamespace(constraint_name="users_user_username_key")
+        self.assertEqual(constraint_name(exc), "users_user_username_key")
+        self.assertEqual(
+            unique_error(exc).detail["username"][0],
+            "A user with this username already exists.",
+        )
+
+    def test_other_constraints_are_not_field_errors(self):
+        # Matching on field names would take these for email errors
+        for message in (
+            "UNIQUE constraint failed: users_user.email_verified_token",
+            "UNIQUE constraint failed: index 'users_email_change_unique'",
+            "NOT NULL constraint failed: users_user.email",
+        ):
+            with self.subTest(message=message):
+                self.assertIsNone(unique_error(IntegrityError(message)))
+
+
+class TokenCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("alice", "alice@example.com", "pw123456")
+
+    def setUp(self):
+        cache.clear()
+        token_cache.clear_local()
+        token_cache.reset_stats()
+        self.token = Token.objects.create(user=self.user)
+
+    def me(self, key=None):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Token {key or self.token.key}")
+        return client.get("/api/users/me/")
+
+    def test_served_from_cache(self):
+        self.assertEqual(self.me().status_code, 200)
+        with self.assertNumQueries(0):
+            response = self.me()
+        self.assertEqual(response.json()["username"], "alice")
+        self.assertEqual(token_cache.stats()["local_hits"], 1)
+
+        token_cache.clear_local()
+        self.assertEqual(self.me().status_code, 200)
+        self.assertEqual(token_cache.stats()["shared_hits"], 1)
+
+    def test_no_password_hash_cached(self):
+        self.me()
+        payload = cache.get(TOKEN_KEY.format(digest=_digest(self.token.key)))
+        self.assertEqual(list(payload["user"]), USER_FIELDS)
+        self.assertNotIn(self.user.password, repr(payload))
+
+        user = token_cache.get(self.token.key).user
+        self.assertIn("password", user.get_deferred_fields())
+
+    def test_logout_revokes(self):
+        self.me()
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+        self.assertEqual(client.post("/api/auth/logout/").status_code, 200)
+        self.assertEqual(self.me().status_code, 401)
+
+    def test_password_change_revokes(self):
+        self.me()
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+        response = client.post(
+            "/api/users/change_password/",
+            {"old_password": "pw123456", "new_password": "n3w-passw0rd"},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.me().status_code, 401)
+        self.assertEqual(self.me(response.json()["token"]).status_code, 200)
+
+    def test_deactivation_revokes(self):
+        self.me()
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.me().status_code, 401)
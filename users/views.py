@@ -1,9 +1,10 @@
 from django.contrib.auth import get_user_model, authenticate
-from rest_framework import generics, permissions, viewsets, status
+from rest_framework import generics, permissions, serializers, viewsets, status
 from rest_framework.authtoken.models import Token
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.decorators import action
+from catalog.pagination import KeysetPagination
 from .serializers import (
     UserSerializer,
     LoginSerializer,
@@ -14,12 +15,17 @@ from .serializers import (
 User = get_user_model()
 
 
+class UserPagination(KeysetPagination):
+    ordering = ("-date_joined", "-id")
+
+
 class UserViewSet(viewsets.ModelViewSet):
     """CRUD for Users (requires authentication)"""
 
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = UserPagination
 
     def get_serializer_class(self):
         """Use different serializers for different actions."""
@@ -97,8 +103,8 @@ class RegisterView(generics.CreateAPIView):
             serializer.is_valid(raise_exception=True)
             user = serializer.save()
 
-            # Get the token that was created in the serializer
-            token = Token.objects.get(user=user)
+            # The token created in the serializer
+            token = user.auth_token
 
             return Response(
                 {
@@ -114,18 +120,39 @@ class RegisterView(generics.CreateAPIView):
             )
 
         except Exception as e:
-            # Handle any validation errors
+            # Handle any validation errors, including the unique constraints
+            # checked on save
             return Response(
                 {
                     "error": "Registration failed",
                     "details": (
-                        serializer.errors if hasattr(serializer, "errors") else str(e)
+                        e.detail
+                        if isinstance(e, serializers.ValidationError)
+                        else str(e)
                     ),
                 },
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
 
+def login_token(user):
+    """The user's token; EmailOrUsernameBackend fetches it with the user."""
+    try:
+        return user.auth_token
+    except Token.DoesNotExist:
+        return Token.objects.get_or_create(user=user)[0]
+
+
+async def alogin_token(user):
+    if User.auth_token.is_cached(user):
+        try:
+            return user.auth_token
+        except Token.DoesNotExist:
+            pass
+    token, created = await Token.objects.aget_or_create(user=user)
+    return token
+
+
 class LoginView(APIView):
     """Login with email or username and return auth token"""
 
@@ -137,54 +164,48 @@ class LoginView(APIView):
         Accepts: {"email": "user@example.com", "password": "pass"}
         or: {"username": "username", "password": "pass"}
         """
+        credentials, error = self.get_credentials(request.data)
+        if error:
+            return error
+        user = authenticate(request, **credentials)
+        return self.login_response(user, login_token(user) if user else None)
+
+    def get_credentials(self, data):
+        """``(credentials for authenticate(), None)`` or ``(None, error response)``."""
         # Check if using email or username
-        email = request.data.get("email")
-        username = request.data.get("username")
-        password = request.data.get("password")
+        email = data.get("email")
+        username = data.get("username")
+        password = data.get("password")
 
         if not password:
-            return Response(
+            return None, Response(
                 {"error": "Password is required"}, status=status.HTTP_400_BAD_REQUEST
             )
 
-        user = None
-
-        # Try to authenticate with email first
         if email:
             # Validate email format
             serializer = LoginSerializer(data={"email": email, "password": password})
             if not serializer.is_valid():
-                return Response(
+                return None, Response(
                     {"error": "Invalid email format", "details": serializer.errors},
                     status=status.HTTP_400_BAD_REQUEST,
                 )
 
             # Normalize email
             email = serializer.validated_data["email"]
+            return {"email": email, "password": password}, None
 
-            # Get user by email
-            try:
-                user_obj = User.objects.get(email=email)
-                # Authenticate using username (Django's default)
-                user = authenticate(username=user_obj.username, password=password)
-            except User.DoesNotExist:
-                pass
-
-        # Try username if email login failed or wasn't provided
-        elif username:
-            user = authenticate(username=username, password=password)
+        if username:
+            return {"username": username, "password": password}, None
 
-        else:
-            return Response(
-                {"error": "Email or username is required"},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
+        return None, Response(
+            {"error": "Email or username is required"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
 
+    def login_response(self, user, token):
         # Check if authentication was successful
         if user:
-            # Get or create token
-            token, created = Token.objects.get_or_create(user=user)
-
             return Response(
                 {
                     "token": token.key,